@@ -0,0 +1,171 @@
+"""Cursor persistente sobre el registro de eventos.
+
+Guarda la posición del último evento entregado al servicio RUNT (índice del
+archivo heredado, segmento y offset en bytes) para que cada ejecución procese
+solo los eventos nuevos, incluso tras reiniciar el contenedor.
+
+Para no reenviar eventos tras una caída a mitad de lote, el cursor solo avanza
+hasta el primer evento que falló y además recuerda las claves de los eventos
+ya entregados más allá de ese punto; al reintentar se omiten. Cada entrega
+agrega su clave a un diario (``<cursor>.journal``); el archivo del cursor se
+reescribe de forma atómica (tmp + fsync + rename) una sola vez por lote, al
+confirmar, y entonces el diario se vacía.
+
+Un evento que nunca va a entregarse no debe frenar el cursor para siempre:
+tras ``EVENT_MAX_ATTEMPTS`` intentos, o de inmediato si el error es
+definitivo (registro sin placa, 4xx del servicio RUNT), el evento se agrega a
+``EVENT_DEAD_LETTER_FILE`` (JSON Lines) y el cursor sigue de largo.
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import event_log
+
+CURSOR_FILE = os.getenv("EVENT_CURSOR_FILE", "/app/state/event_cursor.json")
+DEAD_LETTER_FILE = os.getenv("EVENT_DEAD_LETTER_FILE", "/app/state/event_dead_letter.jsonl")
+MAX_ATTEMPTS = int(os.getenv("EVENT_MAX_ATTEMPTS", "5"))
+
+
+def event_key(event: Dict[str, Any]) -> str:
+    """Clave única de un evento; los eventos antiguos sin event_id usan placa y fecha."""
+    if event.get("event_id"):
+        return str(event["event_id"])
+    return f"{event.get('plate')}|{event.get('date')}"
+
+
+class EventCursor:
+    def __init__(
+        self,
+        path: str = CURSOR_FILE,
+        log_dir: str = event_log.LOG_DIR,
+        legacy_file: str = event_log.LEGACY_FILE,
+        dead_letter_file: str = DEAD_LETTER_FILE,
+        max_attempts: int = MAX_ATTEMPTS
+    ):
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.log_dir = log_dir
+        self.legacy_file = legacy_file
+        self.dead_letter_file = dead_letter_file
+        self.max_attempts = max(1, max_attempts)
+        self._lock = threading.Lock()
+        self._journal = None
+        self.position = event_log.start_position()
+        self.delivered = set()
+        # Intentos fallidos por clave de los eventos que aún bloquean el cursor
+        self.attempts: Dict[str, int] = {}
+        self._load()
+
+    def _load(self):
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.position = {**event_log.start_position(), **data.get("position", {})}
+            self.delivered = set(data.get("delivered", []))
+            self.attempts = dict(data.get("attempts", {}))
+        if os.path.exists(self.journal_path):
+            # Entregas confirmadas después del último guardado del cursor
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                self.delivered.update(line.strip() for line in f if line.endswith("\n") and line.strip())
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "position": self.position,
+                "delivered": sorted(self.delivered),
+                "attempts": self.attempts
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        # El cursor ya incluye todo lo que había en el diario
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+
+    def pending(self, limit: Optional[int] = None) -> List[Tuple[Dict[str, Any], Dict[str, int]]]:
+        """Eventos posteriores al cursor que aún no se han entregado."""
+        batch = []
+        for event, position in event_log.iter_events_from(self.position, self.log_dir, self.legacy_file):
+            if event_key(event) in self.delivered:
+                continue
+            batch.append((event, position))
+            if limit is not None and len(batch) >= limit:
+                break
+        return batch
+
+    def mark_delivered(self, event: Dict[str, Any]):
+        """Registra de inmediato un evento entregado para no reenviarlo tras una caída."""
+        key = event_key(event)
+        with self._lock:
+            self.delivered.add(key)
+            if self._journal is None:
+                os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+                self._journal = open(self.journal_path, "a", encoding="utf-8")
+            self._journal.write(key + "\n")
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+
+    def _dead_letter(self, entries: List[Dict[str, Any]]):
+        os.makedirs(os.path.dirname(self.dead_letter_file) or ".", exist_ok=True)
+        with open(self.dead_letter_file, "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def commit(self, batch: List[Tuple[Dict[str, Any], Dict[str, int]]], failed: Dict[str, Dict[str, Any]]) -> int:
+        """Avanza el cursor hasta el primer evento fallido que aún se reintentará.
+
+        ``failed`` asocia la clave de cada evento no entregado con su error
+        (``{"error": ..., "terminal": ...}``). Los errores definitivos y los
+        eventos que agotaron ``max_attempts`` se envían al archivo de
+        descartados y dejan de bloquear el cursor; el resto se reintenta en la
+        siguiente ejecución junto con los nuevos. Devuelve cuántos eventos se
+        descartaron.
+        """
+        with self._lock:
+            dead = []
+            blocked = False
+            for event, event_position in batch:
+                key = event_key(event)
+                if key in failed:
+                    error = failed[key] or {}
+                    attempts = self.attempts.get(key, 0) + 1
+                    if error.get("terminal") or attempts >= self.max_attempts:
+                        dead.append({
+                            "key": key,
+                            "event": event,
+                            "error": error.get("error"),
+                            "attempts": attempts,
+                            "discarded_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+                        })
+                        self.attempts.pop(key, None)
+                        # Se trata como atendido: no se vuelve a enviar
+                        self.delivered.add(key)
+                    else:
+                        self.attempts[key] = attempts
+                        blocked = True
+                if not blocked:
+                    self.position = event_position
+            if dead:
+                # Primero el archivo de descartados: si se cae antes de guardar
+                # el cursor, el evento se reintenta en lugar de perderse
+                self._dead_letter(dead)
+            if self.delivered or self.attempts:
+                # Conservar solo las claves de eventos posteriores a la nueva posición
+                remaining = {
+                    event_key(event)
+                    for event, _ in event_log.iter_events_from(self.position, self.log_dir, self.legacy_file)
+                }
+                self.delivered &= remaining
+                self.attempts = {key: count for key, count in self.attempts.items() if key in remaining}
+            self._save()
+            return len(dead)
@@ -0,0 +1,145 @@
+"""Detección de eventos nuevos en el registro sin releer los archivos.
+
+Usa inotify (Linux, vía ctypes, sin dependencias) sobre el directorio de
+segmentos; cuando no está disponible (otro sistema operativo, límites de
+inotify agotados, directorio aún inexistente) cae a un sondeo barato que solo
+compara nombre, tamaño y mtime del último segmento.
+"""
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import time
+from typing import Optional, Tuple
+
+import event_log
+
+logger = logging.getLogger(__name__)
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_IGNORED = 0x00008000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _load_libc():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class LogWatcher:
+    """Espera cambios en el registro de eventos (inotify o sondeo por stat)."""
+
+    def __init__(
+        self,
+        log_dir: str = event_log.LOG_DIR,
+        legacy_file: str = event_log.LEGACY_FILE,
+        poll_interval: float = float(os.getenv("WATCH_POLL_INTERVAL", "0.25"))
+    ):
+        self.log_dir = log_dir
+        self.legacy_file = legacy_file
+        self.poll_interval = poll_interval
+        self._libc = _load_libc()
+        self._fd: Optional[int] = None
+        self._signature = self._stat_signature()
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self._fd is not None else "polling"
+
+    def _start_inotify(self) -> bool:
+        if self._fd is not None:
+            return True
+        if self._libc is None or not os.path.isdir(self.log_dir):
+            return False
+        fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            logger.warning(f"inotify no disponible (errno {ctypes.get_errno()}), usando sondeo")
+            self._libc = None
+            return False
+        if self._libc.inotify_add_watch(fd, os.fsencode(self.log_dir), WATCH_MASK) < 0:
+            logger.warning(f"No se pudo vigilar {self.log_dir} (errno {ctypes.get_errno()}), usando sondeo")
+            os.close(fd)
+            self._libc = None
+            return False
+        self._fd = fd
+        logger.info(f"Vigilando {self.log_dir} con inotify")
+        return True
+
+    def _drain(self) -> bool:
+        """Consume los eventos pendientes; devuelve True si hubo alguno."""
+        changed = False
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            if not data:
+                return changed
+            offset = 0
+            while offset < len(data):
+                _, mask, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size + name_len
+                if mask & (IN_DELETE_SELF | IN_IGNORED):
+                    # El directorio desapareció: volver a sondeo hasta que exista
+                    os.close(self._fd)
+                    self._fd = None
+                    return True
+                changed = True
+
+    def _stat_signature(self) -> Tuple:
+        """Firma barata del registro: último segmento (nombre, tamaño, mtime) y heredado."""
+        segments = event_log.list_segments(self.log_dir)
+        signature = [len(segments)]
+        for path in segments[-1:] + [self.legacy_file]:
+            try:
+                st = os.stat(path)
+                signature.append((path, st.st_size, st.st_mtime_ns))
+            except FileNotFoundError:
+                signature.append((path, None, None))
+        return tuple(signature)
+
+    def _signature_changed(self) -> bool:
+        signature = self._stat_signature()
+        changed = signature != self._signature
+        self._signature = signature
+        return changed
+
+    def wait_for_change(self, timeout: Optional[float] = None) -> bool:
+        """Bloquea hasta que el registro cambie o venza ``timeout``."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if self._start_inotify():
+                readable, _, _ = select.select([self._fd], [], [], remaining)
+                if readable and self._drain():
+                    self._signature = self._stat_signature()
+                    return True
+                if not readable and self._signature_changed():
+                    # Respaldo ante eventos inotify perdidos (desborde de la
+                    # cola, volúmenes de red que no los emiten)
+                    return True
+            else:
+                if self._signature_changed():
+                    return True
+                time.sleep(self.poll_interval if remaining is None else min(self.poll_interval, remaining))
+                if self._signature_changed():
+                    return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
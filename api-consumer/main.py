@@ -8,9 +8,12 @@ import traceback
 from datetime import datetime
 import time
 import threading
-import hashlib
+import asyncio
 import logging
 from typing import List, Optional
+import event_log
+from event_watcher import LogWatcher
+from event_cursor import CURSOR_FILE, EventCursor, event_key
 
 # Configurar logging
 logging.basicConfig(
@@ -31,9 +34,13 @@ app.add_middleware(
 )
 
 # Variables globales
-EVENTOS_FILE = "/eventos/eventos_consolidados.json"
+EVENTOS_FILE = event_log.LEGACY_FILE
+EVENT_LOG_DIR = event_log.LOG_DIR
 RUNT_SERVICE_URL = os.getenv('RUNT_SERVICE_URL', 'http://runt-service:8002')
 API_URL = os.getenv('API_URL', 'http://api-consumer:8000')
+# Espera máxima por cambio y reintento cuando hay un cambio pendiente (segundos)
+WATCH_TIMEOUT = float(os.getenv('WATCH_TIMEOUT', '5.0'))
+WATCH_PENDING_RETRY = float(os.getenv('WATCH_PENDING_RETRY', '0.2'))
 
 last_process = {
     "timestamp": time.time(),
@@ -41,55 +48,64 @@ last_process = {
     "source": "system"
 }
 is_processing = False
-last_hash = None
 monitoring_thread = None
-
-def calculate_file_hash(file_path):
-    """Calcula el hash MD5 del archivo"""
-    if not os.path.exists(file_path):
-        return None
-    hash_md5 = hashlib.md5()
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+watcher = None
+cursor = None
 
 def process_events():
-    """Procesa los eventos del archivo JSON."""
-    global last_process, is_processing
+    """Procesa los eventos agregados al registro desde la última ejecución."""
+    global last_process, is_processing, cursor
     try:
-        if not os.path.exists(EVENTOS_FILE):
-            logger.warning(f"El archivo {EVENTOS_FILE} no existe")
+        if not event_log.log_exists():
+            logger.warning(f"El registro de eventos {EVENT_LOG_DIR} no existe")
             last_process = {
                 "timestamp": time.time(),
-                "message": f"El archivo {EVENTOS_FILE} no existe",
+                "message": f"El registro de eventos {EVENT_LOG_DIR} no existe",
                 "source": "system"
             }
             return
 
-        logger.info(f"Leyendo archivo de eventos: {EVENTOS_FILE}")
-        with open(EVENTOS_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            logger.info(f"Eventos leídos: {len(data)}")
+        if cursor is None:
+            cursor = EventCursor(CURSOR_FILE, EVENT_LOG_DIR, EVENTOS_FILE)
+
+        logger.info(f"Leyendo registro de eventos desde {cursor.position}")
+        batch = cursor.pending()
+        logger.info(f"Eventos nuevos: {len(batch)}")
             
-        if not data:
-            logger.warning("El archivo JSON está vacío")
+        if not batch:
             last_process = {
                 "timestamp": time.time(),
-                "message": "El archivo JSON está vacío",
+                "message": "No hay eventos nuevos en el registro",
                 "source": "system"
             }
             return
 
-        # Procesar los eventos directamente
+        # Procesar solo los eventos posteriores al cursor
         try:
             from process_json import process_json
-            processed_data = process_json(data)
-            logger.info(f"Eventos procesados: {len(processed_data['processed'])}")
+            events = [event for event, _ in batch]
+            errors = {}
+            processed = asyncio.run(process_json(
+                events,
+                on_delivered=cursor.mark_delivered,
+                on_failed=lambda record, error: errors.__setitem__(event_key(record), error)
+            ))
+            delivered = {event_key(record) for record in processed}
+            failed = {
+                key: errors.get(key, {"error": "Sin respuesta del proceso"})
+                for key in {event_key(event) for event in events} - delivered
+            }
+            discarded = cursor.commit(batch, failed)
+            logger.info(f"Eventos procesados: {len(processed)}, fallidos: {len(failed)}, descartados: {discarded}")
+            if discarded:
+                logger.warning(f"{discarded} eventos enviados a {cursor.dead_letter_file}")
             
+            retrying = len(failed) - discarded
             last_process = {
                 "timestamp": time.time(),
-                "message": f"Se procesaron {len(processed_data['processed'])} nuevos eventos",
+                "message": f"Se procesaron {len(processed)} nuevos eventos"
+                           + (f" ({retrying} pendientes de reintento)" if retrying else "")
+                           + (f" ({discarded} descartados)" if discarded else ""),
                 "source": "system"
             }
         except ImportError:
@@ -108,39 +124,25 @@ def process_events():
         is_processing = False
 
 def monitor_file_changes():
-    """Monitorea cambios en el archivo JSON."""
-    global last_hash, is_processing
-    logger.info(f"Iniciando monitoreo de archivos en {EVENTOS_FILE}...")
-    
+    """Monitorea cambios en el registro de eventos (inotify o sondeo por stat)."""
+    global watcher, is_processing
+    watcher = LogWatcher(EVENT_LOG_DIR, EVENTOS_FILE)
+    logger.info(f"Iniciando monitoreo del registro de eventos en {EVENT_LOG_DIR} ({watcher.mode})...")
+
+    # Un cambio que llega mientras se procesa queda pendiente y se atiende
+    # en cuanto termina el proceso en curso. Al arrancar se procesan los
+    # eventos que llegaron mientras el servicio estaba detenido.
+    pending = True
     while True:
         try:
-            current_hash = calculate_file_hash(EVENTOS_FILE)
-            
-            if current_hash is None:
-                logger.warning(f"El archivo {EVENTOS_FILE} no existe")
-                time.sleep(5)
-                continue
-                
-            if last_hash is None:
-                last_hash = current_hash
-                logger.info("Hash inicial establecido")
-                time.sleep(1)
-                continue
-                
-            if current_hash != last_hash and not is_processing:
-                logger.info("Detectado cambio en el archivo JSON")
-                # Esperar un segundo para asegurar que el archivo se ha escrito completamente
-                time.sleep(1)
-                
-                # Verificar que el archivo existe y no está vacío
-                if os.path.exists(EVENTOS_FILE) and os.path.getsize(EVENTOS_FILE) > 0:
-                    is_processing = True
-                    process_events()
-                    last_hash = current_hash
-                else:
-                    logger.warning("El archivo no existe o está vacío después del cambio")
-            
-            time.sleep(1)
+            if watcher.wait_for_change(timeout=WATCH_PENDING_RETRY if pending else WATCH_TIMEOUT):
+                pending = True
+            if pending and not is_processing:
+                logger.info("Detectado cambio en el registro de eventos")
+                # El lector ignora las líneas a medio escribir, no hace falta esperar
+                pending = False
+                is_processing = True
+                process_events()
         except Exception as e:
             logger.error(f"Error en el monitoreo: {str(e)}")
             logger.error(traceback.format_exc())
@@ -156,13 +158,11 @@ async def startup_event():
     monitoring_thread = threading.Thread(target=monitor_file_changes, daemon=True)
     monitoring_thread.start()
     
-    # Verificar si el archivo existe al inicio
-    if os.path.exists(EVENTOS_FILE):
-        logger.info(f"Archivo {EVENTOS_FILE} encontrado al inicio")
-        global last_hash
-        last_hash = calculate_file_hash(EVENTOS_FILE)
+    # Verificar si el registro existe al inicio
+    if event_log.log_exists():
+        logger.info(f"Registro de eventos {EVENT_LOG_DIR} encontrado al inicio")
     else:
-        logger.warning(f"Archivo {EVENTOS_FILE} no encontrado al inicio")
+        logger.warning(f"Registro de eventos {EVENT_LOG_DIR} no encontrado al inicio")
 
 @app.get("/health")
 async def health_check():
@@ -172,8 +172,11 @@ async def health_check():
             "status": "healthy",
             "monitoring_active": monitoring_thread is not None and monitoring_thread.is_alive(),
             "last_process": last_process,
-            "file_exists": os.path.exists(EVENTOS_FILE),
-            "file_path": EVENTOS_FILE,
+            "file_exists": event_log.log_exists(),
+            "file_path": EVENT_LOG_DIR,
+            "segments": len(event_log.list_segments()),
+            "watch_mode": watcher.mode if watcher else None,
+            "cursor": cursor.position if cursor else None,
             "is_processing": is_processing,
             "timestamp": time.time()
         }
@@ -227,60 +230,59 @@ async def generate_pdf(request: Request):
 
 @app.get("/get-plate")
 async def get_plate():
-    """Obtiene las placas del archivo eventos_consolidados.json."""
+    """Obtiene las placas del registro de eventos."""
     try:
-        if not os.path.exists(EVENTOS_FILE):
+        if not event_log.log_exists():
             return {
                 "success": False,
-                "error": f"Archivo {EVENTOS_FILE} no encontrado",
+                "error": f"Registro de eventos {EVENT_LOG_DIR} no encontrado",
                 "debug": {
                     "current_dir": os.getcwd(),
-                    "file_path": EVENTOS_FILE,
+                    "file_path": EVENT_LOG_DIR,
                     "files": os.listdir()
                 }
             }
 
-        with open(EVENTOS_FILE, "r", encoding='utf-8') as file:
-            try:
-                data = json.load(file)
-                plates = []
-                
-                # Si es una lista de objetos
-                if isinstance(data, list):
-                    plates = [item["plate"] for item in data if "plate" in item]
-                # Si es un objeto con plate
-                elif isinstance(data, dict) and "plate" in data:
-                    plates = [data["plate"]]
-                
-                if plates:
-                    # Limpiar y validar placas
-                    plates = [p.strip().upper() for p in plates if p and len(p.strip()) >= 5]
-                    logger.info(f"Placas encontradas: {plates}")
-                    return {
-                        "success": True,
-                        "plates": plates
-                    }
-                else:
-                    return {
-                        "success": False,
-                        "error": "No se encontraron placas en el archivo",
-                        "debug": {
-                            "file_path": EVENTOS_FILE,
-                            "data_type": type(data).__name__
-                        }
-                    }
-                    
-            except json.JSONDecodeError as e:
-                logger.error(f"Error parseando JSON: {e}")
+        try:
+            data = event_log.read_events()
+            plates = []
+            
+            # Si es una lista de objetos
+            if isinstance(data, list):
+                plates = [item["plate"] for item in data if "plate" in item]
+            # Si es un objeto con plate
+            elif isinstance(data, dict) and "plate" in data:
+                plates = [data["plate"]]
+            
+            if plates:
+                # Limpiar y validar placas
+                plates = [p.strip().upper() for p in plates if p and len(p.strip()) >= 5]
+                logger.info(f"Placas encontradas: {plates}")
+                return {
+                    "success": True,
+                    "plates": plates
+                }
+            else:
                 return {
                     "success": False,
-                    "error": f"Error al parsear el archivo JSON: {str(e)}",
+                    "error": "No se encontraron placas en el archivo",
                     "debug": {
-                        "file_path": EVENTOS_FILE,
-                        "error_details": str(e)
+                        "file_path": EVENT_LOG_DIR,
+                        "data_type": type(data).__name__
                     }
                 }
-            
+                
+        except json.JSONDecodeError as e:
+            logger.error(f"Error parseando JSON: {e}")
+            return {
+                "success": False,
+                "error": f"Error al parsear el archivo JSON: {str(e)}",
+                "debug": {
+                    "file_path": EVENT_LOG_DIR,
+                    "error_details": str(e)
+                }
+            }
+        
     except Exception as e:
         logger.error(f"Error al leer el archivo: {str(e)}")
         return {
@@ -288,7 +290,7 @@ async def get_plate():
             "error": f"Error al leer el archivo: {str(e)}",
             "debug": {
                 "current_dir": os.getcwd(),
-                "file_path": EVENTOS_FILE,
+                "file_path": EVENT_LOG_DIR,
                 "error": str(e),
                 "traceback": traceback.format_exc()
             }
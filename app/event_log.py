@@ -0,0 +1,284 @@
+"""Registro de eventos append-only en segmentos JSON Lines.
+
+Reemplaza el antiguo ``eventos_consolidados.json`` (que se leía y reescribía
+completo en cada evento) por segmentos ``eventos-NNNNNN.jsonl`` rotados por
+tamaño. Cada evento es una línea JSON; escribir un evento cuesta lo mismo sin
+importar cuántos eventos haya en el día.
+
+El lector es compatible hacia atrás: primero entrega los eventos del archivo
+consolidado heredado (si existe) y luego los de los segmentos en orden.
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+LEGACY_FILE = "/eventos/eventos_consolidados.json"
+LOG_DIR = os.getenv("EVENT_LOG_DIR", "/eventos/log")
+SEGMENT_MAX_BYTES = int(os.getenv("EVENT_LOG_SEGMENT_MAX_BYTES", str(64 * 1024 * 1024)))
+FSYNC_EVERY = int(os.getenv("EVENT_LOG_FSYNC_EVERY", "32"))
+FSYNC_INTERVAL = float(os.getenv("EVENT_LOG_FSYNC_INTERVAL", "1.0"))
+
+SEGMENT_PREFIX = "eventos-"
+SEGMENT_SUFFIX = ".jsonl"
+
+
+def segment_name(number: int) -> str:
+    return f"{SEGMENT_PREFIX}{number:06d}{SEGMENT_SUFFIX}"
+
+
+def segment_number(name: str) -> Optional[int]:
+    """Devuelve el número de un segmento a partir de su nombre, o None."""
+    if not (name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)):
+        return None
+    digits = name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]
+    return int(digits) if digits.isdigit() else None
+
+
+def list_segments(log_dir: str = LOG_DIR) -> List[str]:
+    """Lista las rutas de los segmentos ordenadas de más antiguo a más nuevo."""
+    if not os.path.isdir(log_dir):
+        return []
+    numbered = []
+    for name in os.listdir(log_dir):
+        number = segment_number(name)
+        if number is not None:
+            numbered.append((number, os.path.join(log_dir, name)))
+    return [path for _, path in sorted(numbered)]
+
+
+class EventLogWriter:
+    """Escritor append-only con rotación por tamaño y fsync por lotes.
+
+    El fsync se hace cada ``fsync_every`` eventos o cuando han pasado
+    ``fsync_interval`` segundos desde el último, lo que ocurra primero.
+    Es seguro usarlo desde varios hilos y desde varios procesos (por ejemplo,
+    los workers de gunicorn): cada escritura toma un ``flock`` sobre
+    ``<log_dir>/.lock`` y revisa si otro proceso ya rotó el segmento.
+    """
+
+    def __init__(
+        self,
+        log_dir: str = LOG_DIR,
+        max_bytes: int = SEGMENT_MAX_BYTES,
+        fsync_every: int = FSYNC_EVERY,
+        fsync_interval: float = FSYNC_INTERVAL
+    ):
+        self.log_dir = log_dir
+        self.max_bytes = max_bytes
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._file = None
+        self._number = 0
+        self._size = 0
+        self._pending = 0
+        self._last_fsync = time.monotonic()
+        os.makedirs(self.log_dir, exist_ok=True)
+        self._lock_file = open(os.path.join(self.log_dir, ".lock"), "a")
+
+    def _open_segment(self, number: int):
+        path = os.path.join(self.log_dir, segment_name(number))
+        # Sin buffer: cada evento se escribe con una sola llamada a write()
+        self._file = open(path, "ab", buffering=0)
+        self._number = number
+        self._size = self._file.seek(0, os.SEEK_END)
+        if self._size > 0:
+            # Cerrar una línea truncada por una caída previa del proceso
+            with open(path, "rb") as tail:
+                tail.seek(-1, os.SEEK_END)
+                if tail.read(1) != b"\n":
+                    self._size += self._file.write(b"\n")
+
+    def _ensure_segment(self, incoming: int):
+        if self._file is None:
+            segments = list_segments(self.log_dir)
+            last = segment_number(os.path.basename(segments[-1])) if segments else 1
+            self._open_segment(last)
+        elif os.path.exists(os.path.join(self.log_dir, segment_name(self._number + 1))):
+            # Otro proceso rotó el segmento: continuar en el más reciente
+            self._sync()
+            self._file.close()
+            self._file = None
+            return self._ensure_segment(incoming)
+        else:
+            # Otros procesos pueden haber escrito en el mismo segmento
+            self._size = os.fstat(self._file.fileno()).st_size
+        if self._size > 0 and self._size + incoming > self.max_bytes:
+            self._sync()
+            self._file.close()
+            self._open_segment(self._number + 1)
+
+    def _sync(self):
+        if self._file is not None and self._pending:
+            os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_fsync = time.monotonic()
+
+    def append(self, event: Dict[str, Any]) -> None:
+        """Agrega un evento al final del segmento activo."""
+        line = (json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                self._ensure_segment(len(line))
+                self._file.write(line)
+                self._size += len(line)
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._pending += 1
+            if (self._pending >= self.fsync_every
+                    or time.monotonic() - self._last_fsync >= self.fsync_interval):
+                self._sync()
+
+    def flush(self) -> None:
+        """Fuerza el fsync de los eventos pendientes."""
+        with self._lock:
+            self._sync()
+
+    def close(self) -> None:
+        with self._lock:
+            self._sync()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._lock_file.close()
+
+
+def _iter_segment(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, "rb") as f:
+        for line in f:
+            # Una línea sin salto final es una escritura en curso: se ignora
+            if not line.endswith(b"\n"):
+                break
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # Registro truncado por una caída del escritor
+                continue
+
+
+def _iter_legacy(legacy_file: str) -> Iterator[Dict[str, Any]]:
+    if not legacy_file or not os.path.exists(legacy_file):
+        return
+    with open(legacy_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        yield from data
+    elif isinstance(data, dict):
+        yield data
+
+
+def iter_events(log_dir: str = LOG_DIR, legacy_file: str = LEGACY_FILE) -> Iterator[Dict[str, Any]]:
+    """Recorre todos los eventos: primero los heredados y luego los segmentos."""
+    yield from _iter_legacy(legacy_file)
+    for path in list_segments(log_dir):
+        yield from _iter_segment(path)
+
+
+def read_events(log_dir: str = LOG_DIR, legacy_file: str = LEGACY_FILE) -> List[Dict[str, Any]]:
+    """Carga todos los eventos en memoria (compatibilidad con el JSON consolidado)."""
+    return list(iter_events(log_dir, legacy_file))
+
+
+def start_position() -> Dict[str, int]:
+    """Posición inicial del registro: antes del primer evento heredado."""
+    return {"legacy_index": 0, "legacy_done": False, "segment": 0, "offset": 0}
+
+
+def _iter_segment_from(path: str, offset: int) -> Iterator[Tuple[Dict[str, Any], int]]:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line), offset
+            except json.JSONDecodeError:
+                continue
+
+
+def iter_events_from(
+    position: Dict[str, int],
+    log_dir: str = LOG_DIR,
+    legacy_file: str = LEGACY_FILE
+) -> Iterator[Tuple[Dict[str, Any], Dict[str, int]]]:
+    """Recorre los eventos posteriores a ``position``.
+
+    Entrega pares ``(evento, posición)`` donde la posición apunta justo después
+    del evento; guardarla permite reanudar la lectura sin repetirlo. Las líneas
+    a medio escribir no se entregan ni avanzan la posición.
+
+    El archivo heredado ya no crece: la posición de su último evento (y la de
+    cualquier evento de los segmentos) lleva ``legacy_done`` y, a partir de
+    ella, el archivo no se vuelve a leer.
+    """
+    legacy_index = position.get("legacy_index", 0)
+    legacy_done = bool(position.get("legacy_done", False))
+    current_segment = position.get("segment", 0)
+    if not legacy_done:
+        legacy = list(_iter_legacy(legacy_file))
+        for index in range(legacy_index, len(legacy)):
+            legacy_index = index + 1
+            yield legacy[index], {"legacy_index": legacy_index, "legacy_done": legacy_index == len(legacy),
+                                  "segment": current_segment, "offset": position.get("offset", 0)}
+        legacy_index = max(legacy_index, len(legacy))
+    for path in list_segments(log_dir):
+        number = segment_number(os.path.basename(path))
+        if number < current_segment:
+            continue
+        start = position.get("offset", 0) if number == current_segment else 0
+        for event, offset in _iter_segment_from(path, start):
+            yield event, {"legacy_index": legacy_index, "legacy_done": True, "segment": number, "offset": offset}
+
+
+def _last_line(path: str, block_size: int = 8192) -> Optional[bytes]:
+    """Lee la última línea completa de un archivo sin recorrerlo entero."""
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        buffer = b""
+        position = end
+        while position > 0:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            buffer = f.read(step) + buffer
+            # Descartar una posible escritura parcial al final
+            cut = buffer.rfind(b"\n")
+            if cut == -1:
+                continue
+            body = buffer[:cut]
+            start = body.rfind(b"\n")
+            if start != -1 or position == 0:
+                return body[start + 1:].strip() or None
+    return None
+
+
+def last_event(log_dir: str = LOG_DIR, legacy_file: str = LEGACY_FILE) -> Optional[Dict[str, Any]]:
+    """Devuelve el evento más reciente leyendo solo el final del último segmento."""
+    for path in reversed(list_segments(log_dir)):
+        line = _last_line(path)
+        if line:
+            try:
+                return json.loads(line)
+            except json.JSONDecodeError:
+                # Registro truncado: recorrer el segmento completo
+                events = list(_iter_segment(path))
+                if events:
+                    return events[-1]
+    legacy = list(_iter_legacy(legacy_file))
+    return legacy[-1] if legacy else None
+
+
+def log_exists(log_dir: str = LOG_DIR, legacy_file: str = LEGACY_FILE) -> bool:
+    """Indica si hay algún origen de eventos (segmentos o archivo heredado)."""
+    return bool(list_segments(log_dir)) or os.path.exists(legacy_file)
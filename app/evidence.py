@@ -0,0 +1,147 @@
+"""Evidencias de eventos guardadas por referencia.
+
+En lugar de incrustar cada imagen en base64 dentro del evento, el listener
+guarda una referencia con este esquema::
+
+    {
+        "path": "imagenes/<event_id>_<nombre>.jpg",   # relativo a EVIDENCE_ROOT
+        "size": 123456,
+        "sha256": "<hex>",
+        "content_type": "image/jpeg"
+    }
+
+Los consumidores solo leen los bytes cuando realmente los necesitan (por
+ejemplo, al renderizar un PDF). Los eventos antiguos con base64 siguen
+funcionando: ``LazyEvidence.from_value`` acepta ambos formatos.
+"""
+import base64
+import hashlib
+import os
+from typing import Any, Dict, Optional
+
+EVIDENCE_ROOT = os.getenv("EVIDENCE_ROOT", "/eventos")
+# "reference" (por defecto) o "base64" para el formato heredado
+EVIDENCE_MODE = os.getenv("EVIDENCE_MODE", "reference")
+
+REFERENCE_KEYS = ("path", "size", "sha256", "content_type")
+
+
+def make_reference(
+    path: str,
+    size: int,
+    sha256: str,
+    content_type: str = "image/jpeg",
+    root: str = EVIDENCE_ROOT
+) -> Dict[str, Any]:
+    """Construye la referencia de una evidencia ya escrita en disco."""
+    if os.path.isabs(path) and os.path.commonpath([path, root]) == root:
+        path = os.path.relpath(path, root)
+    return {
+        "path": path,
+        "size": size,
+        "sha256": sha256,
+        "content_type": content_type
+    }
+
+
+def reference_for_bytes(path: str, data: bytes, content_type: str = "image/jpeg") -> Dict[str, Any]:
+    """Referencia para bytes que ya se escribieron en ``path``."""
+    return make_reference(path, len(data), hashlib.sha256(data).hexdigest(), content_type)
+
+
+def reference_for_file(path: str, content_type: str = "image/jpeg", chunk_size: int = 1024 * 1024) -> Dict[str, Any]:
+    """Referencia calculada leyendo el archivo por bloques."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+            size += len(chunk)
+    return make_reference(path, size, digest.hexdigest(), content_type)
+
+
+def is_reference(value: Any) -> bool:
+    return isinstance(value, dict) and "path" in value and "sha256" in value
+
+
+class LazyEvidence:
+    """Evidencia cuyo contenido se carga solo al pedirlo."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        size: Optional[int] = None,
+        sha256: Optional[str] = None,
+        content_type: str = "image/jpeg",
+        inline_base64: Optional[str] = None,
+        root: str = EVIDENCE_ROOT
+    ):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.content_type = content_type
+        self._inline_base64 = inline_base64
+        self._root = root
+        self._data = None
+
+    @classmethod
+    def from_value(cls, value: Any, root: str = EVIDENCE_ROOT) -> "LazyEvidence":
+        """Crea la evidencia desde una referencia o desde base64 heredado."""
+        if is_reference(value):
+            return cls(
+                path=value["path"],
+                size=value.get("size"),
+                sha256=value["sha256"],
+                content_type=value.get("content_type", "image/jpeg"),
+                root=root
+            )
+        if isinstance(value, str):
+            return cls(inline_base64=value, root=root)
+        raise ValueError(f"Formato de evidencia no soportado: {type(value).__name__}")
+
+    @property
+    def full_path(self) -> Optional[str]:
+        if self.path is None:
+            return None
+        return self.path if os.path.isabs(self.path) else os.path.join(self._root, self.path)
+
+    def read(self, verify: bool = False) -> bytes:
+        """Lee los bytes de la evidencia (una sola vez)."""
+        if self._data is None:
+            if self._inline_base64 is not None:
+                self._data = base64.b64decode(self._inline_base64)
+            else:
+                with open(self.full_path, "rb") as f:
+                    self._data = f.read()
+        if verify and self.sha256 and hashlib.sha256(self._data).hexdigest() != self.sha256:
+            raise ValueError(f"La evidencia {self.path} no coincide con su sha256")
+        return self._data
+
+    def base64(self) -> str:
+        if self._inline_base64 is not None:
+            return self._inline_base64
+        return base64.b64encode(self.read()).decode("utf-8")
+
+    def data_uri(self) -> str:
+        return f"data:{self.content_type};base64,{self.base64()}"
+
+    def to_reference(self) -> Optional[Dict[str, Any]]:
+        if self.path is None:
+            return None
+        return {
+            "path": self.path,
+            "size": self.size,
+            "sha256": self.sha256,
+            "content_type": self.content_type
+        }
+
+
+def load_evidences(evidences: Optional[Dict[str, Any]], root: str = EVIDENCE_ROOT) -> Dict[str, LazyEvidence]:
+    """Convierte el dict ``evidences`` de un evento en evidencias perezosas."""
+    result = {}
+    for name, value in (evidences or {}).items():
+        try:
+            result[name] = LazyEvidence.from_value(value, root)
+        except ValueError:
+            continue
+    return result
@@ -14,13 +14,15 @@ import zipfile
 import tempfile
 from datetime import datetime
 import re
+import event_log
 
 # Agregar al inicio del archivo, después de los imports
 os.makedirs('output/pdfs', exist_ok=True)
 os.makedirs('output/images', exist_ok=True)
 
-# Definir la ruta del archivo de eventos consolidados
-EVENTOS_FILE = "/eventos/eventos_consolidados.json"
+# Definir la ruta del registro de eventos (y del archivo consolidado heredado)
+EVENTOS_FILE = event_log.LEGACY_FILE
+EVENT_LOG_DIR = event_log.LOG_DIR
 
 app = FastAPI()
 runt_client = RuntAPIClient()
@@ -45,14 +47,13 @@ def read_root():
 @app.post("/process")
 async def process_file(request: Request):
     try:
-        if not os.path.exists(EVENTOS_FILE):
-            print(f"[{datetime.now()}] Error: No se encontró el archivo de eventos consolidados")
-            return {"error": "No se encontró el archivo de eventos consolidados"}
+        if not event_log.log_exists():
+            print(f"[{datetime.now()}] Error: No se encontró el registro de eventos")
+            return {"error": "No se encontró el registro de eventos"}
             
-        print(f"[{datetime.now()}] Leyendo archivo de eventos: {EVENTOS_FILE}")
-        with open(EVENTOS_FILE, "r", encoding="utf-8") as f:
-            json_data = json.load(f)
-            print(f"[{datetime.now()}] Eventos leídos: {len(json_data)}")
+        print(f"[{datetime.now()}] Leyendo registro de eventos: {EVENT_LOG_DIR}")
+        json_data = event_log.read_events()
+        print(f"[{datetime.now()}] Eventos leídos: {len(json_data)}")
             
         processed_data = process_json(json_data)
         print(f"[{datetime.now()}] Eventos procesados: {len(processed_data['processed'])}")
@@ -89,11 +90,10 @@ def list_attributes(db: Session = Depends(get_db)):
 @app.get("/generate-pdf")
 def generate_pdf():
     try:
-        if not os.path.exists(EVENTOS_FILE):
-            return {"error": "No se encontró el archivo de eventos consolidados"}
+        if not event_log.log_exists():
+            return {"error": "No se encontró el registro de eventos"}
             
-        with open(EVENTOS_FILE, "r", encoding="utf-8") as f:
-            json_data = json.load(f)
+        json_data = event_log.read_events()
                 
         # Procesar todos los registros
         processed_data = process_json(json_data)
@@ -187,27 +187,23 @@ async def download_all_pdfs(filenames: str):
 @app.get("/get-plate")
 async def get_plate():
     try:
-        if not os.path.exists(EVENTOS_FILE):
-            return {"error": "No se encontró el archivo de eventos consolidados"}
+        if not event_log.log_exists():
+            return {"error": "No se encontró el registro de eventos"}
             
-        with open(EVENTOS_FILE, 'r', encoding='utf-8') as file:
-            eventos = json.load(file)
-            
-            if eventos and len(eventos) > 0:
-                # Obtener la placa del último evento
-                ultimo_evento = eventos[-1]
-                if 'plate' in ultimo_evento:
-                    plate = ultimo_evento['plate']
-                    print(f"Placa encontrada: {plate}")
-                    return {"success": True, "plate": plate}
-            
-            return {
-                "success": False,
-                "error": "No se encontraron eventos con placas",
-                "debug": {
-                    "total_eventos": len(eventos) if eventos else 0
-                }
+        # Solo se lee el final del último segmento
+        ultimo_evento = event_log.last_event()
+        if ultimo_evento and 'plate' in ultimo_evento:
+            plate = ultimo_evento['plate']
+            print(f"Placa encontrada: {plate}")
+            return {"success": True, "plate": plate}
+        
+        return {
+            "success": False,
+            "error": "No se encontraron eventos con placas",
+            "debug": {
+                "ultimo_evento": bool(ultimo_evento)
             }
+        }
             
     except Exception as e:
         import traceback
@@ -215,5 +211,5 @@ async def get_plate():
             "success": False,
             "error": f"Error al leer la placa: {str(e)}",
             "traceback": traceback.format_exc(),
-            "file_path": EVENTOS_FILE
+            "file_path": EVENT_LOG_DIR
         }
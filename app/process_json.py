@@ -1,5 +1,7 @@
+import asyncio
 import base64
 import os
+import random
 import requests
 from database import get_db
 from crud import get_attributes
@@ -8,11 +10,23 @@ from typing import Dict, List, Tuple
 import json
 import time
 import httpx
+import event_log
+from evidence import LazyEvidence
 
 # Directorios de salida
 IMAGE_DIR = "output/images"
 VIDEO_DIR = "output/videos"
-HIKVISION_FILE = "/eventos/eventos_consolidados.json"
+HIKVISION_FILE = event_log.LEGACY_FILE
+
+# Envío al servicio RUNT
+RUNT_SERVICE_URL = os.getenv("RUNT_SERVICE_URL", "http://runt-service:8000")
+RUNT_CONCURRENCY = int(os.getenv("RUNT_CONCURRENCY", "8"))
+RUNT_MAX_RETRIES = int(os.getenv("RUNT_MAX_RETRIES", "3"))
+RUNT_RETRY_BASE_DELAY = float(os.getenv("RUNT_RETRY_BASE_DELAY", "0.5"))
+# Un lote puede incluir decenas de placas consultadas en una sola llamada
+RUNT_TIMEOUT = float(os.getenv("RUNT_TIMEOUT", "300"))
+RUNT_BATCH_SIZE = int(os.getenv("RUNT_BATCH_SIZE", "50"))
+RUNT_BATCH_WINDOW = float(os.getenv("RUNT_BATCH_WINDOW", "0.2"))
 os.makedirs(IMAGE_DIR, exist_ok=True)
 os.makedirs(VIDEO_DIR, exist_ok=True)
 
@@ -25,7 +39,8 @@ def save_base64_file(data, file_type, plate):
             file_path = os.path.join(VIDEO_DIR, f"{plate}_{unique_id}.mp4")
             
         with open(file_path, "wb") as file:
-            file.write(base64.b64decode(data))
+            # Acepta base64 heredado o una referencia a la evidencia en disco
+            file.write(LazyEvidence.from_value(data).read())
         return file_path
     except Exception as e:
         return f"Error al guardar archivo: {e}"
@@ -66,41 +81,171 @@ def validate_json_structure(record: dict) -> bool:
     return all(field in record for field in required_fields)
 
 def read_hikvision_events():
-    """Lee los eventos desde el archivo de Hikvision."""
+    """Lee los eventos desde el registro de Hikvision."""
     try:
-        if os.path.exists(HIKVISION_FILE):
-            with open(HIKVISION_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return []
+        return event_log.read_events()
     except Exception as e:
         print(f"Error leyendo eventos de Hikvision: {e}")
         return []
 
-async def send_to_runt_service(data: dict):
+async def _post_with_retry(client: httpx.AsyncClient, url: str, data: dict):
+    """POST con reintentos y espera exponencial con jitter completo.
+
+    Reintenta errores de red, 429 y 5xx; los demás 4xx se devuelven de inmediato.
+    """
+    for attempt in range(RUNT_MAX_RETRIES + 1):
+        try:
+            response = await client.post(url, json=data)
+            if response.status_code != 429 and response.status_code < 500:
+                response.raise_for_status()
+                return response.json()
+            error = f"HTTP {response.status_code}"
+        except httpx.TransportError as e:
+            error = str(e) or type(e).__name__
+        if attempt < RUNT_MAX_RETRIES:
+            delay = random.uniform(0, RUNT_RETRY_BASE_DELAY * (2 ** attempt))
+            print(f"Reintentando envío al servicio RUNT en {delay:.2f}s ({error})")
+            await asyncio.sleep(delay)
+    raise httpx.HTTPError(f"Servicio RUNT no disponible tras {RUNT_MAX_RETRIES + 1} intentos: {error}")
+
+def runt_client() -> httpx.AsyncClient:
+    """Cliente keep-alive compartido por todos los envíos de un lote."""
+    limits = httpx.Limits(
+        max_connections=RUNT_CONCURRENCY,
+        max_keepalive_connections=RUNT_CONCURRENCY
+    )
+    return httpx.AsyncClient(timeout=RUNT_TIMEOUT, limits=limits)
+
+async def send_to_runt_service(data: dict, client: httpx.AsyncClient = None):
     """Envía los datos procesados al servicio RUNT."""
     try:
-        runt_service_url = os.getenv("RUNT_SERVICE_URL", "http://runt-service:8000")
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{runt_service_url}/process-runt",
-                json=data
-            )
-            response.raise_for_status()
-            result = response.json()
-            print(f"Respuesta del servicio RUNT: {result}")
-            return result
+        if client is None:
+            async with runt_client() as own_client:
+                return await send_to_runt_service(data, own_client)
+        result = await _post_with_retry(client, f"{RUNT_SERVICE_URL}/process-runt", data)
+        print(f"Respuesta del servicio RUNT: {result}")
+        return result
     except Exception as e:
         print(f"Error enviando datos al servicio RUNT: {str(e)}")
         return None
 
-async def process_json(json_data=None):
-    """Procesa el archivo JSON y envía los datos al servicio RUNT."""
+def normalize_plate(plate) -> str:
+    return str(plate or "").strip().upper()
+
+def is_terminal_status(status_code) -> bool:
+    """4xx que no se resuelven reintentando (la placa no existe, datos inválidos).
+
+    401/403 (llave o credenciales), 408 y 429 sí pueden resolverse solos.
+    """
+    return isinstance(status_code, int) and 400 <= status_code < 500 and status_code not in (401, 403, 408, 429)
+
+class RuntBatcher:
+    """Agrupa registros en llamadas a ``/process-runt`` con varias placas.
+
+    Un lote se envía al alcanzar ``max_batch`` placas distintas o cuando han
+    pasado ``max_wait`` segundos desde el primer registro pendiente, lo que
+    ocurra primero. Cada ``submit`` recibe la entrada de su placa en la
+    respuesta del lote (o un dict con ``error``). ``terminal`` marca los
+    errores que no se resolverán reintentando el mismo registro.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        max_batch: int = RUNT_BATCH_SIZE,
+        max_wait: float = RUNT_BATCH_WINDOW,
+        concurrency: int = RUNT_CONCURRENCY
+    ):
+        self.client = client
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._pending: Dict[str, List[asyncio.Future]] = {}
+        self._timer = None
+        self._tasks = set()
+
+    async def submit(self, record: dict) -> dict:
+        plate = normalize_plate(record.get("plate"))
+        if not plate:
+            return {"error": "Registro sin placa", "terminal": True}
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(plate, []).append(future)
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        task = asyncio.ensure_future(self._send(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: Dict[str, List[asyncio.Future]]):
+        plates = list(batch)
+        try:
+            async with self._semaphore:
+                result = await _post_with_retry(
+                    self.client, f"{RUNT_SERVICE_URL}/process-runt", {"plates": plates}
+                )
+            print(f"Respuesta del servicio RUNT para {len(plates)} placas: success={result.get('success')}")
+            if not result.get("success"):
+                entries = {}
+                batch_error = result.get("error", "Error en el servicio RUNT")
+            else:
+                entries = {
+                    normalize_plate(vehicle.get("plate")): vehicle
+                    for vehicle in result.get("data", {}).get("vehicles", [])
+                }
+                batch_error = "Placa ausente en la respuesta del lote"
+            batch_terminal = False
+        except httpx.HTTPStatusError as e:
+            print(f"Error enviando lote al servicio RUNT: {str(e)}")
+            entries, batch_error = {}, str(e)
+            batch_terminal = is_terminal_status(e.response.status_code)
+        except Exception as e:
+            print(f"Error enviando lote al servicio RUNT: {str(e)}")
+            entries, batch_error, batch_terminal = {}, str(e), False
+
+        for plate, futures in batch.items():
+            entry = entries.get(plate)
+            if entry is None or not entry.get("success"):
+                entry = {
+                    "error": (entry or {}).get("error", batch_error),
+                    "plate": plate,
+                    "terminal": batch_terminal if entry is None else is_terminal_status(entry.get("status_code"))
+                }
+            for future in futures:
+                if not future.done():
+                    future.set_result(entry)
+
+    async def close(self):
+        """Envía lo pendiente y espera a que terminen los lotes en curso."""
+        self._flush()
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks))
+
+async def process_json(json_data=None, on_delivered=None, on_failed=None):
+    """Procesa el archivo JSON y envía los datos al servicio RUNT.
+
+    Los registros se agrupan en lotes de placas (``RuntBatcher``) que se envían
+    en paralelo, hasta ``RUNT_CONCURRENCY`` a la vez, sobre un único cliente
+    HTTP. ``on_delivered`` se invoca con cada registro
+    aceptado por el servicio RUNT, apenas se confirma (lo usa el cursor de
+    api-consumer); ``on_failed`` con el registro y el dict de error de los
+    rechazados. El resultado conserva el orden de entrada.
+    """
     try:
         if json_data is None:
             json_data = read_hikvision_events()
-            
-        processed_records = []
-        for record in json_data:
+
+        async def dispatch(record, batcher):
             try:
                 # Procesar el registro
                 processed_record = {
@@ -112,18 +257,28 @@ async def process_json(json_data=None):
                     "video_filename": record.get("video_filename")
                 }
                 
-                # Enviar al servicio RUNT
-                result = await send_to_runt_service(processed_record)
+                # Enviar al servicio RUNT dentro de un lote
+                result = await batcher.submit(processed_record)
                 if result and "error" not in result:
-                    processed_records.append(processed_record)
-                else:
-                    print(f"Error procesando registro: {result}")
-                    
+                    if on_delivered:
+                        on_delivered(processed_record)
+                    return processed_record
+                print(f"Error procesando registro: {result}")
+                error = result or {"error": "Respuesta vacía del servicio RUNT"}
             except Exception as e:
                 print(f"Error procesando registro: {str(e)}")
-                continue
-                
-        return processed_records
+                error = {"error": str(e)}
+            if on_failed:
+                on_failed(record, error)
+            return None
+
+        async with runt_client() as client:
+            batcher = RuntBatcher(client)
+            try:
+                results = await asyncio.gather(*(dispatch(record, batcher) for record in json_data))
+            finally:
+                await batcher.close()
+        return [record for record in results if record is not None]
         
     except Exception as e:
         print(f"Error en process_json: {str(e)}")
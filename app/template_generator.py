@@ -8,6 +8,7 @@ from jinja2 import Environment, FileSystemLoader, Template
 from weasyprint import HTML
 import streamlit as st
 import requests
+from evidence import load_evidences
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -46,6 +47,16 @@ class TemplateGenerator:
         result = {"image1_base64": None, "image2_base64": None}
         found = 0
 
+        # Evidencias del evento: los bytes se leen solo aquí, al renderizar
+        for name, evidence in load_evidences(data.get("evidences")).items():
+            try:
+                result[f"image{found + 1}_base64"] = evidence.data_uri()
+                found += 1
+                if found == 2:
+                    return result
+            except Exception as e:
+                logger.warning(f"No se pudo cargar la evidencia {name}: {e}")
+
         for value in data.values():
             if isinstance(value, str) and value.startswith("output/images/") and os.path.isfile(value):
                 try:
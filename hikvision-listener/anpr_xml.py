@@ -0,0 +1,73 @@
+"""Extractor de una sola pasada para el XML ``EventNotificationAlert`` de Hikvision.
+
+Reemplaza ``strip_namespace`` + ``xmltodict.parse``: en lugar de reescribir
+todo el árbol, volver a serializarlo y convertirlo a diccionarios, el XML se
+recorre una vez con el parser incremental de ElementTree (el mismo motor de
+``iterparse``) y solo se leen los campos que usa el listener, por su ruta
+completa desde ``EventNotificationAlert``.
+"""
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from typing import Optional
+
+ROOT = "EventNotificationAlert"
+
+# Ruta bajo ``EventNotificationAlert`` -> atributo del registro. Son las mismas
+# búsquedas que se hacían sobre el dict de xmltodict; un elemento con el mismo
+# nombre anidado en otra parte del documento no las pisa.
+PATHS = {
+    ("dateTime",): "date_time",
+    ("eventType",): "event_type",
+    ("ANPR", "licensePlate"): "license_plate",
+    ("ANPR", "vehicleInfo", "speed"): "speed",
+    ("DeviceGPSInfo", "Latitude", "degree"): "latitude",
+    ("DeviceGPSInfo", "Longitude", "degree"): "longitude",
+}
+
+
+def _local(tag: str) -> str:
+    # Con o sin namespace: algunos firmwares envían el XML sin él
+    return tag.rsplit("}", 1)[-1]
+
+
+@dataclass
+class AnprRecord:
+    license_plate: str = ""
+    date_time: str = ""
+    event_type: str = ""
+    speed: int = 0
+    latitude: str = ""
+    longitude: str = ""
+
+
+def extract_anpr(xml: bytes) -> Optional[AnprRecord]:
+    """Extrae los campos ANPR del XML; devuelve None si no es un evento válido."""
+    values = {}
+    path = []
+    parser = ET.XMLPullParser(events=("start", "end"))
+    try:
+        parser.feed(xml)
+        parser.close()
+        for event, elem in parser.read_events():
+            if event == "start":
+                path.append(_local(elem.tag))
+                continue
+            if path and path[0] == ROOT:
+                field = PATHS.get(tuple(path[1:]))
+                # Si una ruta se repite, cuenta la primera
+                if field is not None and field not in values:
+                    values[field] = (elem.text or "").strip()
+            path.pop()
+    except ET.ParseError as e:
+        print(f"❌ Error leyendo XML ANPR: {e}")
+        return None
+
+    if "license_plate" not in values:
+        return None
+
+    speed = values.pop("speed", "")
+    try:
+        speed = int(speed) if speed else 0
+    except ValueError:
+        speed = 0
+    return AnprRecord(speed=speed, **values)
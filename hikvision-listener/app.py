@@ -1,17 +1,19 @@
 from flask import Flask, request
 import os
-import json
 import base64
 import uuid
-import xmltodict
-import xml.etree.ElementTree as ET
+import atexit
+import signal
+import sys
 from datetime import datetime
-from email.parser import BytesParser
-from email.policy import default
+from event_log import EventLogWriter
+from evidence import EVIDENCE_MODE, make_reference
+from multipart_stream import parse_multipart_stream
+from anpr_xml import extract_anpr
+from disk_writer import DiskWriterPool, fsync_file, write_file
 
 app = Flask(__name__)
 
-FILE_PATH = "/eventos/eventos_consolidados.json"
 XML_FOLDER = "/eventos/xmls"
 IMG_FOLDER = "/eventos/imagenes"
 VIDEO_FOLDER = "/eventos/videos"
@@ -20,121 +22,131 @@ os.makedirs(XML_FOLDER, exist_ok=True)
 os.makedirs(IMG_FOLDER, exist_ok=True)
 os.makedirs(VIDEO_FOLDER, exist_ok=True)
 
-def strip_namespace(xml):
-    try:
-        tree = ET.ElementTree(ET.fromstring(xml))
-        root = tree.getroot()
-        for elem in root.iter():
-            if '}' in elem.tag:
-                elem.tag = elem.tag.split('}', 1)[1]
-        return ET.tostring(root, encoding='utf-8')
-    except Exception as e:
-        print(f"\u274c Error limpiando namespace: {e}")
-        return xml
+# Registro append-only de eventos (reemplaza eventos_consolidados.json)
+event_log = EventLogWriter()
+
+# Persistencia en segundo plano: el evento se registra antes de responder a la
+# cámara y el pool solo escribe el XML crudo y asegura las evidencias en disco
+writer_pool = DiskWriterPool()
+
+def cerrar_escritores():
+    """Vacía la cola de escritura y asegura el registro antes de salir.
+
+    Se llama desde ``atexit`` y desde el hook ``worker_exit`` de gunicorn.
+    """
+    writer_pool.shutdown()
+    event_log.close()
+
+atexit.register(cerrar_escritores)
+
+def construir_evidencias(imagenes):
+    """Evidencias del evento a partir de las imágenes ya escritas en disco."""
+    evidencias = {}
+    for nombre, part in imagenes.items():
+        if EVIDENCE_MODE == "base64":
+            with open(part.path, "rb") as f:
+                evidencias[nombre] = base64.b64encode(f.read()).decode("utf-8")
+        else:
+            evidencias[nombre] = make_reference(part.path, part.size, part.sha256, "image/jpeg")
+    return evidencias
+
+def persistir_evidencias(event_id, xml_raw, imagenes, video_path, plate):
+    """Trabajo de escritura: XML crudo, fsync de evidencias y del registro."""
+    write_file(os.path.join(XML_FOLDER, f"{event_id}.xml"), xml_raw)
+    for part in imagenes.values():
+        fsync_file(part.path)
+    if video_path:
+        fsync_file(video_path)
+    event_log.flush()
+    print(f"\u2705 Evento guardado: {plate} | UUID: {event_id}")
 
 @app.route('/eventos', methods=['POST'])
 def recibir_evento():
+    event_id = str(uuid.uuid4())
+    partes = []
     try:
-        content_type = request.headers.get("Content-Type")
-        raw_data = request.get_data()
-
-        msg = BytesParser(policy=default).parsebytes(
-            b"Content-Type: " + content_type.encode() + b"\n\n" + raw_data
-        )
-
-        xml_dict = None
+        content_type = request.headers.get("Content-Type", "")
+
+        def destino(part):
+            """Decide si la parte va a disco o se queda en memoria."""
+            if "anpr.xml" in part.content_disposition:
+                return None
+            if part.content_type == "image/jpeg" and part.filename:
+                return os.path.join(IMG_FOLDER, f"{event_id}_{os.path.basename(part.filename)}")
+            if part.content_type in ["video/mp4", "application/octet-stream"]:
+                return os.path.join(VIDEO_FOLDER, f"{event_id}.mp4")
+            return os.devnull
+
+        # Las imágenes y el video se escriben a disco mientras llegan
+        partes = parse_multipart_stream(request.stream, content_type, destino)
+
+        anpr = None
         xml_raw_original = None
         imagenes = {}
-        video_bytes = None
+        video_path = None
 
-        for part in msg.iter_parts():
-            content_disposition = part.get("Content-Disposition", "")
-            content_type = part.get_content_type()
+        for part in partes:
+            if "anpr.xml" in part.content_disposition:
+                xml_raw_original = part.data
+                anpr = extract_anpr(xml_raw_original)
 
-            if "anpr.xml" in content_disposition:
-                xml_raw_original = part.get_payload(decode=True)
-                xml_clean = strip_namespace(xml_raw_original)
-                xml_dict = xmltodict.parse(xml_clean)
+            elif part.content_type == "image/jpeg" and part.path:
+                imagenes[part.filename] = part
 
-            elif content_type == "image/jpeg":
-                filename = part.get_filename()
-                if filename:
-                    imagenes[filename] = part.get_payload(decode=True)
+            elif part.path:
+                video_path = part.path
 
-            elif content_type in ["video/mp4", "application/octet-stream"]:
-                video_bytes = part.get_payload(decode=True)
-
-        if xml_dict and xml_raw_original:
-            alert = xml_dict.get("EventNotificationAlert", {})
-            anpr = alert.get("ANPR", {})
-            vehicle_info = anpr.get("vehicleInfo", {})
-            gps_info = alert.get("DeviceGPSInfo", {})
-
-            plate = anpr.get("licensePlate", "").strip()
+        if anpr and xml_raw_original:
+            plate = anpr.license_plate
             if plate.lower() == "unknown":
+                for part in partes:
+                    part.discard()
                 print("\u26a0\ufe0f Evento descartado: placa 'unknown'")
                 return "OK", 200
 
-            latitude = gps_info.get("Latitude", {}).get("degree", "")
-            longitude = gps_info.get("Longitude", {}).get("degree", "")
-            speed = int(vehicle_info.get("speed", 0)) if vehicle_info.get("speed") else 0
-
-            event_id = str(uuid.uuid4())
-
-            # Guardar XML crudo
-            with open(os.path.join(XML_FOLDER, f"{event_id}.xml"), "wb") as f:
-                f.write(xml_raw_original)
-
-            # Guardar imágenes en disco y base64 para el JSON
-            evidencia_base64 = {}
-            for nombre, datos in imagenes.items():
-                ruta_img = os.path.join(IMG_FOLDER, f"{event_id}_{nombre}")
-                with open(ruta_img, "wb") as f:
-                    f.write(datos)
-                evidencia_base64[nombre] = base64.b64encode(datos).decode("utf-8")
-
-            # Guardar video si llega
-            video_nombre = None
-            if video_bytes:
-                video_nombre = f"{event_id}.mp4"
-                with open(os.path.join(VIDEO_FOLDER, video_nombre), "wb") as f:
-                    f.write(video_bytes)
-
             evento = {
                 "event_id": event_id,
                 "device_id": 88,
-                "latitude": latitude,
-                "longitude": longitude,
+                "latitude": anpr.latitude,
+                "longitude": anpr.longitude,
                 "location_address": "Col",
                 "plate": plate,
-                "date": alert.get("dateTime", ""),
-                "speed": speed,
+                "date": anpr.date_time,
+                "speed": anpr.speed,
                 "comments": "Red_Light_Running",
                 "infraction_code": "D04",
-                "evidences": evidencia_base64,
-                "video_filename": video_nombre
+                "evidences": construir_evidencias(imagenes),
+                "video_filename": os.path.basename(video_path) if video_path else None
             }
 
-            if os.path.exists(FILE_PATH):
-                with open(FILE_PATH, "r", encoding="utf-8") as f:
-                    eventos = json.load(f)
-            else:
-                eventos = []
-
-            eventos.append(evento)
-
-            with open(FILE_PATH, "w", encoding="utf-8") as f:
-                json.dump(eventos, f, indent=2, ensure_ascii=False)
+            # El evento queda en el registro antes del 200: una caída del
+            # proceso ya no lo pierde con la cola en memoria
+            event_log.append(evento)
+
+            # Las imágenes y el video ya están en disco; el fsync va en segundo plano
+            if not writer_pool.submit(
+                persistir_evidencias, event_id, xml_raw_original, imagenes, video_path, plate
+            ):
+                # El evento ya está registrado: con la cola llena se persiste
+                # aquí mismo, y la respuesta más lenta frena a la cámara
+                print(f"\u26a0\ufe0f Cola de escritura llena, persistiendo en línea: {plate} | {writer_pool.stats()}")
+                persistir_evidencias(event_id, xml_raw_original, imagenes, video_path, plate)
+                return "OK", 200
 
-            print(f"\u2705 Evento guardado: {plate} | UUID: {event_id}")
+            print(f"\U0001f4e5 Evento registrado: {plate} | UUID: {event_id}")
 
         else:
+            for part in partes:
+                part.discard()
             print("\u26a0\ufe0f XML no válido o no encontrado.")
 
     except Exception as e:
+        for part in partes:
+            part.discard()
+        # El cuerpo ya se consumió en streaming: se registran solo los encabezados
         fallback = "/eventos/error_evento.raw"
-        with open(fallback, "wb") as f:
-            f.write(request.get_data())
+        with open(fallback, "w", encoding="utf-8") as f:
+            f.write(f"{datetime.now().isoformat()} {event_id} {dict(request.headers)} {e}\n")
         print(f"\u274c Error procesando evento: {e}")
 
     return "OK", 200
@@ -144,4 +156,6 @@ def eventos_get():
     return 'Este endpoint solo acepta POST.', 200
 
 if __name__ == "__main__":
+    # SIGTERM (docker stop) debe pasar por atexit para vaciar la cola
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     app.run(host="0.0.0.0", port=8080) 
\ No newline at end of file
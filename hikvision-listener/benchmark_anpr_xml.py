@@ -0,0 +1,85 @@
+"""Compara el extractor ANPR con strip_namespace + xmltodict.
+
+Uso:
+    python benchmark_anpr_xml.py [--iterations 2000] [--dir eventos/xmls]
+"""
+import argparse
+import glob
+import os
+import time
+import xml.etree.ElementTree as ET
+
+from anpr_xml import AnprRecord, extract_anpr
+
+
+def legacy_extract(xml: bytes) -> AnprRecord:
+    """Camino anterior del listener: limpiar namespace y convertir con xmltodict."""
+    import xmltodict
+
+    root = ET.fromstring(xml)
+    for elem in root.iter():
+        if '}' in elem.tag:
+            elem.tag = elem.tag.split('}', 1)[1]
+    xml_dict = xmltodict.parse(ET.tostring(root, encoding='utf-8'))
+
+    alert = xml_dict.get("EventNotificationAlert", {})
+    anpr = alert.get("ANPR", {})
+    vehicle_info = anpr.get("vehicleInfo", {})
+    gps_info = alert.get("DeviceGPSInfo", {})
+    return AnprRecord(
+        license_plate=anpr.get("licensePlate", "").strip(),
+        date_time=alert.get("dateTime", ""),
+        event_type=alert.get("eventType", ""),
+        speed=int(vehicle_info.get("speed", 0)) if vehicle_info.get("speed") else 0,
+        latitude=gps_info.get("Latitude", {}).get("degree", ""),
+        longitude=gps_info.get("Longitude", {}).get("degree", ""),
+    )
+
+
+def run(name, func, samples, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for xml in samples:
+            func(xml)
+    elapsed = time.perf_counter() - start
+    per_event = elapsed / (iterations * len(samples)) * 1e6
+    print(f"{name:<28} {elapsed:8.3f} s  {per_event:8.1f} us/evento")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument(
+        "--dir",
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "eventos", "xmls")
+    )
+    args = parser.parse_args()
+
+    samples = []
+    for path in sorted(glob.glob(os.path.join(args.dir, "*.xml"))):
+        with open(path, "rb") as f:
+            samples.append(f.read())
+    if not samples:
+        raise SystemExit(f"No hay XML de muestra en {args.dir}")
+
+    print(f"{len(samples)} XML de muestra x {args.iterations} iteraciones")
+    for xml in samples:
+        print(f"  {extract_anpr(xml)}")
+
+    fast = run("pull parser (extract_anpr)", extract_anpr, samples, args.iterations)
+    try:
+        import xmltodict  # noqa: F401
+    except ImportError:
+        print("xmltodict no está instalado: se omite la comparación")
+        return
+
+    for xml in samples:
+        if legacy_extract(xml) != extract_anpr(xml):
+            raise SystemExit(f"Resultados distintos: {legacy_extract(xml)} != {extract_anpr(xml)}")
+    legacy = run("strip_namespace + xmltodict", legacy_extract, samples, args.iterations)
+    print(f"Aceleración: {legacy / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
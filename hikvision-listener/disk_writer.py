@@ -0,0 +1,125 @@
+"""Pool acotado de escritores en segundo plano para persistir evidencias.
+
+El handler de la cámara agrega el evento al registro y solo encola el
+trabajo de persistencia restante (XML crudo y fsync de imágenes, video y
+registro) antes de responder. La cola tiene tamaño máximo: si está llena,
+``submit`` espera hasta ``submit_timeout`` y devuelve False; el handler hace
+entonces el trabajo en línea (back-pressure). Al apagar el proceso,
+``shutdown`` vacía la cola antes de salir.
+"""
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+DISK_WRITER_WORKERS = int(os.getenv("DISK_WRITER_WORKERS", "4"))
+DISK_WRITER_QUEUE_SIZE = int(os.getenv("DISK_WRITER_QUEUE_SIZE", "256"))
+DISK_WRITER_SUBMIT_TIMEOUT = float(os.getenv("DISK_WRITER_SUBMIT_TIMEOUT", "2.0"))
+
+_STOP = object()
+
+
+class DiskWriterPool:
+    def __init__(
+        self,
+        workers: int = DISK_WRITER_WORKERS,
+        queue_size: int = DISK_WRITER_QUEUE_SIZE,
+        submit_timeout: float = DISK_WRITER_SUBMIT_TIMEOUT
+    ):
+        self.submit_timeout = submit_timeout
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"disk-writer-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, func: Callable[..., Any], *args, **kwargs) -> bool:
+        """Encola un trabajo. Devuelve False si la cola sigue llena tras el timeout."""
+        if self._closed:
+            return False
+        try:
+            self._queue.put((func, args, kwargs), timeout=self.submit_timeout)
+            return True
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            return False
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                func, args, kwargs = item
+                try:
+                    func(*args, **kwargs)
+                    with self._lock:
+                        self._completed += 1
+                except Exception as e:
+                    with self._lock:
+                        self._failed += 1
+                    print(f"❌ Error en escritura en segundo plano: {e}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que se procesen todos los trabajos encolados."""
+        if timeout is None:
+            self._queue.join()
+            return True
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def shutdown(self, timeout: Optional[float] = None):
+        """Deja de aceptar trabajos, vacía la cola y detiene los hilos."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self.flush(timeout)
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "pending": self._queue.qsize(),
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected
+            }
+
+
+def fsync_file(path: str):
+    """Asegura en disco un archivo ya escrito."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_file(path: str, data: bytes, sync: bool = True):
+    """Escribe un archivo completo de forma atómica (tmp + rename)."""
+    tmp_path = f"{path}.part"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        if sync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
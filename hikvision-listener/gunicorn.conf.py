@@ -0,0 +1,32 @@
+# Configuración de gunicorn para el listener de cámaras.
+#
+# Varios procesos con hilos (gthread) atienden ráfagas de varias cámaras en
+# paralelo. Cada worker tiene su propio DiskWriterPool y EventLogWriter; el
+# registro de eventos usa flock, así que las escrituras concurrentes entre
+# workers son seguras.
+#
+#   gunicorn -c gunicorn.conf.py app:app
+import multiprocessing
+import os
+import sys
+
+bind = os.getenv("LISTENER_BIND", "0.0.0.0:8080")
+workers = int(os.getenv("LISTENER_WORKERS", str(min(multiprocessing.cpu_count() * 2 + 1, 9))))
+worker_class = "gthread"
+threads = int(os.getenv("LISTENER_THREADS", "8"))
+
+# Los clips de video pueden tardar en subir por enlaces lentos
+timeout = int(os.getenv("LISTENER_TIMEOUT", "120"))
+# Tiempo para vaciar la cola de escritura al recibir SIGTERM
+graceful_timeout = int(os.getenv("LISTENER_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+
+
+def worker_exit(server, worker):
+    """Vacía la cola de escritura del worker antes de que termine."""
+    listener = sys.modules.get("app")
+    if listener is not None and hasattr(listener, "cerrar_escritores"):
+        listener.cerrar_escritores()
@@ -0,0 +1,143 @@
+"""Prueba de carga del endpoint /eventos.
+
+Reenvía cargas multipart/mixed como las de las cámaras Hikvision (XML de
+muestra de eventos/xmls, imágenes JPEG y opcionalmente un clip MP4) a una
+tasa configurable y reporta latencias y códigos de respuesta.
+
+Uso:
+    python load_test.py --url http://localhost:8080/eventos --rate 50 --duration 30
+    python load_test.py --rate 200 --concurrency 64 --image-kb 300 --video-kb 4096
+"""
+import argparse
+import glob
+import http.client
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+BOUNDARY = "MIME_boundary"
+IMAGE_NAMES = ["licensePlatePicture.jpg", "detectionPicture.jpg"]
+
+
+def fake_jpeg(size: int) -> bytes:
+    # SOI + relleno + EOI: suficiente para el listener, que no decodifica la imagen
+    return b"\xff\xd8\xff\xe0" + os.urandom(max(size - 6, 0)) + b"\xff\xd9"
+
+
+def build_payload(xml: bytes, image_kb: int, video_kb: int, plate: str) -> bytes:
+    xml = xml.replace(b"<licensePlate>", b"<licensePlate>" + plate.encode() + b"_", 1)
+    parts = [
+        (f'Content-Disposition: form-data; name="anpr.xml"; filename="anpr.xml"\r\n'
+         f"Content-Type: text/xml\r\n", xml)
+    ]
+    for name in IMAGE_NAMES:
+        parts.append((
+            f'Content-Disposition: form-data; name="{name}"; filename="{name}"\r\n'
+            f"Content-Type: image/jpeg\r\n",
+            fake_jpeg(image_kb * 1024)
+        ))
+    if video_kb:
+        parts.append((
+            'Content-Disposition: form-data; name="video"; filename="video.mp4"\r\n'
+            "Content-Type: video/mp4\r\n",
+            os.urandom(video_kb * 1024)
+        ))
+    body = b""
+    for headers, data in parts:
+        body += f"--{BOUNDARY}\r\n{headers}\r\n".encode() + data + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.statuses = Counter()
+
+    def record(self, status, latency):
+        with self.lock:
+            self.statuses[status] += 1
+            self.latencies.append(latency)
+
+    def percentile(self, p):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def send(url, payload, timeout, stats):
+    start = time.perf_counter()
+    status = "error"
+    try:
+        conn_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        conn = conn_class(url.hostname, url.port, timeout=timeout)
+        conn.request("POST", url.path or "/eventos", body=payload, headers={
+            "Content-Type": f"multipart/mixed; boundary={BOUNDARY}",
+            "Content-Length": str(len(payload))
+        })
+        response = conn.getresponse()
+        response.read()
+        status = response.status
+        conn.close()
+    except Exception as e:
+        status = type(e).__name__
+    stats.record(status, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8080/eventos")
+    parser.add_argument("--rate", type=float, default=20.0, help="eventos por segundo")
+    parser.add_argument("--duration", type=float, default=10.0, help="segundos")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--image-kb", type=int, default=200)
+    parser.add_argument("--video-kb", type=int, default=0)
+    parser.add_argument("--payloads", type=int, default=8, help="cargas distintas a rotar")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument(
+        "--xml-dir",
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "eventos", "xmls")
+    )
+    args = parser.parse_args()
+
+    xmls = []
+    for path in sorted(glob.glob(os.path.join(args.xml_dir, "*.xml"))):
+        with open(path, "rb") as f:
+            xmls.append(f.read())
+    if not xmls:
+        raise SystemExit(f"No hay XML de muestra en {args.xml_dir}")
+
+    payloads = [
+        build_payload(random.choice(xmls), args.image_kb, args.video_kb, uuid.uuid4().hex[:6].upper())
+        for _ in range(args.payloads)
+    ]
+    url = urlparse(args.url)
+    stats = Stats()
+    total = int(args.rate * args.duration)
+    interval = 1.0 / args.rate
+
+    print(f"Enviando {total} eventos a {args.url} ({args.rate}/s, {len(payloads[0]) // 1024} KiB c/u)")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for i in range(total):
+            # Programación en lazo abierto: la tasa no depende de la latencia
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, url, payloads[i % len(payloads)], args.timeout, stats)
+    elapsed = time.perf_counter() - start
+
+    print(f"Tiempo total: {elapsed:.2f} s  ({total / elapsed:.1f} eventos/s logrados)")
+    print(f"Respuestas: {dict(stats.statuses)}")
+    for label, p in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99), ("max", 1.0)):
+        print(f"  {label}: {stats.percentile(p) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""Parser multipart/mixed en streaming para las cargas ANPR de las cámaras.
+
+Lee el cuerpo de la petición por bloques y nunca lo tiene completo en memoria:
+las partes binarias (imágenes, video) se escriben directamente a disco a
+medida que llegan y solo las partes pequeñas (el ``anpr.xml``) se guardan en
+memoria. La memoria usada por petición queda acotada por ``chunk_size`` sin
+importar el tamaño del clip.
+
+Las partes con ``Content-Transfer-Encoding: base64`` se decodifican: las de
+memoria al cerrarse y las de disco por bloques, guardando entre bloques los
+caracteres que no completan un grupo de cuatro. En disco quedan los bytes
+decodificados, y ``size``/``sha256`` se calculan sobre ellos.
+"""
+import base64
+import binascii
+import hashlib
+import os
+from typing import BinaryIO, Callable, Dict, List, Optional
+
+CHUNK_SIZE = 64 * 1024
+MAX_HEADER_BYTES = 16 * 1024
+MAX_MEMORY_PART = 1024 * 1024
+
+
+class MultipartError(ValueError):
+    """El cuerpo recibido no es un multipart válido."""
+
+
+class StreamedPart:
+    """Una parte del multipart, en memoria (``data``) o en disco (``path``)."""
+
+    def __init__(self, headers: Dict[str, str]):
+        self.headers = headers
+        self.content_type = headers.get("content-type", "").split(";", 1)[0].strip().lower()
+        self.content_disposition = headers.get("content-disposition", "")
+        self.filename = _header_param(self.content_disposition, "filename")
+        self.name = _header_param(self.content_disposition, "name")
+        self.path: Optional[str] = None
+        self.data: Optional[bytes] = None
+        self.size = 0
+        self.sha256: Optional[str] = None
+        self._sink: Optional[BinaryIO] = None
+        self._tmp_path: Optional[str] = None
+        self._buffer: Optional[bytearray] = None
+        # Caracteres base64 pendientes de completar un grupo de cuatro (partes en disco)
+        self._base64_carry: Optional[bytearray] = None
+        self._digest = hashlib.sha256()
+
+    @property
+    def base64_encoded(self) -> bool:
+        return self.headers.get("content-transfer-encoding", "").strip().lower() == "base64"
+
+    def _open(self, path: Optional[str], max_memory: int):
+        self._max_memory = max_memory
+        if path == os.devnull:
+            self._sink = open(os.devnull, "wb")
+        elif path:
+            self.path = path
+            self._tmp_path = f"{path}.part"
+            self._sink = open(self._tmp_path, "wb")
+            if self.base64_encoded:
+                self._base64_carry = bytearray()
+        else:
+            self._buffer = bytearray()
+
+    def _decode_base64(self, chunk: bytes, final: bool = False) -> bytes:
+        carry = self._base64_carry
+        carry.extend(chunk.translate(None, b" \t\r\n"))
+        usable = len(carry) if final else len(carry) - len(carry) % 4
+        encoded = bytes(carry[:usable])
+        del carry[:usable]
+        if final and len(encoded) % 4:
+            encoded += b"=" * (-len(encoded) % 4)
+        try:
+            return base64.b64decode(encoded, validate=True)
+        except binascii.Error as e:
+            raise MultipartError(f"Base64 inválido en la parte '{self.filename or self.name}': {e}")
+
+    def _write(self, chunk: bytes):
+        if self._base64_carry is not None and chunk:
+            chunk = self._decode_base64(chunk)
+        if not chunk:
+            return
+        self.size += len(chunk)
+        self._digest.update(chunk)
+        if self._sink is not None:
+            self._sink.write(chunk)
+        else:
+            if self.size > self._max_memory:
+                raise MultipartError(
+                    f"La parte '{self.filename or self.name}' excede {self._max_memory} bytes en memoria"
+                )
+            self._buffer.extend(chunk)
+
+    def _close(self):
+        if self._base64_carry is not None:
+            tail = self._decode_base64(b"", final=True)
+            self._base64_carry = None
+            self._write(tail)
+        self.sha256 = self._digest.hexdigest()
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+            if self._tmp_path:
+                os.replace(self._tmp_path, self.path)
+        else:
+            data = bytes(self._buffer)
+            if self.base64_encoded:
+                data = base64.b64decode(data)
+            self.data = data
+            self._buffer = None
+
+    def _abort(self):
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+        if self._tmp_path and os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def discard(self):
+        """Elimina el archivo escrito para esta parte, si existe."""
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _header_param(value: str, param: str) -> Optional[str]:
+    for item in value.split(";")[1:]:
+        key, _, raw = item.strip().partition("=")
+        if key.strip().lower() == param:
+            return raw.strip().strip('"')
+    return None
+
+
+def get_boundary(content_type: str) -> bytes:
+    """Extrae el boundary del encabezado Content-Type."""
+    boundary = _header_param(content_type or "", "boundary")
+    if not boundary:
+        raise MultipartError(f"Content-Type sin boundary: {content_type}")
+    return boundary.encode("latin-1")
+
+
+def _parse_headers(raw: bytes) -> Dict[str, str]:
+    headers = {}
+    for line in raw.decode("latin-1").split("\r\n"):
+        if not line:
+            continue
+        key, sep, value = line.partition(":")
+        if not sep:
+            raise MultipartError(f"Encabezado de parte inválido: {line!r}")
+        headers[key.strip().lower()] = value.strip()
+    return headers
+
+
+def parse_multipart_stream(
+    stream: BinaryIO,
+    content_type: str,
+    sink_path: Callable[[StreamedPart], Optional[str]],
+    chunk_size: int = CHUNK_SIZE,
+    max_memory_part: int = MAX_MEMORY_PART
+) -> List[StreamedPart]:
+    """Recorre el multipart leyendo ``stream`` por bloques.
+
+    ``sink_path(part)`` se llama con los encabezados de cada parte y devuelve
+    la ruta donde escribirla, o ``None`` para guardarla en memoria. Si la parte
+    no interesa puede devolver ``os.devnull``.
+    """
+    delimiter = b"\r\n--" + get_boundary(content_type)
+    # El primer delimitador no va precedido de CRLF
+    buffer = bytearray(b"\r\n")
+    parts: List[StreamedPart] = []
+    part: Optional[StreamedPart] = None
+    state = "preamble"
+    eof = False
+
+    def fill() -> bool:
+        chunk = stream.read(chunk_size)
+        if chunk:
+            buffer.extend(chunk)
+            return True
+        return False
+
+    try:
+        while True:
+            if state == "preamble":
+                index = buffer.find(delimiter)
+                if index == -1:
+                    # Conservar solo lo que podría ser el inicio del delimitador
+                    del buffer[:max(0, len(buffer) - len(delimiter))]
+                    if eof or not fill():
+                        raise MultipartError("No se encontró el boundary inicial")
+                    continue
+                del buffer[:index + len(delimiter)]
+                state = "after_delimiter"
+
+            elif state == "after_delimiter":
+                if len(buffer) < 2 and not eof:
+                    eof = not fill()
+                    continue
+                if buffer[:2] == b"--":
+                    return parts
+                line_end = buffer.find(b"\r\n")
+                if line_end == -1:
+                    if eof or len(buffer) > MAX_HEADER_BYTES:
+                        raise MultipartError("Delimitador de parte incompleto")
+                    eof = not fill()
+                    continue
+                del buffer[:line_end + 2]
+                state = "headers"
+
+            elif state == "headers":
+                if buffer[:2] == b"\r\n":
+                    raw_headers, consumed = b"", 2
+                else:
+                    end = buffer.find(b"\r\n\r\n")
+                    if end == -1:
+                        if eof or len(buffer) > MAX_HEADER_BYTES:
+                            raise MultipartError("Encabezados de parte incompletos")
+                        eof = not fill()
+                        continue
+                    raw_headers, consumed = bytes(buffer[:end]), end + 4
+                del buffer[:consumed]
+                part = StreamedPart(_parse_headers(raw_headers))
+                part._open(sink_path(part), max_memory_part)
+                state = "body"
+
+            elif state == "body":
+                index = buffer.find(delimiter)
+                if index != -1:
+                    part._write(bytes(buffer[:index]))
+                    del buffer[:index + len(delimiter)]
+                    part._close()
+                    parts.append(part)
+                    part = None
+                    state = "after_delimiter"
+                    continue
+                safe = len(buffer) - len(delimiter) + 1
+                if safe > 0:
+                    part._write(bytes(buffer[:safe]))
+                    del buffer[:safe]
+                if eof or not fill():
+                    raise MultipartError("El cuerpo terminó antes del boundary final")
+    except Exception:
+        if part is not None:
+            part._abort()
+        for done in parts:
+            done.discard()
+        raise
@@ -1,18 +1,35 @@
 import json
+import logging
 import os
+import sys
 import requests
 from datetime import datetime
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import time
 
+try:
+    from event_log import EventLogWriter
+except ImportError:
+    # Fuera del contenedor: usar el módulo compartido de app/ (el Dockerfile lo copia)
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+    from event_log import EventLogWriter
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 CORS(app)
 
 # Configuración
-EVENTOS_FILE = "/eventos/eventos_consolidados.json"
 API_SERVICE_URL = "http://api-consumer:8000/process"  # URL del servicio API
 
+# Registro append-only de eventos (reemplaza eventos_consolidados.json)
+event_log = EventLogWriter()
+
 def notify_api_service():
     """Notifica al servicio API que hay un nuevo evento para procesar"""
     try:
@@ -55,24 +72,9 @@ def receive_event():
 
         print(f"[{datetime.now()}] Evento recibido: {json.dumps(data, indent=2)}")
 
-        # Asegurar que el directorio existe
-        os.makedirs(os.path.dirname(EVENTOS_FILE), exist_ok=True)
-
-        # Leer eventos existentes
-        eventos = []
-        if os.path.exists(EVENTOS_FILE):
-            with open(EVENTOS_FILE, 'r', encoding='utf-8') as f:
-                eventos = json.load(f)
-                print(f"[{datetime.now()}] Eventos existentes cargados: {len(eventos)}")
-
-        # Agregar el nuevo evento
-        eventos.append(data)
-        print(f"[{datetime.now()}] Nuevo evento agregado. Total de eventos: {len(eventos)}")
-
-        # Guardar todos los eventos
-        with open(EVENTOS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(eventos, f, ensure_ascii=False, indent=2)
-        print(f"[{datetime.now()}] Eventos guardados en {EVENTOS_FILE}")
+        # Agregar el nuevo evento al registro
+        event_log.append(data)
+        logger.info(f"Evento agregado al registro en {event_log.log_dir}")
 
         # Notificar al servicio API
         notify_api_service()
@@ -84,5 +86,8 @@ def receive_event():
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
+    # Solo para desarrollo. En producción usar varios workers, p. ej.:
+    #   gunicorn -c ../hikvision-listener/gunicorn.conf.py app:app
+    # (event_log usa flock, así que los workers pueden escribir a la vez)
     print(f"[{datetime.now()}] Iniciando servidor Hikvision en puerto 8080")
-    app.run(host='0.0.0.0', port=8080) 
\ No newline at end of file
+    app.run(host='0.0.0.0', port=8080, threaded=True) 
\ No newline at end of file
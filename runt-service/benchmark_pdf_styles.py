@@ -0,0 +1,146 @@
+"""Costo por documento de los estilos en línea frente a la hoja base preparseada.
+
+Renderiza ``templates/report.html`` varias veces de tres formas:
+
+- ``en línea``: el ``<style>`` base dentro de cada documento, como se hacía
+  antes; WeasyPrint lo parsea en cada render.
+- ``preparseada``: la hoja ``REPORT`` de ``services.pdf_styles`` parseada una
+  vez y pasada con ``stylesheets=``, cada documento con su propia
+  ``FontConfiguration``.
+- ``preparseada + fuentes``: además, una ``FontConfiguration`` compartida,
+  como en los procesos de ``services.pdf_render_pool``.
+
+Verifica que las tres formas produzcan la misma maquetación: mismo número de
+páginas y, caja por caja, el mismo texto, posición, tamaño y estilos
+calculados. Las hojas de ``stylesheets=`` son de usuario y el ``<style>`` en
+línea era de autor, así que una regla base que antes ganaba por
+especificidad y ahora pierde frente a la plantilla aparece como diferencia.
+
+Uso:
+    python benchmark_pdf_styles.py
+    python benchmark_pdf_styles.py --template templates/report.html --iterations 50
+"""
+import argparse
+import os
+import sys
+import time
+
+from weasyprint import CSS, HTML
+from weasyprint.text.fonts import FontConfiguration
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from services.pdf_styles import REPORT, STYLESHEETS, wrap_document  # noqa: E402
+
+
+def inline_document(body: str) -> str:
+    """Documento con la hoja base en línea, como lo armaba ``PdfService``."""
+    return f"""
+    <html>
+        <head>
+            <meta charset="UTF-8">
+            <style>{STYLESHEETS[REPORT]}</style>
+        </head>
+        <body>
+            {body}
+        </body>
+    </html>
+    """
+
+
+# Estilos calculados que se comparan en cada caja
+LAYOUT_STYLES = ("color", "background_color", "font_family", "font_size", "font_weight",
+                 "text_align", "border_top_width", "padding_top", "margin_top", "line_height")
+
+
+def layout(document) -> list:
+    """Texto, posición, tamaño y estilos de cada caja de cada página."""
+    boxes = []
+    for number, page in enumerate(document.pages):
+        for box in page._page_box.descendants():
+            style = getattr(box, "style", None)
+            boxes.append((
+                number,
+                type(box).__name__,
+                getattr(box, "element_tag", None),
+                getattr(box, "text", None),
+                round(box.position_x, 2),
+                round(box.position_y, 2),
+                round(box.width or 0, 2),
+                round(box.height or 0, 2),
+                tuple(str(style[name]) for name in LAYOUT_STYLES) if style is not None else None
+            ))
+    return boxes
+
+
+def compare_layouts(layouts: dict) -> bool:
+    """Informa la primera caja distinta de cada forma respecto de ``en línea``."""
+    reference = layouts["en línea"]
+    same = True
+    for label, boxes in layouts.items():
+        if boxes == reference:
+            continue
+        same = False
+        for index, (expected, actual) in enumerate(zip(reference, boxes)):
+            if expected != actual:
+                print(f"Maquetación distinta en '{label}', caja {index}:\n"
+                      f"  en línea: {expected}\n  {label}: {actual}")
+                break
+        else:
+            print(f"Maquetación distinta en '{label}': {len(boxes)} cajas frente a {len(reference)}")
+    return same
+
+
+def measure(label: str, iterations: int, render) -> float:
+    render()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        render()
+    per_document = (time.perf_counter() - start) / iterations * 1000
+    print(f"{label:<24} {per_document:8.1f} ms/documento")
+    return per_document
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--template", default=os.path.join(HERE, "templates", "report.html"),
+                        help="plantilla HTML a renderizar")
+    parser.add_argument("--iterations", type=int, default=20, help="documentos por forma")
+    args = parser.parse_args()
+
+    with open(args.template, encoding="utf-8") as f:
+        body = f.read()
+
+    shared_fonts = FontConfiguration()
+    stylesheet = CSS(string=STYLESHEETS[REPORT], font_config=shared_fonts)
+    inline_html = inline_document(body)
+    wrapped_html = wrap_document(body)
+
+    # Paridad
+    documents = {
+        "en línea": HTML(string=inline_html).render(),
+        "preparseada": HTML(string=wrapped_html).render(stylesheets=[stylesheet]),
+        "preparseada + fuentes": HTML(string=wrapped_html).render(stylesheets=[stylesheet], font_config=shared_fonts)
+    }
+    pages = {label: len(document.pages) for label, document in documents.items()}
+    print(f"Páginas: {pages}")
+    same_layout = compare_layouts({label: layout(document) for label, document in documents.items()})
+    print(f"Maquetación: {'igual' if same_layout else 'distinta'}")
+
+    # Rendimiento
+    inline = measure("en línea", args.iterations,
+                     lambda: HTML(string=inline_html).write_pdf())
+    parsed = measure("preparseada", args.iterations,
+                     lambda: HTML(string=wrapped_html).write_pdf(stylesheets=[stylesheet]))
+    shared = measure("preparseada + fuentes", args.iterations,
+                     lambda: HTML(string=wrapped_html).write_pdf(stylesheets=[stylesheet], font_config=shared_fonts))
+    print(f"Ahorro por documento: {inline - parsed:.1f} ms con la hoja preparseada, "
+          f"{inline - shared:.1f} ms compartiendo además las fuentes "
+          f"({(inline - shared) / inline * 100:.0f}%)")
+
+    sys.exit(0 if len(set(pages.values())) == 1 and same_layout else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Paridad y rendimiento del firmador RSA en proceso frente a ``sign.js``.
+
+Firma un conjunto de cadenas con ``services.rsa_signer`` y con
+``node sign.js`` y verifica que las firmas sean idénticas byte a byte; luego
+mide firmas por segundo de ambos.
+
+Uso:
+    python benchmark_rsa_signer.py                      # llave temporal de 2048 bits
+    python benchmark_rsa_signer.py --key claveprivada.pkcs8.pem --iterations 2000
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from Crypto.PublicKey import RSA
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from services.rsa_signer import RsaSigner  # noqa: E402
+
+SAMPLES = [
+    "",
+    "a",
+    '{"usuario":"900133384","clave":"900133384"}',
+    json.dumps({"noPlaca": "ABC123", "procedencia": "NACIONAL"}, separators=(",", ":")),
+    "ñandú áéíóú ÑÁÉÍÓÚ ü €",
+    "emoji 🚗🚓 y caracteres fuera del BMP 𝄞",
+    "línea\ncon\r\nsaltos\ty tabulaciones",
+    "x" * 4096,
+    "'comillas' \"dobles\" `backticks` $variables \\barras",
+]
+
+
+def prepare_node_dir(key_path: str) -> str:
+    """Directorio con sign.js, jsrsasign y la llave (sign.js usa rutas relativas)."""
+    workdir = tempfile.mkdtemp(prefix="rsa-parity-")
+    shutil.copy(os.path.join(HERE, "sign.js"), workdir)
+    shutil.copy(os.path.join(HERE, "jsrsasign-js.txt"), workdir)
+    shutil.copy(key_path, os.path.join(workdir, "claveprivada.pkcs8.pem"))
+    return workdir
+
+
+def sign_node(workdir: str, data: str) -> str:
+    result = subprocess.run(
+        ["node", "sign.js", data], cwd=workdir, capture_output=True, check=True
+    )
+    return result.stdout.decode().strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--key", help="llave privada PKCS#8 PEM (por defecto, una temporal)")
+    parser.add_argument("--iterations", type=int, default=1000, help="firmas en proceso a medir")
+    parser.add_argument("--node-iterations", type=int, default=20, help="firmas con node a medir")
+    args = parser.parse_args()
+
+    key_path = args.key
+    if not key_path:
+        key_path = os.path.join(tempfile.mkdtemp(prefix="rsa-key-"), "claveprivada.pkcs8.pem")
+        with open(key_path, "wb") as f:
+            f.write(RSA.generate(2048).export_key(format="PEM", pkcs=8))
+        print(f"Llave temporal de 2048 bits: {key_path}")
+
+    signer = RsaSigner(key_path)
+    have_node = shutil.which("node") is not None
+    workdir = prepare_node_dir(key_path) if have_node else None
+
+    # Paridad
+    if have_node:
+        mismatches = 0
+        for sample in SAMPLES:
+            native, node = signer.sign(sample), sign_node(workdir, sample)
+            if native != node:
+                mismatches += 1
+                print(f"DIFERENCIA para {sample[:40]!r}:\n  python: {native}\n  node:   {node}")
+            elif not signer.verify(sample, native):
+                mismatches += 1
+                print(f"Firma no verificable para {sample[:40]!r}")
+        print(f"Paridad: {len(SAMPLES) - mismatches}/{len(SAMPLES)} firmas idénticas")
+    else:
+        mismatches = 0
+        print("node no está instalado: se omite la comparación con sign.js")
+
+    # Rendimiento
+    data = SAMPLES[3]
+    signer.sign(data)
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        signer.sign(data)
+    native_elapsed = time.perf_counter() - start
+    print(f"En proceso: {args.iterations / native_elapsed:10.1f} firmas/s "
+          f"({native_elapsed / args.iterations * 1000:.3f} ms c/u)")
+
+    if have_node:
+        start = time.perf_counter()
+        for _ in range(args.node_iterations):
+            sign_node(workdir, data)
+        node_elapsed = time.perf_counter() - start
+        print(f"node sign.js: {args.node_iterations / node_elapsed:8.1f} firmas/s "
+              f"({node_elapsed / args.node_iterations * 1000:.3f} ms c/u)")
+        print(f"Aceleración: {(node_elapsed / args.node_iterations) / (native_elapsed / args.iterations):.0f}x")
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
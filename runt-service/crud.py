@@ -1,4 +1,6 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, selectinload
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 from models import (
@@ -8,6 +10,7 @@ from models import (
     PolicyDetail, PdfTemplate, GeneratedPdf, Event
 )
 from schemas import ApiEndpointCreate, GlobalVariableCreate, GlobalVariableUpdate
+from services.template_cache import get_template_cache
 import logging
 import traceback
 
@@ -100,14 +103,151 @@ def update_api_endpoint(
         db.refresh(endpoint)
     return endpoint
 
+def _to_bool(value) -> Optional[bool]:
+    """Convierte 'SI'/'NO' del RUNT a boolean."""
+    if isinstance(value, bool):
+        return value
+    return value.upper() == 'SI' if value else False
+
+def _to_date(value) -> Optional[datetime]:
+    try:
+        return datetime.strptime(value, "%d/%m/%Y")
+    except (TypeError, ValueError):
+        return None
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+# Campo de la respuesta RUNT -> (columna, conversión)
+VEHICLE_INFO_FIELDS = {
+    "noRegistro": ("no_registro", None),
+    "noLicenciaTransito": ("no_licencia_transito", None),
+    "fechaExpedicionLicTransito": ("fecha_expedicion_lic_transito", _to_date),
+    "estadoDelVehiculo": ("estado_vehiculo", None),
+    "tipoServicio": ("tipo_servicio", None),
+    "claseVehiculo": ("clase_vehiculo", None),
+    "marca": ("marca", None),
+    "linea": ("linea", None),
+    "modelo": ("modelo", None),
+    "color": ("color", None),
+    "noSerie": ("no_serie", None),
+    "noMotor": ("no_motor", None),
+    "noChasis": ("no_chasis", None),
+    "noVin": ("no_vin", None),
+    "cilindraje": ("cilindraje", None),
+    "tipoCarroceria": ("tipo_carroceria", None),
+    "fechaMatricula": ("fecha_matricula", _to_date),
+    "tieneGravamenes": ("tiene_gravamenes", _to_bool),
+    "organismoTransito": ("organismo_transito", None),
+    "prendas": ("prendas", _to_bool),
+    "prendario": ("prendario", None),
+    "clasificacion": ("clasificacion", None),
+    "capacidadCarga": ("capacidad_carga", None),
+    "pesoBrutoVehicular": ("peso_bruto_vehicular", None),
+    "noEjes": ("no_ejes", _to_int)
+}
+
+VEHICLE_OWNER_FIELDS = {
+    "tipoDocumento": ("tipo_documento", None),
+    "noDocumento": ("numero_documento", None),
+    "nombreCompleto": ("nombre_completo", None),
+    "primerNombre": ("primer_nombre", None),
+    "segundoNombre": ("segundo_nombre", None),
+    "primerApellido": ("primer_apellido", None),
+    "segundoApellido": ("segundo_apellido", None),
+    "tipoPropiedad": ("tipo_propiedad", _to_int),
+    "detallePropiedad": ("detalle_propiedad", None),
+    "fechaNacimiento": ("fecha_nacimiento", _to_date)
+}
+
+VEHICLE_SOAT_FIELDS = {
+    "noPoliza": ("no_poliza", None),
+    "fechaExpedicion": ("fecha_expedicion", _to_date),
+    "fechaVigencia": ("fecha_vigencia", _to_date),
+    "fechaVencimiento": ("fecha_vencimiento", _to_date),
+    "nitEntidad": ("nit_entidad", None),
+    "entidadExpideSoat": ("entidad_expide", None),
+    "estado": ("estado", None)
+}
+
+VEHICLE_RTM_FIELDS = {
+    "nroRTM": ("nro_rtm", None),
+    "tipoRevision": ("tipo_revision", None),
+    "fechaExpedicion": ("fecha_expedicion", _to_date),
+    "fechaVigente": ("fecha_vigente", _to_date),
+    "cdaExpide": ("cda_expide", None),
+    "vigente": ("vigente", _to_bool)
+}
+
+OWNER_ADDRESS_FIELDS = {
+    "direccion": ("direccion", None),
+    "departamento": ("departamento", None),
+    "ciudad": ("ciudad", None),
+    "telefono": ("telefono", None),
+    "celular": ("celular", None),
+    "email": ("email", None)
+}
+
+CIVIL_POLICY_FIELDS = {
+    "numeroPoliza": ("numero_poliza", None),
+    "fechaExpedicion": ("fecha_expedicion", _to_date),
+    "fechaVigencia": ("fecha_vigencia", _to_date),
+    "tipoDocumento": ("tipo_documento", None),
+    "numeroDocumento": ("numero_documento", None),
+    "nombreAseguradora": ("nombre_aseguradora", None),
+    "tipoPoliza": ("tipo_poliza", None),
+    "fechaInicio": ("fecha_inicio", _to_date),
+    "estadoPoliza": ("estado_poliza", None)
+}
+
+POLICY_DETAIL_FIELDS = {
+    "nroPoliza": ("nro_poliza", None),
+    "tipoDocTomador": ("tipo_doc_tomador", None),
+    "nroDocTomador": ("nro_doc_tomador", None),
+    "cobertura": ("cobertura", None),
+    "monto": ("monto", None)
+}
+
+# Secciones de la respuesta ``vehiculo`` que se guardan como filas hijas:
+# (modelo, clave RUNT, campos, columna del padre, secciones anidadas)
+RUNT_CHILD_SECTIONS = (
+    (VehicleOwner, "propietarios", VEHICLE_OWNER_FIELDS, "vehicle_id", (
+        (VehicleOwnerAddress, "direcciones", OWNER_ADDRESS_FIELDS, "owner_id", ()),
+    )),
+    (VehicleSoat, "soat", VEHICLE_SOAT_FIELDS, "vehicle_id", ()),
+    (VehicleRtm, "rtm", VEHICLE_RTM_FIELDS, "vehicle_id", ()),
+    (VehicleCivilPolicy, "polizas", CIVIL_POLICY_FIELDS, "vehicle_id", (
+        (PolicyDetail, "detalles", POLICY_DETAIL_FIELDS, "policy_id", ()),
+    ))
+)
+
+def map_runt_fields(data: dict, fields: dict, partial: bool = False) -> dict:
+    """Traduce un registro del RUNT a columnas del modelo.
+
+    Con ``partial`` solo se incluyen los campos presentes en ``data``.
+    """
+    values = {}
+    for key, (column, convert) in fields.items():
+        if partial and key not in data:
+            continue
+        value = data.get(key)
+        values[column] = convert(value) if convert else value
+    return values
+
+def _runt_items(data: dict, key: str) -> List[dict]:
+    """Registros de una sección del RUNT, venga como objeto o como lista."""
+    value = data.get(key)
+    if isinstance(value, dict):
+        return [value]
+    if isinstance(value, list):
+        return [item for item in value if isinstance(item, dict)]
+    return []
+
 def create_vehicle_info(db: Session, vehicle_data: dict) -> VehicleInfo:
     """Crea o actualiza la información del vehículo"""
-    # Función auxiliar para convertir 'SI'/'NO' a boolean
-    def to_bool(value: str) -> bool:
-        if isinstance(value, bool):
-            return value
-        return value.upper() == 'SI' if value else False
-
     vehicle = db.query(VehicleInfo).filter(
         VehicleInfo.plate == vehicle_data["noPlaca"]
     ).first()
@@ -115,53 +255,13 @@ def create_vehicle_info(db: Session, vehicle_data: dict) -> VehicleInfo:
     if not vehicle:
         vehicle = VehicleInfo(
             plate=vehicle_data["noPlaca"],
-            no_registro=vehicle_data["noRegistro"],
-            no_licencia_transito=vehicle_data["noLicenciaTransito"],
-            fecha_expedicion_lic_transito=datetime.strptime(
-                vehicle_data["fechaExpedicionLicTransito"], 
-                "%d/%m/%Y"
-            ),
-            estado_vehiculo=vehicle_data["estadoDelVehiculo"],
-            tipo_servicio=vehicle_data["tipoServicio"],
-            clase_vehiculo=vehicle_data["claseVehiculo"],
-            marca=vehicle_data["marca"],
-            linea=vehicle_data["linea"],
-            modelo=vehicle_data["modelo"],
-            color=vehicle_data["color"],
-            no_serie=vehicle_data["noSerie"],
-            no_motor=vehicle_data["noMotor"],
-            no_chasis=vehicle_data["noChasis"],
-            no_vin=vehicle_data["noVin"],
-            cilindraje=vehicle_data["cilindraje"],
-            tipo_carroceria=vehicle_data["tipoCarroceria"],
-            fecha_matricula=datetime.strptime(
-                vehicle_data["fechaMatricula"], 
-                "%d/%m/%Y"
-            ),
-            tiene_gravamenes=to_bool(vehicle_data["tieneGravamenes"]),
-            organismo_transito=vehicle_data["organismoTransito"],
-            prendas=to_bool(vehicle_data["prendas"]),
-            prendario=vehicle_data["prendario"],
-            clasificacion=vehicle_data["clasificacion"],
-            capacidad_carga=vehicle_data["capacidadCarga"],
-            peso_bruto_vehicular=vehicle_data["pesoBrutoVehicular"],
-            no_ejes=int(vehicle_data["noEjes"])
+            **map_runt_fields(vehicle_data, VEHICLE_INFO_FIELDS)
         )
         db.add(vehicle)
     else:
-        # Actualizar los campos existentes
-        for key, value in vehicle_data.items():
-            if hasattr(vehicle, key):
-                # Convertir campos booleanos
-                if key in ["tieneGravamenes", "prendas"]:
-                    value = to_bool(value)
-                # Convertir fechas
-                elif key in ["fechaExpedicionLicTransito", "fechaMatricula"]:
-                    value = datetime.strptime(value, "%d/%m/%Y")
-                # Convertir enteros
-                elif key == "noEjes":
-                    value = int(value)
-                setattr(vehicle, key, value)
+        # Actualizar solo los campos recibidos
+        for key, value in map_runt_fields(vehicle_data, VEHICLE_INFO_FIELDS, partial=True).items():
+            setattr(vehicle, key, value)
     
     db.commit()
     db.refresh(vehicle)
@@ -171,19 +271,7 @@ def create_vehicle_owner(db: Session, owner_data: dict, vehicle_id: int) -> Vehi
     """Crea o actualiza la información del propietario"""
     owner = VehicleOwner(
         vehicle_id=vehicle_id,
-        tipo_documento=owner_data["tipoDocumento"],
-        numero_documento=owner_data["noDocumento"],
-        nombre_completo=owner_data["nombreCompleto"],
-        primer_nombre=owner_data.get("primerNombre"),
-        segundo_nombre=owner_data.get("segundoNombre"),
-        primer_apellido=owner_data.get("primerApellido"),
-        segundo_apellido=owner_data.get("segundoApellido"),
-        tipo_propiedad=owner_data.get("tipoPropiedad"),
-        detalle_propiedad=owner_data.get("detallePropiedad"),
-        fecha_nacimiento=datetime.strptime(
-            owner_data["fechaNacimiento"], 
-            "%d/%m/%Y"
-        ) if "fechaNacimiento" in owner_data else None
+        **map_runt_fields(owner_data, VEHICLE_OWNER_FIELDS)
     )
     db.add(owner)
     db.commit()
@@ -194,12 +282,7 @@ def create_owner_address(db: Session, address_data: dict, owner_id: int) -> Vehi
     """Crea una dirección para un propietario"""
     address = VehicleOwnerAddress(
         owner_id=owner_id,
-        direccion=address_data.get("direccion"),
-        departamento=address_data.get("departamento"),
-        ciudad=address_data.get("ciudad"),
-        telefono=address_data.get("telefono"),
-        celular=address_data.get("celular"),
-        email=address_data.get("email")
+        **map_runt_fields(address_data, OWNER_ADDRESS_FIELDS)
     )
     db.add(address)
     db.commit()
@@ -210,13 +293,7 @@ def create_vehicle_soat(db: Session, soat_data: dict, vehicle_id: int) -> Vehicl
     """Crea un registro SOAT para un vehículo"""
     soat = VehicleSoat(
         vehicle_id=vehicle_id,
-        no_poliza=soat_data["noPoliza"],
-        fecha_expedicion=datetime.strptime(soat_data["fechaExpedicion"], "%d/%m/%Y"),
-        fecha_vigencia=datetime.strptime(soat_data["fechaVigencia"], "%d/%m/%Y"),
-        fecha_vencimiento=datetime.strptime(soat_data["fechaVencimiento"], "%d/%m/%Y"),
-        nit_entidad=soat_data["nitEntidad"],
-        entidad_expide=soat_data["entidadExpideSoat"],
-        estado=soat_data["estado"]
+        **map_runt_fields(soat_data, VEHICLE_SOAT_FIELDS)
     )
     db.add(soat)
     db.commit()
@@ -225,19 +302,9 @@ def create_vehicle_soat(db: Session, soat_data: dict, vehicle_id: int) -> Vehicl
 
 def create_vehicle_rtm(db: Session, rtm_data: dict, vehicle_id: int) -> VehicleRtm:
     """Crea un registro RTM para un vehículo"""
-    def to_bool(value: str) -> bool:
-        if isinstance(value, bool):
-            return value
-        return value.upper() == 'SI' if value else False
-
     rtm = VehicleRtm(
         vehicle_id=vehicle_id,
-        nro_rtm=rtm_data["nroRTM"],
-        tipo_revision=rtm_data["tipoRevision"],
-        fecha_expedicion=datetime.strptime(rtm_data["fechaExpedicion"], "%d/%m/%Y"),
-        fecha_vigente=datetime.strptime(rtm_data["fechaVigente"], "%d/%m/%Y"),
-        cda_expide=rtm_data["cdaExpide"],
-        vigente=to_bool(rtm_data["vigente"])
+        **map_runt_fields(rtm_data, VEHICLE_RTM_FIELDS)
     )
     db.add(rtm)
     db.commit()
@@ -248,15 +315,7 @@ def create_civil_policy(db: Session, policy_data: dict, vehicle_id: int) -> Vehi
     """Crea una póliza civil para un vehículo"""
     policy = VehicleCivilPolicy(
         vehicle_id=vehicle_id,
-        numero_poliza=policy_data["numeroPoliza"],
-        fecha_expedicion=datetime.strptime(policy_data["fechaExpedicion"], "%d/%m/%Y"),
-        fecha_vigencia=datetime.strptime(policy_data["fechaVigencia"], "%d/%m/%Y"),
-        tipo_documento=policy_data["tipoDocumento"],
-        numero_documento=policy_data["numeroDocumento"],
-        nombre_aseguradora=policy_data["nombreAseguradora"],
-        tipo_poliza=policy_data["tipoPoliza"],
-        fecha_inicio=datetime.strptime(policy_data["fechaInicio"], "%d/%m/%Y"),
-        estado_poliza=policy_data["estadoPoliza"]
+        **map_runt_fields(policy_data, CIVIL_POLICY_FIELDS)
     )
     db.add(policy)
     db.commit()
@@ -267,11 +326,7 @@ def create_policy_detail(db: Session, detail_data: dict, policy_id: int) -> Poli
     """Crea un detalle de póliza"""
     detail = PolicyDetail(
         policy_id=policy_id,
-        nro_poliza=detail_data["nroPoliza"],
-        tipo_doc_tomador=detail_data["tipoDocTomador"],
-        nro_doc_tomador=detail_data["nroDocTomador"],
-        cobertura=detail_data["cobertura"],
-        monto=detail_data["monto"]
+        **map_runt_fields(detail_data, POLICY_DETAIL_FIELDS)
     )
     db.add(detail)
     db.commit()
@@ -320,20 +375,207 @@ def store_vehicle_data(db: Session, vehicle_data: Dict[str, Any]) -> VehicleInfo
 
     return vehicle
 
+# Todo lo que necesita un reporte, cargado con una consulta por relación
+VEHICLE_AGGREGATE_OPTIONS = (
+    selectinload(VehicleInfo.owners).selectinload(VehicleOwner.addresses),
+    selectinload(VehicleInfo.soats),
+    selectinload(VehicleInfo.rtms),
+    selectinload(VehicleInfo.civil_policies).selectinload(VehicleCivilPolicy.details),
+    selectinload(VehicleInfo.events)
+)
+
+def get_vehicle_aggregates(db: Session, plates: List[str]) -> Dict[str, dict]:
+    """Obtiene la información completa de varias placas: placa -> agregado.
+
+    Siempre son 8 consultas (vehículos, propietarios, direcciones, SOAT, RTM,
+    pólizas, detalles y eventos) sin importar cuántas placas se pidan; las
+    relaciones quedan cargadas y no disparan consultas al recorrerlas.
+    """
+    if not plates:
+        return {}
+    vehicles = db.query(VehicleInfo).options(*VEHICLE_AGGREGATE_OPTIONS).filter(
+        VehicleInfo.plate.in_(plates)
+    ).all()
+    return {
+        vehicle.plate: {
+            "vehicle_info": vehicle,
+            "owners": vehicle.owners,
+            "soats": vehicle.soats,
+            "rtms": vehicle.rtms,
+            "civil_policies": vehicle.civil_policies,
+            "events": vehicle.events
+        }
+        for vehicle in vehicles
+    }
+
 def get_vehicle_info(db: Session, plate: str) -> dict:
     """Obtiene toda la información almacenada de un vehículo"""
-    vehicle = db.query(VehicleInfo).filter(VehicleInfo.plate == plate).first()
-    if not vehicle:
-        return None
-    
+    return get_vehicle_aggregates(db, [plate]).get(plate)
+
+def get_runt_vehicles(db: Session, plates: List[str]) -> Dict[str, tuple]:
+    """Respuestas RUNT guardadas: placa -> (vehicle_data, updated_at).
+
+    Solo lee las columnas del caché en una única consulta.
+    """
+    if not plates:
+        return {}
+    rows = db.query(
+        VehicleInfo.plate, VehicleInfo.vehicle_data, VehicleInfo.updated_at
+    ).filter(VehicleInfo.plate.in_(plates)).all()
     return {
-        "vehicle_info": vehicle,
-        "owners": vehicle.owners,
-        "soats": vehicle.soats,
-        "rtms": vehicle.rtms,
-        "civil_policies": vehicle.civil_policies
+        plate: (vehicle_data, updated_at)
+        for plate, vehicle_data, updated_at in rows
+        if vehicle_data
     }
 
+class VehicleBatch:
+    """Unidad de trabajo: acumula vehículos completos y los guarda juntos.
+
+    Cada helper ``create_*`` hace su propio commit; aquí un lote entero
+    (vehículos, propietarios con direcciones, SOAT, RTM, pólizas con
+    detalles y eventos) se escribe en una sola transacción con inserciones
+    masivas, unas pocas sentencias por tabla sin importar el tamaño::
+
+        batch = crud.VehicleBatch(db)
+        batch.add_vehicle("ABC123", vehiculo)
+        batch.add_event("ABC123", "RUNT_QUERY", {...})
+        ids = batch.commit()
+
+    También sirve como context manager: hace commit al salir sin errores y
+    rollback si algo falla.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self._vehicles: Dict[str, dict] = {}
+        self._events: List[dict] = []
+
+    def add_vehicle(self, plate: str, vehicle_data: dict) -> "VehicleBatch":
+        """Agrega un vehículo en formato RUNT; sus secciones reemplazan las guardadas."""
+        self._vehicles[plate] = vehicle_data
+        return self
+
+    def add_event(self, plate: str, event_type: str, event_data: dict) -> "VehicleBatch":
+        self._events.append({"plate": plate, "event_type": event_type, "event_data": event_data})
+        return self
+
+    def __len__(self) -> int:
+        return len(self._vehicles) + len(self._events)
+
+    def flush(self) -> Dict[str, int]:
+        """Ejecuta las sentencias del lote sin hacer commit; devuelve placa -> id."""
+        ids = self._upsert_vehicles()
+        event_plates = {event["plate"] for event in self._events} - set(ids)
+        ids.update(self._ensure_vehicles(event_plates))
+        if self._vehicles:
+            vehicle_ids = [ids[plate] for plate in self._vehicles]
+            self._delete_children(vehicle_ids, RUNT_CHILD_SECTIONS)
+            # Orden fijo de placas, igual que en el upsert
+            parents = [(ids[plate], self._vehicles[plate]) for plate in sorted(self._vehicles)]
+            self._insert_children(parents, RUNT_CHILD_SECTIONS)
+        if self._events:
+            now = datetime.now()
+            self.db.execute(insert(Event), [
+                {**event, "vehicle_id": ids[event["plate"]], "created_at": now}
+                for event in self._events
+            ])
+        self._vehicles, self._events = {}, []
+        return ids
+
+    def commit(self) -> Dict[str, int]:
+        try:
+            ids = self.flush()
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return ids
+
+    def __enter__(self) -> "VehicleBatch":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.db.rollback()
+
+    def _insert_stmt(self, model):
+        """``insert`` con soporte de ON CONFLICT según el motor de la sesión."""
+        if self.db.get_bind().dialect.name == "sqlite":
+            return sqlite.insert(model)
+        return postgresql.insert(model)
+
+    def _upsert_vehicles(self) -> Dict[str, int]:
+        """Un único ``INSERT ... ON CONFLICT (plate) DO UPDATE`` para todo el lote."""
+        if not self._vehicles:
+            return {}
+        now = datetime.now()
+        # Orden fijo de placas: dos lotes simultáneos bloquean filas en el mismo orden
+        rows = [
+            {
+                "plate": plate,
+                **map_runt_fields(self._vehicles[plate], VEHICLE_INFO_FIELDS),
+                "vehicle_data": self._vehicles[plate],
+                "created_at": now,
+                "updated_at": now
+            }
+            for plate in sorted(self._vehicles)
+        ]
+        stmt = self._insert_stmt(VehicleInfo).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[VehicleInfo.plate],
+            set_={column: stmt.excluded[column] for column in rows[0] if column not in ("plate", "created_at")}
+        ).returning(VehicleInfo.id, VehicleInfo.plate)
+        return {plate: vehicle_id for vehicle_id, plate in self.db.execute(stmt)}
+
+    def _ensure_vehicles(self, plates) -> Dict[str, int]:
+        """Crea vacíos los vehículos de eventos sin datos RUNT (como ``create_event``)."""
+        if not plates:
+            return {}
+        now = datetime.now()
+        stmt = self._insert_stmt(VehicleInfo).values([
+            {"plate": plate, "created_at": now, "updated_at": now} for plate in sorted(plates)
+        ]).on_conflict_do_nothing(index_elements=[VehicleInfo.plate])
+        self.db.execute(stmt)
+        rows = self.db.execute(
+            select(VehicleInfo.id, VehicleInfo.plate).where(VehicleInfo.plate.in_(plates))
+        )
+        return {plate: vehicle_id for vehicle_id, plate in rows}
+
+    def _delete_children(self, parent_ids, sections):
+        """La respuesta RUNT es el estado completo: se borran las filas hijas anteriores."""
+        for model, _, _, parent_column, nested in sections:
+            parent = getattr(model, parent_column)
+            if nested:
+                self._delete_children(select(model.id).where(parent.in_(parent_ids)), nested)
+            self.db.execute(delete(model).where(parent.in_(parent_ids)))
+
+    def _insert_children(self, parents, sections):
+        """Inserta en bloque las secciones de cada padre ``(id, registro RUNT)``."""
+        for model, key, fields, parent_column, nested in sections:
+            items = [(parent_id, item) for parent_id, data in parents for item in _runt_items(data, key)]
+            if not items:
+                continue
+            rows = [{parent_column: parent_id, **map_runt_fields(item, fields)} for parent_id, item in items]
+            if not nested:
+                self.db.execute(insert(model), rows)
+                continue
+            # Los ids vuelven en el orden de las filas para enlazar las secciones
+            # anidadas (en PostgreSQL sigue siendo una sentencia por bloque; SQLite
+            # las inserta de a una)
+            ids = self.db.execute(
+                insert(model).returning(model.id, sort_by_parameter_order=True), rows
+            ).scalars().all()
+            self._insert_children(list(zip(ids, (item for _, item in items))), nested)
+
+def save_runt_vehicles(db: Session, vehicles: Dict[str, dict]) -> Dict[str, int]:
+    """Guarda un lote de respuestas RUNT (placa -> vehiculo) en una transacción."""
+    batch = VehicleBatch(db)
+    for plate, vehicle_data in vehicles.items():
+        batch.add_vehicle(plate, vehicle_data)
+    return batch.commit()
+
 def get_all_templates(db: Session) -> List[PdfTemplate]:
     """Obtiene todas las plantillas."""
     return db.query(PdfTemplate).all()
@@ -368,6 +610,7 @@ def update_template(db: Session, template_id: int, name: str = None, content: st
         template.updated_at = datetime.now()
         db.commit()
         db.refresh(template)
+        get_template_cache().invalidate(template_id)
     return template
 
 def delete_template(db: Session, template_id: int) -> bool:
@@ -376,6 +619,7 @@ def delete_template(db: Session, template_id: int) -> bool:
     if template:
         db.delete(template)
         db.commit()
+        get_template_cache().invalidate(template_id)
         return True
     return False
 
@@ -415,77 +659,90 @@ def create_event(
     db.refresh(db_event)
     return db_event
 
+def _vehicle_data(aggregate: dict) -> dict:
+    """Convierte un agregado de ``get_vehicle_aggregates`` en diccionarios."""
+    vehicle = aggregate["vehicle_info"]
+
+    # Convertir el vehículo a diccionario
+    vehicle_dict = {
+        "id": vehicle.id,
+        "plate": vehicle.plate,
+        "no_registro": vehicle.no_registro,
+        "no_licencia_transito": vehicle.no_licencia_transito,
+        "fecha_expedicion_lic_transito": vehicle.fecha_expedicion_lic_transito.isoformat() if vehicle.fecha_expedicion_lic_transito else None,
+        "estado_vehiculo": vehicle.estado_vehiculo,
+        "tipo_servicio": vehicle.tipo_servicio,
+        "clase_vehiculo": vehicle.clase_vehiculo,
+        "marca": vehicle.marca,
+        "linea": vehicle.linea,
+        "modelo": vehicle.modelo,
+        "color": vehicle.color,
+        "no_serie": vehicle.no_serie,
+        "no_motor": vehicle.no_motor,
+        "no_chasis": vehicle.no_chasis,
+        "no_vin": vehicle.no_vin,
+        "cilindraje": vehicle.cilindraje,
+        "tipo_carroceria": vehicle.tipo_carroceria,
+        "fecha_matricula": vehicle.fecha_matricula.isoformat() if vehicle.fecha_matricula else None,
+        "tiene_gravamenes": vehicle.tiene_gravamenes,
+        "organismo_transito": vehicle.organismo_transito,
+        "prendas": vehicle.prendas,
+        "prendario": vehicle.prendario,
+        "clasificacion": vehicle.clasificacion,
+        "capacidad_carga": vehicle.capacidad_carga,
+        "peso_bruto_vehicular": vehicle.peso_bruto_vehicular,
+        "no_ejes": vehicle.no_ejes
+    }
+
+    events_list = []
+    for event in aggregate["events"]:
+        event_dict = {
+            "id": event.id,
+            "event_id": event.event_id,
+            "device_id": event.device_id,
+            "date": event.date.isoformat() if event.date else None,
+            "evidences": event.evidences,
+            "video_filename": event.video_filename
+        }
+        events_list.append(event_dict)
+
+    # Devolver los datos del vehículo y sus eventos
+    return {
+        "vehicle": vehicle_dict,
+        "events": events_list
+    }
+
 def get_vehicle_data(db: Session, plate: str):
     """
     Obtiene todos los datos relacionados con un vehículo por su placa.
     """
     try:
-        # Obtener el vehículo
-        vehicle = db.query(VehicleInfo).filter(VehicleInfo.plate == plate).first()
-        if not vehicle:
+        # Obtener el vehículo con sus eventos ya cargados
+        aggregate = get_vehicle_info(db, plate)
+        if not aggregate:
             logger.warning(f"No se encontró el vehículo con placa {plate}")
             return None
-
-        # Convertir el vehículo a diccionario
-        vehicle_dict = {
-            "id": vehicle.id,
-            "plate": vehicle.plate,
-            "no_registro": vehicle.no_registro,
-            "no_licencia_transito": vehicle.no_licencia_transito,
-            "fecha_expedicion_lic_transito": vehicle.fecha_expedicion_lic_transito.isoformat() if vehicle.fecha_expedicion_lic_transito else None,
-            "estado_vehiculo": vehicle.estado_vehiculo,
-            "tipo_servicio": vehicle.tipo_servicio,
-            "clase_vehiculo": vehicle.clase_vehiculo,
-            "marca": vehicle.marca,
-            "linea": vehicle.linea,
-            "modelo": vehicle.modelo,
-            "color": vehicle.color,
-            "no_serie": vehicle.no_serie,
-            "no_motor": vehicle.no_motor,
-            "no_chasis": vehicle.no_chasis,
-            "no_vin": vehicle.no_vin,
-            "cilindraje": vehicle.cilindraje,
-            "tipo_carroceria": vehicle.tipo_carroceria,
-            "fecha_matricula": vehicle.fecha_matricula.isoformat() if vehicle.fecha_matricula else None,
-            "tiene_gravamenes": vehicle.tiene_gravamenes,
-            "organismo_transito": vehicle.organismo_transito,
-            "prendas": vehicle.prendas,
-            "prendario": vehicle.prendario,
-            "clasificacion": vehicle.clasificacion,
-            "capacidad_carga": vehicle.capacidad_carga,
-            "peso_bruto_vehicular": vehicle.peso_bruto_vehicular,
-            "no_ejes": vehicle.no_ejes
-        }
-
-        try:
-            # Intentar obtener eventos
-            events = db.query(Event).filter(Event.vehicle_id == vehicle.id).all()
-            events_list = []
-            for event in events:
-                event_dict = {
-                    "id": event.id,
-                    "event_id": event.event_id,
-                    "device_id": event.device_id,
-                    "date": event.date.isoformat() if event.date else None,
-                    "evidences": event.evidences,
-                    "video_filename": event.video_filename
-                }
-                events_list.append(event_dict)
-        except Exception as e:
-            logger.error(f"Error al obtener eventos: {str(e)}")
-            events_list = []
-
-        # Devolver los datos del vehículo y sus eventos
-        return {
-            "vehicle": vehicle_dict,
-            "events": events_list
-        }
+        return _vehicle_data(aggregate)
 
     except Exception as e:
         logger.error(f"Error al obtener datos del vehículo {plate}: {str(e)}")
         logger.error(traceback.format_exc())
         return None
 
+def get_vehicles_data(db: Session, plates: List[str]) -> Dict[str, dict]:
+    """Versión por lotes de ``get_vehicle_data``: placa -> datos.
+
+    Usa las mismas 8 consultas de ``get_vehicle_aggregates`` para todo el
+    lote; las placas sin datos no aparecen en el resultado.
+    """
+    result = {}
+    for plate, aggregate in get_vehicle_aggregates(db, plates).items():
+        try:
+            result[plate] = _vehicle_data(aggregate)
+        except Exception as e:
+            logger.error(f"Error al obtener datos del vehículo {plate}: {str(e)}")
+    return result
+
 def create_or_update_vehicle(
     db: Session,
     plate: str,
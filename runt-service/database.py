@@ -23,7 +23,7 @@ def get_db():
 def init_db():
     try:
         # Importar todos los modelos aquí para asegurar que están registrados
-        from models import VehicleInfo, Event, VehicleOwner, VehicleOwnerAddress, VehicleSoat, VehicleRtm, VehicleCivilPolicy, PolicyDetail, GeneratedPdf
+        from models import VehicleInfo, Event, VehicleOwner, VehicleOwnerAddress, VehicleSoat, VehicleRtm, VehicleCivilPolicy, PolicyDetail, GeneratedPdf, PdfJob, PdfJobItem
         
         # Crear todas las tablas
         Base.metadata.create_all(bind=engine)
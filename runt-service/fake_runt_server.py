@@ -0,0 +1,247 @@
+"""Servidor RUNT de prueba para desarrollo local.
+
+Imita los tres endpoints del gateway de consultaAseguradora:
+
+- ``admin/generarLlave``: devuelve una llave HMAC nueva en base64.
+- ``admin/validarLlave``: acepta una llave emitida por este servidor.
+- ``consulta/vehiculos``: verifica la firma HMAC-SHA256 del cuerpo con la
+  llave emitida y responde un vehículo de ejemplo.
+
+Cuenta las conexiones TCP abiertas para comprobar que el cliente reutiliza
+conexiones (keep-alive) y puede limitar las consultas por segundo con 429 y
+``Retry-After`` para probar el limitador adaptativo.
+
+Uso:
+    python fake_runt_server.py --port 8089 --latency-ms 50
+    RUNT_GATEWAY_URL=http://localhost:8089/servicios/runt/api/consultaAseguradora uvicorn main:app
+    python fake_runt_server.py --check --plates 5     # prueba RuntService contra el servidor
+    python fake_runt_server.py --check --plates 200 --latency-ms 50 --max-qps 15
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BASE_PATH = "/servicios/runt/api/consultaAseguradora"
+MARCAS = ["CHEVROLET", "RENAULT", "MAZDA", "KIA", "TOYOTA"]
+
+
+class FakeRuntState:
+    def __init__(self, latency: float = 0.0, fail_rate: float = 0.0, max_qps: float = 0.0):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.max_qps = max_qps
+        self.recent = []
+        self.lock = threading.Lock()
+        self.keys = set()
+        self.validated = set()
+        self.connections = 0
+        self.requests = {}
+
+    def count(self, path: str):
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def over_limit(self) -> bool:
+        """Ventana deslizante de un segundo para simular el límite del gateway."""
+        if not self.max_qps:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            self.recent = [t for t in self.recent if now - t < 1.0]
+            if len(self.recent) >= self.max_qps:
+                self.requests["429"] = self.requests.get("429", 0) + 1
+                return True
+            self.recent.append(now)
+            return False
+
+
+def fake_vehicle(plate: str) -> dict:
+    rnd = random.Random(plate)
+    return {
+        "placa": plate,
+        "marca": rnd.choice(MARCAS),
+        "linea": "GENERICA",
+        "modelo": str(rnd.randint(2005, 2024)),
+        "color": rnd.choice(["BLANCO", "NEGRO", "GRIS", "ROJO"]),
+        "claseVehiculo": "AUTOMOVIL",
+        "tipoServicio": "PARTICULAR",
+        "estadoVehiculo": "ACTIVO"
+    }
+
+
+class FakeRuntHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: FakeRuntState = None
+
+    def setup(self):
+        super().setup()
+        with self.state.lock:
+            self.state.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body, content_type: str = "text/plain"):
+        if not isinstance(body, (bytes, str)):
+            body, content_type = json.dumps(body), "application/json"
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        path = self.path[len(BASE_PATH):] if self.path.startswith(BASE_PATH) else self.path
+        self.state.count(path)
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        if self.state.fail_rate and random.random() < self.state.fail_rate:
+            return self._send(503, "Error: servicio no disponible")
+        if not self.headers.get("X-Runt-Id-Usuario") or not self.headers.get("X-Runt-Firma"):
+            return self._send(401, "Error: faltan headers de autenticación")
+
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            return self._send(400, "Error: cuerpo inválido")
+
+        if path == "/admin/generarLlave":
+            key = base64.b64encode(os.urandom(32)).decode()
+            with self.state.lock:
+                self.state.keys.add(key)
+            return self._send(200, key)
+
+        if path == "/admin/validarLlave":
+            key = payload.get("llave")
+            if key not in self.state.keys:
+                return self._send(400, "Error: llave no emitida")
+            with self.state.lock:
+                self.state.validated.add(key)
+            return self._send(200, "Llave validada")
+
+        if path == "/consulta/vehiculos":
+            if self.state.over_limit():
+                self.send_response(429)
+                self.send_header("Retry-After", "1")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            signature = self.headers.get("X-Runt-Firma")
+            for key in list(self.state.validated):
+                expected = base64.b64encode(
+                    hmac.new(base64.b64decode(key), body, hashlib.sha256).digest()
+                ).decode()
+                if hmac.compare_digest(expected, signature):
+                    return self._send(200, {"vehiculo": fake_vehicle(payload.get("noPlaca", ""))})
+            return self._send(401, "Error: Debe validar la llave")
+
+        return self._send(404, "Error: endpoint desconocido")
+
+
+def start_server(port: int = 0, latency: float = 0.0, fail_rate: float = 0.0, max_qps: float = 0.0):
+    state = FakeRuntState(latency, fail_rate, max_qps)
+    handler = type("Handler", (FakeRuntHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def run_check(plates: int, latency: float, max_qps: float = 0.0):
+    """Ejecuta RuntService.process_runt_sequence contra el servidor de prueba.
+
+    Usa una base SQLite en memoria para las variables globales y el caché.
+    Hace tres rondas sin caché de placas: la primera negocia la llave, la
+    segunda debe reutilizarla y antes de la tercera el servidor olvida la
+    llave para forzar una renovación. La última ronda usa el caché y no debe
+    llegar al gateway.
+    """
+    server, state = start_server(latency=latency, max_qps=max_qps)
+    os.environ["RUNT_GATEWAY_URL"] = f"http://127.0.0.1:{server.server_address[1]}{BASE_PATH}"
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from models import Base, GlobalVariable
+    from services import runt_service
+    from services.runt_cache import RuntCache
+
+    # Una sola conexión compartida para que todas las sesiones vean la misma base
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    db = session_factory()
+    db.add(GlobalVariable(name="usuarioAseguradoraCliente", value="900133384"))
+    db.commit()
+
+    class LocalRuntService(runt_service.RuntService):
+        def sign_with_rsa(self, db, data):
+            # La firma RSA no se verifica en el servidor de prueba
+            return "firma-de-prueba"
+
+    service = LocalRuntService(db)
+    service.key_manager.sign = lambda data: "firma-de-prueba"
+    service.key_manager.session_factory = session_factory
+    service.cache = RuntCache(session_factory, ttl=0, stale_ttl=0)
+    placas = [f"TST{i:03d}" for i in range(plates)]
+    passed = True
+    for ronda in ("inicial", "llave en caché", "llave rechazada", "caché de placas"):
+        if ronda == "llave rechazada":
+            state.validated.clear()
+        if ronda == "caché de placas":
+            # Caché nuevo: el LRU está vacío y las placas salen de la base
+            service.cache = RuntCache(session_factory)
+        before = dict(state.requests)
+        start = time.perf_counter()
+        result = service.process_runt_sequence(db, placas)
+        elapsed = time.perf_counter() - start
+        vehicles = result.get("data", {}).get("vehicles", [])
+        ok = sum(1 for v in vehicles if v.get("success") and v["data"].get("placa") == v["plate"].upper())
+        calls = {k: v - before.get(k, 0) for k, v in state.requests.items() if v - before.get(k, 0)}
+        print(f"\n[{ronda}] vehículos correctos={ok}/{plates} peticiones={calls} tiempo={elapsed:.2f} s")
+        passed = passed and ok == plates
+        if ronda == "caché de placas":
+            passed = passed and not calls
+    print(f"\nConexiones TCP abiertas: {state.connections}")
+    print(f"Llave HMAC: {service.key_manager.stats()}")
+    print(f"Limitador: {service.rate_limiter.stats()}")
+    print(f"Caché RUNT: {service.cache.stats()}")
+    server.shutdown()
+    return (passed and state.connections <= runt_service.RUNT_QUERY_WORKERS
+            and state.requests.get("/admin/generarLlave") == 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fracción de respuestas 503")
+    parser.add_argument("--max-qps", type=float, default=0.0, help="consultas/s antes de responder 429")
+    parser.add_argument("--check", action="store_true", help="probar RuntService y salir")
+    parser.add_argument("--plates", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(0 if run_check(args.plates, args.latency_ms / 1000, args.max_qps) else 1)
+
+    server, _ = start_server(args.port, args.latency_ms / 1000, args.fail_rate, args.max_qps)
+    print(f"Servidor RUNT de prueba en http://127.0.0.1:{args.port}{BASE_PATH}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,17 +4,26 @@ from fastapi.requests import Request
 from sqlalchemy.orm import Session
 from database import get_db, init_db
 from services.runt_service import RuntService
+from services.async_runt_service import AsyncRuntService
+from services.runt_cache import get_runt_cache
+from services.single_flight import get_single_flight
+from services.template_cache import get_template_cache
+from services.pdf_render_pool import get_render_pool
+from services.pdf_styles import REPORT
+from services.pdf_cache import content_key, get_pdf_cache
+from services.pdf_jobs import FINISHED, get_pdf_job_queue
 import schemas
 from typing import List, Dict, Any, Optional
 import json
 import requests
 import os
+import shutil
 from pydantic import BaseModel
 import httpx
 import crud
 from services.pdf_service import PdfService
 import logging
-from fastapi.responses import FileResponse, Response, JSONResponse
+from fastapi.responses import FileResponse, Response, JSONResponse, StreamingResponse
 from datetime import datetime
 from models import GeneratedPdf, PdfTemplate, VehicleInfo
 import asyncio
@@ -32,6 +41,7 @@ pdf_service = None
 
 @app.on_event("startup")
 async def startup_event():
+    global runt_service, pdf_service
     try:
         logger.info("Inicializando base de datos...")
         init_db()
@@ -39,6 +49,17 @@ async def startup_event():
     except Exception as e:
         logger.error(f"Error inicializando la base de datos: {str(e)}")
         raise
+    runt_service = AsyncRuntService()
+    pdf_service = PdfService()
+    get_render_pool().warm_up()
+    get_pdf_job_queue().start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if runt_service is not None:
+        await runt_service.close()
+    get_pdf_job_queue().stop()
+    get_render_pool().shutdown()
 
 # Agregar CORS middleware
 app.add_middleware(
@@ -61,6 +82,13 @@ class PdfGenerationRequest(BaseModel):
     plate: str
     output_filename: str
 
+class PdfJobItemRequest(BaseModel):
+    template_id: int
+    plate: str
+
+class PdfJobRequest(BaseModel):
+    items: List[PdfJobItemRequest]
+
 class TemplateCreate(BaseModel):
     name: str
     content: str
@@ -128,7 +156,7 @@ def create_endpoint(
     return service.create_endpoint(db, endpoint)
 
 @app.get("/variables")
-async def get_variables(db: Session = Depends(get_db)):
+def get_variables(db: Session = Depends(get_db)):
     try:
         service = RuntService(db)
         variables = service.get_all_variables(db)
@@ -188,12 +216,9 @@ async def get_plate():
         }
 
 @app.post("/process-runt")
-async def process_runt(request: Request, db: Session = Depends(get_db)):
-    """Procesa placas a través del servicio RUNT."""
+async def process_runt(request: Request):
+    """Procesa placas a través del servicio RUNT sin bloquear el event loop."""
     try:
-        # Inicializar el servicio con la sesión de base de datos
-        service = RuntService(db)
-        
         # Obtener datos del request
         data = await request.json()
         plates = data.get("plates", [])
@@ -206,7 +231,8 @@ async def process_runt(request: Request, db: Session = Depends(get_db)):
         if not plates:
             # Intentar obtener placas del API Consumer
             try:
-                consumer_response = requests.get("http://api-consumer:8000/get-plate")
+                async with httpx.AsyncClient() as client:
+                    consumer_response = await client.get(f"{API_CONSUMER_URL}/get-plate")
                 if consumer_response.status_code == 200:
                     plates = consumer_response.json().get("plates", [])
             except Exception as e:
@@ -223,8 +249,7 @@ async def process_runt(request: Request, db: Session = Depends(get_db)):
             }
         
         # Procesar las placas
-        result = service.process_runt_sequence(db, plates)
-        return result
+        return await runt_service.process_runt_sequence(plates)
         
     except Exception as e:
         logger.error(f"Error en process_runt: {str(e)}")
@@ -233,39 +258,172 @@ async def process_runt(request: Request, db: Session = Depends(get_db)):
             "error": f"Error al procesar las placas: {str(e)}"
         }
 
+def prepare_bulk_pdfs(requests: List[PdfGenerationRequest], db: Session):
+    """Arma el HTML de cada PDF del lote con una sola carga de datos.
+
+    Devuelve los trabajos ``(índice, html)``, la entrada del caché de PDFs de
+    cada trabajo y los resultados ya resueltos: los que no se pudieron
+    preparar y los que se copiaron del caché.
+    """
+    vehicles = crud.get_vehicles_data(db, list({req.plate for req in requests}))
+    templates = {
+        template_id: get_template_cache().get_versioned(db, template_id)
+        for template_id in {req.template_id for req in requests}
+    }
+    jobs, cache_entries, ready = [], {}, []
+    for index, req in enumerate(requests):
+        try:
+            if templates[req.template_id] is None:
+                raise ValueError(f"Plantilla {req.template_id} no encontrada")
+            if req.plate not in vehicles:
+                raise ValueError(f"No se encontraron datos para la placa {req.plate}")
+            template, version = templates[req.template_id]
+            template_data = pdf_service.build_template_data(vehicles[req.plate], {})
+            key = content_key(req.template_id, version, REPORT, template_data, template)
+            cached_path = get_pdf_cache().lookup(db, key)
+            if cached_path:
+                ready.append((index, save_bulk_pdf(req, cached_path=cached_path)))
+                continue
+            cache_entries[index] = (key, req.template_id, vehicles[req.plate]["vehicle"]["id"])
+            jobs.append((index, pdf_service.render_report_html(template, template_data)))
+        except Exception as e:
+            ready.append((index, {"plate": req.plate, "success": False, "error": str(e)}))
+    return jobs, cache_entries, ready
+
+def save_bulk_pdf(
+    req: PdfGenerationRequest,
+    pdf_content: bytes = None,
+    cached_path: str = None,
+    cache_entry: tuple = None,
+    db: Session = None
+) -> dict:
+    """Escribe el PDF del lote, desde el caché o recién renderizado (y lo cachea)."""
+    output_path = os.path.join(pdf_service.output_dir, os.path.basename(req.output_filename))
+    if cached_path is None:
+        key, template_id, vehicle_id = cache_entry
+        try:
+            cached_path = get_pdf_cache().store(db, key, pdf_content, template_id, vehicle_id)
+        except Exception as e:
+            logger.error(f"Error guardando el PDF en caché: {str(e)}")
+            db.rollback()
+    if cached_path is None:
+        with open(output_path, "wb") as f:
+            f.write(pdf_content)
+    else:
+        shutil.copyfile(cached_path, output_path)
+    return {
+        "plate": req.plate,
+        "success": True,
+        "pdf_path": output_path,
+        "filename": os.path.basename(output_path)
+    }
+
 @app.post("/generate-pdfs-bulk")
 async def generate_pdfs_bulk(
     request: List[PdfGenerationRequest],
+    stream: bool = False,
     db: Session = Depends(get_db)
 ):
-    """Genera PDFs para múltiples placas"""
-    results = []
-    for req in request:
-        try:
-            output_path = pdf_service.generate_pdf(
-                db,
-                req.template_id,
-                req.plate,
-                req.output_filename
-            )
-            results.append({
-                "plate": req.plate,
-                "success": True,
-                "pdf_path": output_path,
-                "filename": os.path.basename(output_path)
-            })
-        except Exception as e:
-            results.append({
-                "plate": req.plate,
-                "success": False,
-                "error": str(e)
-            })
-    
+    """Genera PDFs para múltiples placas en el pool de procesos.
+
+    Con ``stream=true`` responde NDJSON: una línea por PDF apenas termina.
+    """
+    jobs, cache_entries, ready = await asyncio.to_thread(prepare_bulk_pdfs, request, db)
+
+    async def bulk_results():
+        for item in ready:
+            yield item
+        async for index, pdf_content, error in get_render_pool().render_many_async(jobs, REPORT):
+            req = request[index]
+            if error is not None:
+                yield index, {"plate": req.plate, "success": False, "error": error}
+                continue
+            try:
+                yield index, await asyncio.to_thread(
+                    save_bulk_pdf, req, pdf_content, cache_entry=cache_entries[index], db=db
+                )
+            except Exception as e:
+                yield index, {"plate": req.plate, "success": False, "error": str(e)}
+
+    if stream:
+        async def ndjson():
+            async for _, result in bulk_results():
+                yield json.dumps(result) + "\n"
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    results = [None] * len(request)
+    async for index, result in bulk_results():
+        results[index] = result
     return {
         "success": True,
         "results": results
     }
 
+@app.post("/pdf-jobs", status_code=202)
+async def submit_pdf_job(request: PdfJobRequest):
+    """Encola la generación de uno o varios PDFs y devuelve el id del trabajo."""
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Se requiere al menos un ítem")
+    items = [(item.template_id, item.plate) for item in request.items]
+    job = await asyncio.to_thread(get_pdf_job_queue().submit, items)
+    return {"success": True, **job}
+
+@app.get("/pdf-jobs/stats")
+def pdf_job_stats():
+    """Ítems encolados, en curso y procesados por la cola de PDFs."""
+    return get_pdf_job_queue().stats()
+
+@app.get("/pdf-jobs/{job_id}")
+def get_pdf_job(job_id: str):
+    """Estado de un trabajo y de cada uno de sus PDFs."""
+    job = get_pdf_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Trabajo {job_id} no encontrado")
+    return job
+
+@app.get("/pdf-jobs/{job_id}/events")
+async def stream_pdf_job(job_id: str):
+    """Progreso del trabajo como Server-Sent Events, hasta que termina."""
+    queue = get_pdf_job_queue()
+    job = await asyncio.to_thread(queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Trabajo {job_id} no encontrado")
+
+    async def events():
+        current, last = job, None
+        while True:
+            progress = (current["status"], current["completed"], current["failed"])
+            if progress != last:
+                yield f"data: {json.dumps(current)}\n\n"
+                last = progress
+            if current["status"] in FINISHED:
+                break
+            await asyncio.sleep(1)
+            current = await asyncio.to_thread(queue.get, job_id)
+            if current is None:
+                break
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.get("/pdf-jobs/{job_id}/items/{item_id}/pdf")
+def download_pdf_job_item(job_id: str, item_id: int):
+    """Descarga el PDF de un ítem terminado."""
+    path = get_pdf_job_queue().item_path(job_id, item_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="PDF no disponible")
+    return FileResponse(path, media_type="application/pdf", filename=os.path.basename(path))
+
+@app.get("/pdf-jobs/{job_id}/download")
+def download_pdf_job(job_id: str):
+    """Descarga en un ZIP todos los PDFs de un trabajo terminado."""
+    queue = get_pdf_job_queue()
+    job = queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Trabajo {job_id} no encontrado")
+    if job["status"] not in FINISHED:
+        raise HTTPException(status_code=409, detail=f"El trabajo {job_id} aún no termina")
+    return FileResponse(queue.archive(job_id), media_type="application/zip", filename=f"pdfs_{job_id}.zip")
+
 @app.get("/template-variables")
 async def get_template_variables():
     """Obtiene todas las variables disponibles para usar en las plantillas."""
@@ -442,97 +600,118 @@ def get_database_fields():
 def health_check():
     return {"status": "healthy"}
 
-def get_template_by_id(template_id: int, db: Session = Depends(get_db)) -> Optional[dict]:
-    """Obtiene una plantilla por su ID"""
+@app.get("/runt-cache/stats")
+def runt_cache_stats():
+    """Aciertos y fallos del caché de consultas RUNT."""
+    return get_runt_cache().stats()
+
+@app.get("/runt-single-flight/stats")
+def runt_single_flight_stats():
+    """Consultas RUNT reales y evitadas por coalescencia de placas repetidas."""
+    return get_single_flight().stats()
+
+@app.get("/pdf-templates/cache/stats")
+def pdf_template_cache_stats():
+    """Cargas, aciertos y compilaciones del caché de plantillas de PDF."""
+    return get_template_cache().stats()
+
+@app.get("/pdf-render/stats")
+def pdf_render_stats():
+    """Documentos enviados, renderizados y fallidos del pool de PDFs."""
+    return get_render_pool().stats()
+
+@app.get("/pdf-cache/stats")
+def pdf_cache_stats():
+    """Aciertos, fallos y espacio usado del caché de PDFs generados."""
+    return get_pdf_cache().stats()
+
+def build_pdf_response(data: dict, db: Session) -> Response:
+    """Trabajo bloqueante de ``/generate-pdf``: consultas, caché y renderizado."""
+    template_id = data.get("template_id")
+    plate = data.get("plate")
+    
+    logger.info(f"Iniciando generación de PDF para placa {plate} con template {template_id}")
+    
+    if not template_id or not plate:
+        logger.error("Faltan parámetros requeridos")
+        raise HTTPException(
+            status_code=400, 
+            detail="Se requiere template_id y plate"
+        )
+        
+    # Obtener la plantilla
+    logger.info(f"Obteniendo plantilla {template_id}")
+    versioned = get_template_cache().get_versioned(db, template_id)
+    if versioned is None:
+        logger.error(f"No se encontró la plantilla con ID {template_id}")
+        raise HTTPException(
+            status_code=404, 
+            detail=f"Plantilla {template_id} no encontrada"
+        )
+        
+    # Obtener datos del vehículo y eventos
+    logger.info(f"Obteniendo datos del vehículo para placa {plate}")
+    vehicle_data = crud.get_vehicle_data(db, plate)
+    if not vehicle_data or not isinstance(vehicle_data, dict):
+        logger.error(f"No se encontraron datos del vehículo para la placa {plate}")
+        raise HTTPException(
+            status_code=404, 
+            detail=f"No se encontraron datos para la placa {plate}"
+        )
+        
+    # Combinar todos los datos
+    template_data = pdf_service.build_template_data(vehicle_data, data)
+    filename = f"reporte_{plate}.pdf"
+
+    # El mismo reporte ya generado se sirve directamente del archivo
+    template, version = versioned
+    key = content_key(template_id, version, REPORT, template_data, template)
+    cached_content = get_pdf_cache().fetch(db, key)
+    if cached_content is not None:
+        logger.info(f"PDF servido desde el caché ({key[:12]})")
+        return Response(
+            content=cached_content,
+            media_type="application/pdf",
+            headers={
+                "Content-Disposition": f'attachment; filename="{filename}"'
+            }
+        )
+    
+    logger.info("Generando PDF con los datos recopilados")
+    # Generar el PDF usando el servicio
     try:
-        template = pdf_service.get_template_by_id(db, template_id)
-        if not template:
-            return None
-        return {
-            "id": template.id,
-            "name": template.name,
-            "content": template.content,
-            "variables": template.variables if hasattr(template, 'variables') else {}
-        }
+        pdf_content = pdf_service.generate_pdf_from_template(
+            template,
+            template_data
+        )
+        logger.info("PDF generado exitosamente")
+        try:
+            get_pdf_cache().store(db, key, pdf_content, template_id, vehicle_data["vehicle"]["id"])
+        except Exception as e:
+            logger.error(f"Error guardando el PDF en caché: {str(e)}")
+            db.rollback()
+        return Response(
+            content=pdf_content,
+            media_type="application/pdf",
+            headers={
+                "Content-Disposition": f'attachment; filename="{filename}"'
+            }
+        )
     except Exception as e:
-        logger.error(f"Error obteniendo plantilla: {str(e)}")
-        return None
+        logger.error(f"Error generando PDF: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(
+            status_code=500, 
+            detail=f"Error generando PDF: {str(e)}"
+        )
 
 @app.post("/generate-pdf")
 async def generate_pdf(request: Request, db: Session = Depends(get_db)):
     """Genera un PDF basado en una plantilla y datos de una placa."""
     try:
         data = await request.json()
-        template_id = data.get("template_id")
-        plate = data.get("plate")
-        
-        logger.info(f"Iniciando generación de PDF para placa {plate} con template {template_id}")
-        
-        if not template_id or not plate:
-            logger.error("Faltan parámetros requeridos")
-            raise HTTPException(
-                status_code=400, 
-                detail="Se requiere template_id y plate"
-            )
-            
-        # Obtener la plantilla
-        logger.info(f"Obteniendo plantilla {template_id}")
-        template = get_template_by_id(template_id, db)
-        if not template:
-            logger.error(f"No se encontró la plantilla con ID {template_id}")
-            raise HTTPException(
-                status_code=404, 
-                detail=f"Plantilla {template_id} no encontrada"
-            )
-            
-        # Obtener datos del vehículo y eventos
-        logger.info(f"Obteniendo datos del vehículo para placa {plate}")
-        vehicle_data = crud.get_vehicle_data(db, plate)
-        if not vehicle_data or not isinstance(vehicle_data, dict):
-            logger.error(f"No se encontraron datos del vehículo para la placa {plate}")
-            raise HTTPException(
-                status_code=404, 
-                detail=f"No se encontraron datos para la placa {plate}"
-            )
-            
-        # Combinar todos los datos
-        template_data = {
-            "Vehículo": vehicle_data.get("vehicle", {}),
-            "Propietario": vehicle_data.get("current_owner", {}),
-            "SOAT": vehicle_data.get("soat", {}),
-            "RTM": vehicle_data.get("rtm", {}),
-            "Evento": vehicle_data.get("latest_event", {}),
-            "Sistema": {
-                "fecha_generacion": datetime.now().strftime("%Y-%m-%d"),
-                "hora_generacion": datetime.now().strftime("%H:%M:%S"),
-                "usuario_generador": "Sistema"
-            },
-            "image1_base64": data.get("image1_base64", ""),
-            "image2_base64": data.get("image2_base64", "")
-        }
-        
-        logger.info("Generando PDF con los datos recopilados")
-        # Generar el PDF usando el servicio
-        try:
-            pdf_content = pdf_service.generate_pdf_from_template(
-                template["content"],
-                template_data
-            )
-            logger.info("PDF generado exitosamente")
-            return Response(
-                content=pdf_content,
-                media_type="application/pdf",
-                headers={
-                    "Content-Disposition": f'attachment; filename="reporte_{plate}.pdf"'
-                }
-            )
-        except Exception as e:
-            logger.error(f"Error generando PDF: {str(e)}")
-            logger.error(traceback.format_exc())
-            raise HTTPException(
-                status_code=500, 
-                detail=f"Error generando PDF: {str(e)}"
-            )
+        # Las consultas y el renderizado bloquean: fuera del event loop
+        return await asyncio.to_thread(build_pdf_response, data, db)
         
     except HTTPException as he:
         raise he
@@ -686,8 +865,8 @@ async def preview_pdf(request: dict):
 
         # Generar el PDF
         try:
-            pdf_service = PdfService()
-            pdf_content = pdf_service.generate_preview_pdf(content, sample_data)
+            # El renderizado bloquea: fuera del event loop
+            pdf_content = await asyncio.to_thread(pdf_service.generate_preview_pdf, content, sample_data)
             return Response(content=pdf_content, media_type="application/pdf")
         except Exception as e:
             logger.error(f"Error generating preview PDF: {str(e)}")
@@ -96,6 +96,32 @@ class VehicleInfo(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     plate = Column(String, unique=True, index=True)
+    no_registro = Column(String)
+    no_licencia_transito = Column(String)
+    fecha_expedicion_lic_transito = Column(DateTime)
+    estado_vehiculo = Column(String)
+    tipo_servicio = Column(String)
+    clase_vehiculo = Column(String)
+    marca = Column(String)
+    linea = Column(String)
+    modelo = Column(String)
+    color = Column(String)
+    no_serie = Column(String)
+    no_motor = Column(String)
+    no_chasis = Column(String)
+    no_vin = Column(String)
+    cilindraje = Column(String)
+    tipo_carroceria = Column(String)
+    fecha_matricula = Column(DateTime)
+    tiene_gravamenes = Column(Boolean)
+    organismo_transito = Column(String)
+    prendas = Column(Boolean)
+    prendario = Column(String)
+    clasificacion = Column(String)
+    capacidad_carga = Column(String)
+    peso_bruto_vehicular = Column(String)
+    no_ejes = Column(Integer)
+    # Última respuesta RUNT completa (caché de consultas)
     vehicle_data = Column(JSON)
     owner_data = Column(JSON)
     soat_data = Column(JSON)
@@ -119,7 +145,14 @@ class Event(Base):
     plate = Column(String, index=True)
     event_type = Column(String)
     event_data = Column(JSON)
+    # Datos de la detección (cámara, evidencias)
+    event_id = Column(String)
+    device_id = Column(String)
+    date = Column(DateTime)
+    evidences = Column(JSON)
+    video_filename = Column(String)
     created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
 
     # Relación con vehículo
     vehicle = relationship("VehicleInfo", back_populates="events")
@@ -226,8 +259,46 @@ class GeneratedPdf(Base):
     id = Column(Integer, primary_key=True, index=True)
     template_id = Column(Integer, ForeignKey("pdf_templates.id"))
     vehicle_id = Column(Integer, ForeignKey("vehicle_info.id"))
-    file_path = Column(String)
+    pdf_path = Column(String)
+    # Huella de plantilla, versión y datos renderizados (caché de PDFs)
+    content_hash = Column(String(64), unique=True, index=True)
+    size_bytes = Column(Integer)
+    hits = Column(Integer, default=0)
+    last_used_at = Column(DateTime, default=datetime.utcnow)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     vehicle = relationship("VehicleInfo", back_populates="generated_pdfs")
     template = relationship("PdfTemplate", back_populates="generated_pdfs")
+
+class PdfJob(Base):
+    __tablename__ = "pdf_jobs"
+
+    id = Column(String(32), primary_key=True)
+    status = Column(String, nullable=False, default="queued")
+    total = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime)
+
+    items = relationship("PdfJobItem", back_populates="job", cascade="all, delete-orphan", order_by="PdfJobItem.position")
+
+class PdfJobItem(Base):
+    __tablename__ = "pdf_job_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String(32), ForeignKey("pdf_jobs.id", ondelete="CASCADE"), index=True)
+    position = Column(Integer, nullable=False)
+    template_id = Column(Integer, ForeignKey("pdf_templates.id"))
+    plate = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="queued", index=True)
+    # Dueño del intento en curso ("host:pid:token"); solo él puede cerrarlo
+    claim = Column(String)
+    pdf_path = Column(String)
+    error = Column(Text)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    job = relationship("PdfJob", back_populates="items")
+
@@ -0,0 +1,163 @@
+"""API asíncrona de consultas RUNT para los endpoints de FastAPI.
+
+Hace lo mismo que ``RuntService.process_runt_sequence`` sin bloquear el event
+loop:
+
+- HTTP con ``AsyncRuntTransport`` (httpx, keep-alive).
+- Acceso a la base y renovación de la llave HMAC (incluida la firma RSA de
+  generarLlave/validarLlave) en hilos con su propia sesión mediante
+  ``asyncio.to_thread``; el camino habitual usa la llave en memoria y solo
+  calcula el HMAC de cada consulta, que es inmediato.
+- Concurrencia acotada por un semáforo y ritmo marcado por el mismo
+  limitador adaptativo del servicio síncrono.
+- El mismo caché de placas (``RuntCache``); las vencidas se refrescan en
+  tareas de fondo.
+- El mismo registro single-flight: una placa que ya se está consultando,
+  desde este servicio o desde el síncrono, no se vuelve a pedir.
+
+Una consulta larga no detiene ``/health`` ni los demás endpoints.
+"""
+import asyncio
+import logging
+from typing import List
+
+import crud
+from database import SessionLocal
+from services.hmac_key_manager import USER_VARIABLE, HmacKeyError, get_key_manager, key_rejected
+from services.rate_limiter import get_rate_limiter
+from services.runt_cache import STALE, cache_key, get_runt_cache
+from services.runt_http import QUERY_VEHICLES_PATH, AsyncRuntTransport, RuntResponse
+from services.single_flight import get_single_flight
+from services.runt_service import (
+    RUNT_QUERY_RETRIES,
+    RUNT_QUERY_WORKERS,
+    build_vehicle_query,
+    retry_after,
+    sign_payload,
+    vehicle_entry
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRuntService:
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self.transport = AsyncRuntTransport()
+        self.key_manager = get_key_manager(sign_payload)
+        self.rate_limiter = get_rate_limiter()
+        self.cache = get_runt_cache()
+        self.single_flight = get_single_flight()
+        self._background = set()
+
+    def _with_session(self, func, *args):
+        db = self.session_factory()
+        try:
+            return func(db, *args)
+        finally:
+            db.close()
+
+    async def get_usuario(self) -> str:
+        variable = await asyncio.to_thread(self._with_session, crud.get_global_variable, USER_VARIABLE)
+        return variable.value if variable else ""
+
+    async def get_key(self) -> str:
+        """Llave HMAC vigente; solo va a un hilo si hay que cargarla o renovarla."""
+        return self.key_manager.current() or await asyncio.to_thread(
+            self._with_session, self.key_manager.get_key
+        )
+
+    async def invalidate_key(self, rejected: str) -> str:
+        return await asyncio.to_thread(self.key_manager.invalidate, rejected)
+
+    async def query_plate(self, usuario: str, plate: str, llave_hmac: str) -> RuntResponse:
+        """Consulta una placa con el limitador y los mismos reintentos que el servicio síncrono."""
+        key_renewed = False
+        response = None
+        for attempt in range(RUNT_QUERY_RETRIES + 1):
+            await self.rate_limiter.acquire_async()
+            llave_hmac = self.key_manager.current() or llave_hmac
+            query_body, hmac_firma = build_vehicle_query(usuario, plate, llave_hmac)
+            response = await self.transport.post(QUERY_VEHICLES_PATH, usuario, hmac_firma, query_body)
+            if key_rejected(response) and not key_renewed:
+                logger.info("Llave HMAC rechazada, renovando...")
+                key_renewed = True
+                try:
+                    llave_hmac = await self.invalidate_key(llave_hmac)
+                    continue
+                except HmacKeyError as e:
+                    logger.error(f"Error renovando llave HMAC: {str(e)}")
+                    return response
+            if response.error is not None or response.status_code == 429 or response.status_code >= 500:
+                self.rate_limiter.on_throttle(retry_after(response))
+                continue
+            self.rate_limiter.on_success()
+            return response
+        return response
+
+    async def process_runt_sequence(self, plates: List[str]) -> dict:
+        """Consulta varias placas en paralelo; mismo formato que la versión síncrona."""
+        try:
+            logger.info(f"Iniciando consulta asíncrona para {len(plates)} placas")
+            cached = await asyncio.to_thread(self.cache.lookup, plates)
+            pending = [plate for plate in plates if plate not in cached]
+            stale = [plate for plate, (_, state) in cached.items() if state == STALE]
+            results = {plate: entry for plate, (entry, _) in cached.items()}
+
+            if pending or stale:
+                usuario = await self.get_usuario()
+                try:
+                    llave_hmac = await self.get_key()
+                except HmacKeyError as e:
+                    return {
+                        "success": False,
+                        "error": str(e),
+                        "details": e.details
+                    }
+
+                semaphore = asyncio.Semaphore(RUNT_QUERY_WORKERS)
+
+                async def query(plate: str) -> dict:
+                    async with semaphore:
+                        return vehicle_entry(plate, await self.query_plate(usuario, plate, llave_hmac))
+
+                async def fetch(plate: str) -> dict:
+                    entry, _ = await self.single_flight.do_async(cache_key(plate), lambda: query(plate))
+                    return {**entry, "plate": plate}
+
+                claimed = self.cache.claim_revalidation(stale)
+                if claimed:
+                    task = asyncio.create_task(self._revalidate(claimed, fetch))
+                    self._background.add(task)
+                    task.add_done_callback(self._background.discard)
+
+                if pending:
+                    fetched = await asyncio.gather(*(fetch(plate) for plate in pending))
+                    await asyncio.to_thread(self.cache.store, fetched)
+                    results.update(zip(pending, fetched))
+                    logger.info(f"Consultas RUNT: {self.rate_limiter.stats()}")
+            return {
+                "success": True,
+                "data": {
+                    "vehicles": [results[plate] for plate in plates]
+                }
+            }
+        except Exception as e:
+            logger.error(f"Error en process_runt_sequence asíncrono: {str(e)}")
+            return {
+                "success": False,
+                "error": f"Error en proceso RUNT: {str(e)}"
+            }
+
+    async def _revalidate(self, plates: List[str], fetch):
+        """Refresca en segundo plano las placas servidas vencidas."""
+        try:
+            fetched = await asyncio.gather(*(fetch(plate) for plate in plates))
+            await asyncio.to_thread(self.cache.store, fetched)
+        except Exception as e:
+            logger.error(f"Error refrescando el caché RUNT: {str(e)}")
+        finally:
+            self.cache.release_revalidation(plates)
+
+    async def close(self):
+        await self.transport.close()
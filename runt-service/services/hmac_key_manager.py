@@ -0,0 +1,284 @@
+"""Ciclo de vida de la llave HMAC del RUNT.
+
+La llave se genera (``generarLlave``) y se valida (``validarLlave``) una sola
+vez y se reutiliza hasta que expira, en lugar de negociarla en cada consulta.
+
+- Caché en memoria con fecha de expiración (``HMAC_KEY_TTL``).
+- Compartida entre workers y réplicas a través de ``global_variables``
+  (``llavehmaccliente`` y ``llavehmaccliente_expira``).
+- Renovaciones coalescidas: un lock en el proceso y un advisory lock de
+  PostgreSQL entre procesos; quien llega tarde usa la llave ya renovada. El
+  advisory lock y la llave nueva van en una sesión propia, para no confirmar
+  cambios pendientes de la sesión de la petición.
+- Un hilo en segundo plano la renueva ``HMAC_KEY_RENEW_BEFORE`` segundos
+  antes de que expire.
+- Si el RUNT rechaza una llave, ``invalidate`` fuerza una renovación única.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+import crud
+from models import GlobalVariable
+from services.runt_http import (
+    GENERATE_KEY_PATH,
+    VALIDATE_KEY_PATH,
+    RuntResponse,
+    RuntTransport,
+    get_transport
+)
+
+HMAC_KEY_TTL = int(os.getenv("HMAC_KEY_TTL", "3600"))
+HMAC_KEY_RENEW_BEFORE = int(os.getenv("HMAC_KEY_RENEW_BEFORE", "300"))
+HMAC_KEY_CHECK_INTERVAL = int(os.getenv("HMAC_KEY_CHECK_INTERVAL", "60"))
+
+KEY_VARIABLE = "llavehmaccliente"
+EXPIRY_VARIABLE = "llavehmaccliente_expira"
+USER_VARIABLE = "usuarioAseguradoraCliente"
+# Identificador del advisory lock de PostgreSQL ("RUNT")
+ADVISORY_LOCK_ID = 0x52554E54
+
+logger = logging.getLogger(__name__)
+
+
+class HmacKeyError(Exception):
+    def __init__(self, message: str, details: Optional[dict] = None):
+        super().__init__(message)
+        self.details = details or {}
+
+
+def key_rejected(response: RuntResponse) -> bool:
+    """Indica si el RUNT rechazó la consulta por la llave HMAC."""
+    return response.status_code == 401 or "Debe validar la llave" in response.text
+
+
+@dataclass
+class HmacKey:
+    value: str
+    expires_at: float
+
+    def fresh(self, margin: float = 0) -> bool:
+        return time.time() + margin < self.expires_at
+
+
+class HmacKeyManager:
+    def __init__(
+        self,
+        sign: Callable[[str], str],
+        transport: Optional[RuntTransport] = None,
+        session_factory: Optional[Callable[[], Session]] = None,
+        ttl: int = HMAC_KEY_TTL,
+        renew_before: int = HMAC_KEY_RENEW_BEFORE,
+        check_interval: int = HMAC_KEY_CHECK_INTERVAL
+    ):
+        self.sign = sign
+        self.transport = transport or get_transport()
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.renew_before = renew_before
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._key: Optional[HmacKey] = None
+        self._thread = None
+        # Separado de _lock para no esperar una renovación en curso
+        self._thread_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "renewals": 0, "shared_loads": 0, "invalidations": 0, "errors": 0}
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def get_key(self, db: Session) -> str:
+        """Devuelve una llave validada y vigente; la renueva solo si hace falta."""
+        key = self._key
+        if key is not None and key.fresh():
+            self._count("hits")
+            return key.value
+        self._start_background()
+        return self._refresh(db).value
+
+    def current(self) -> Optional[str]:
+        """Llave vigente en memoria, sin tocar la base ni el RUNT."""
+        key = self._key
+        return key.value if key is not None and key.fresh() else None
+
+    def invalidate(self, rejected: str, db: Optional[Session] = None) -> str:
+        """Descarta una llave rechazada por el RUNT y devuelve la siguiente.
+
+        Si otra petición ya la reemplazó, se devuelve la nueva sin renovar.
+        Sin ``db`` se abre una sesión propia (para llamarlo desde otros hilos).
+        """
+        self._count("invalidations")
+        if db is not None or self.session_factory is None:
+            return self._refresh(db, rejected=rejected).value
+        db = self.session_factory()
+        try:
+            return self._refresh(db, rejected=rejected).value
+        finally:
+            db.close()
+
+    def renew(self, db: Session) -> str:
+        """Genera y valida una llave nueva aunque la actual siga vigente."""
+        with self._lock:
+            with self._cross_worker_lock(db) as lock_db:
+                key = self._renew(lock_db)
+            self._key = key
+        return key.value
+
+    def stats(self) -> dict:
+        key = self._key
+        with self._stats_lock:
+            stats = dict(self._stats)
+        return {
+            **stats,
+            "expires_in": round(key.expires_at - time.time()) if key else None
+        }
+
+    def _usable(self, key: Optional[HmacKey], margin: float, rejected: Optional[str]) -> bool:
+        return key is not None and key.fresh(margin) and key.value != rejected
+
+    def _refresh(self, db: Session, margin: float = 0, rejected: Optional[str] = None) -> HmacKey:
+        with self._lock:
+            # Quien esperaba el lock reutiliza la renovación que acaba de ocurrir
+            if self._usable(self._key, margin, rejected):
+                return self._key
+            shared = self._load_shared(db)
+            if self._usable(shared, margin, rejected):
+                self._count("shared_loads")
+                self._key = shared
+                return shared
+            with self._cross_worker_lock(db) as lock_db:
+                # Otro worker pudo renovarla mientras se esperaba el advisory lock
+                shared = self._load_shared(lock_db)
+                if self._usable(shared, margin, rejected):
+                    self._count("shared_loads")
+                    key = shared
+                else:
+                    key = self._renew(lock_db)
+            self._key = key
+            return key
+
+    @contextmanager
+    def _cross_worker_lock(self, db: Session):
+        """Advisory lock de transacción en una sesión propia; entrega esa sesión.
+
+        La llave renovada se guarda y el lock se libera con el commit de esa
+        sesión, sin tocar la transacción de ``db``. Sin ``session_factory`` se
+        usa ``db``.
+        """
+        if db is None:
+            yield None
+            return
+        lock_db = self.session_factory() if self.session_factory is not None else db
+        try:
+            if lock_db.get_bind().dialect.name == "postgresql":
+                lock_db.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": ADVISORY_LOCK_ID})
+            try:
+                yield lock_db
+            except Exception:
+                lock_db.rollback()
+                raise
+            lock_db.commit()
+        finally:
+            if lock_db is not db:
+                lock_db.close()
+
+    def _load_shared(self, db: Session) -> Optional[HmacKey]:
+        if db is None:
+            return None
+        value = crud.get_global_variable(db, KEY_VARIABLE)
+        expiry = crud.get_global_variable(db, EXPIRY_VARIABLE)
+        if not value or not value.value or not expiry:
+            return None
+        try:
+            return HmacKey(value.value, float(expiry.value))
+        except ValueError:
+            return None
+
+    def _store_shared(self, db: Session, key: HmacKey):
+        """Guarda llave y expiración; el commit ocurre al soltar el advisory lock."""
+        if db is None:
+            return
+        for name, value, description in (
+            (KEY_VARIABLE, key.value, "Llave HMAC generada por el servicio"),
+            (EXPIRY_VARIABLE, str(key.expires_at), "Expiración (epoch) de la llave HMAC")
+        ):
+            variable = crud.get_global_variable(db, name)
+            if variable:
+                variable.value = value
+            else:
+                db.add(GlobalVariable(name=name, value=value, description=description))
+        db.flush()
+
+    def _renew(self, db: Session) -> HmacKey:
+        try:
+            variable = crud.get_global_variable(db, USER_VARIABLE) if db is not None else None
+            usuario = variable.value if variable else ""
+            if not usuario:
+                raise HmacKeyError("No se encontró el usuario configurado")
+
+            body = json.dumps({"idUsuario": usuario}, separators=(',', ':'))
+            response = self.transport.post(GENERATE_KEY_PATH, usuario, self.sign(body), body)
+            llave = response.text
+            if not response.ok or not llave or "Error" in llave:
+                raise HmacKeyError("Error al generar llave HMAC", response.to_dict())
+
+            body = json.dumps({"idUsuario": usuario, "llave": llave}, separators=(',', ':'))
+            response = self.transport.post(VALIDATE_KEY_PATH, usuario, self.sign(body), body)
+            if not response.ok or "Error" in response.text:
+                raise HmacKeyError("Error al validar llave HMAC", response.to_dict())
+        except HmacKeyError:
+            self._count("errors")
+            raise
+
+        key = HmacKey(llave, time.time() + self.ttl)
+        self._store_shared(db, key)
+        self._count("renewals")
+        logger.info(f"Llave HMAC renovada, vigente por {self.ttl} s")
+        return key
+
+    def _start_background(self):
+        if self._thread is not None or self.session_factory is None:
+            return
+        with self._thread_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._background_loop, name="hmac-key-renewal", daemon=True)
+            self._thread.start()
+
+    def _background_loop(self):
+        while True:
+            time.sleep(self.check_interval)
+            key = self._key
+            if key is None or key.fresh(self.renew_before):
+                continue
+            db = self.session_factory()
+            try:
+                self._refresh(db, margin=self.renew_before)
+            except Exception as e:
+                logger.error(f"Error renovando la llave HMAC en segundo plano: {str(e)}")
+            finally:
+                db.close()
+
+
+_manager: Optional[HmacKeyManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_key_manager(sign: Callable[[str], str]) -> HmacKeyManager:
+    """Gestor compartido por todo el proceso."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            from database import SessionLocal
+            _manager = HmacKeyManager(sign, session_factory=SessionLocal)
+        return _manager
@@ -0,0 +1,238 @@
+"""Caché de PDFs generados, direccionado por contenido.
+
+Los operadores descargan una y otra vez el mismo reporte. Un PDF queda
+determinado por:
+
+- la plantilla (id y ``updated_at``);
+- la hoja base con que se renderiza;
+- el contexto de la plantilla (datos del vehículo, del evento e imágenes de
+  evidencia).
+
+Su huella SHA-256 es el nombre del archivo en ``PDF_CACHE_DIR`` y la columna
+``content_hash`` de ``generated_pdfs``. Una solicitud repetida se sirve
+directamente del archivo, sin Jinja ni WeasyPrint.
+
+De ``Sistema`` siempre entra en la huella la fecha de generación. La hora
+solo queda fuera cuando la plantilla no la imprime (no menciona
+``hora_generacion`` ni usa ``Sistema`` completo): entonces un reporte
+repetido el mismo día se sirve del caché. Si la imprime, cada generación es
+un PDF distinto y nunca se muestra una hora vieja.
+
+Cuando los archivos superan ``PDF_CACHE_MAX_BYTES`` se eliminan los menos
+usados: cada acierto actualiza el ``mtime`` del archivo y ``last_used_at``.
+Los archivos se borran junto con su fila.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Optional
+
+from jinja2 import Template
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import GeneratedPdf
+from services.pdf_styles import STYLESHEETS
+
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", "output/pdfs/cache")
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# Campos de ``Sistema`` que cambian en cada generación; quedan fuera de la
+# huella solo si la plantilla no los imprime
+VOLATILE_SYSTEM_KEYS = ("hora_generacion",)
+# Usos de ``Sistema`` que no imprimen ninguno de los campos volátiles
+_STABLE_SYSTEM_USE = re.compile(r"Sistema\s*(\.\s*|\[\s*['\"])(fecha_generacion|usuario_generador)\b")
+
+logger = logging.getLogger(__name__)
+
+
+def prints_volatile_fields(source: Optional[str]) -> bool:
+    """Indica si el código de una plantilla puede imprimir la hora de generación.
+
+    Sin el código (``None``) se asume que sí.
+    """
+    if source is None:
+        return True
+    if any(key in source for key in VOLATILE_SYSTEM_KEYS):
+        return True
+    # ``{{ Sistema }}`` o un ``for`` sobre sus campos también la imprimen
+    return "Sistema" in _STABLE_SYSTEM_USE.sub("", source)
+
+
+def content_key(
+    template_id: int,
+    template_version: Optional[datetime],
+    stylesheet: str,
+    context: dict,
+    template: Optional[Template] = None
+) -> str:
+    """Huella del PDF que resultaría de renderizar ``context`` con la plantilla.
+
+    ``template`` es la plantilla compilada por ``TemplateCache``; su código
+    decide si la hora de generación entra en la huella.
+    """
+    context = dict(context)
+    if isinstance(context.get("Sistema"), dict) and not prints_volatile_fields(getattr(template, "source", None)):
+        context["Sistema"] = {k: v for k, v in context["Sistema"].items() if k not in VOLATILE_SYSTEM_KEYS}
+    canonical = json.dumps(
+        {
+            "template": [template_id, template_version.isoformat() if template_version else None],
+            "stylesheet": hashlib.sha256(STYLESHEETS[stylesheet].encode("utf-8")).hexdigest(),
+            "context": context
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class PdfCache:
+    def __init__(self, directory: str = PDF_CACHE_DIR, max_bytes: int = PDF_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # Tamaño total conocido; None hasta el primer recorrido del directorio
+        self._bytes: Optional[int] = None
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def lookup(self, db: Session, key: str) -> Optional[str]:
+        """Ruta del PDF en caché o None."""
+        record = db.query(GeneratedPdf).filter(GeneratedPdf.content_hash == key).first()
+        if record is None or not record.pdf_path or not os.path.exists(record.pdf_path):
+            if record is not None:
+                # El archivo se borró por fuera: la fila ya no sirve
+                db.delete(record)
+                db.commit()
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        try:
+            os.utime(record.pdf_path)
+        except OSError:
+            pass
+        record.hits = (record.hits or 0) + 1
+        record.last_used_at = datetime.utcnow()
+        db.commit()
+        with self._lock:
+            self._stats["hits"] += 1
+        return record.pdf_path
+
+    def fetch(self, db: Session, key: str) -> Optional[bytes]:
+        """Como ``lookup``, pero devuelve el contenido del PDF.
+
+        Leerlo aquí evita servir una ruta que ``_evict`` de otro worker borre
+        antes de enviarla; si ya no está, cuenta como fallo.
+        """
+        path = self.lookup(db, key)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self._stats["hits"] -= 1
+                self._stats["misses"] += 1
+            return None
+
+    def store(
+        self,
+        db: Session,
+        key: str,
+        pdf_content: bytes,
+        template_id: Optional[int] = None,
+        vehicle_id: Optional[int] = None
+    ) -> str:
+        """Guarda el PDF y su fila en ``generated_pdfs``; devuelve la ruta."""
+        path = self.path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(pdf_content)
+        os.replace(tmp_path, path)
+
+        record = db.query(GeneratedPdf).filter(GeneratedPdf.content_hash == key).first()
+        if record is None:
+            record = GeneratedPdf(content_hash=key, hits=0)
+            db.add(record)
+        record.template_id = template_id
+        record.vehicle_id = vehicle_id
+        record.pdf_path = path
+        record.size_bytes = len(pdf_content)
+        record.last_used_at = datetime.utcnow()
+        try:
+            db.commit()
+        except IntegrityError:
+            # Otro worker guardó el mismo PDF al mismo tiempo
+            db.rollback()
+
+        with self._lock:
+            self._stats["stores"] += 1
+            if self._bytes is not None:
+                self._bytes += len(pdf_content)
+            over = self._bytes is None or self._bytes > self.max_bytes
+        if over:
+            self._evict(db)
+        return path
+
+    def _evict(self, db: Session):
+        """Borra los PDFs menos usados hasta quedar bajo ``max_bytes``.
+
+        Recorre el directorio en lugar de confiar en el total en memoria,
+        porque otros workers escriben en la misma carpeta.
+        """
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".pdf"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path, entry.name[:-len(".pdf")]))
+        total = sum(size for _, size, _, _ in files)
+        evicted = []
+        for _, size, path, key in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted.append(key)
+        if evicted:
+            db.query(GeneratedPdf).filter(GeneratedPdf.content_hash.in_(evicted)).delete(synchronize_session=False)
+            db.commit()
+            logger.info(f"Caché de PDFs: {len(evicted)} archivos eliminados")
+        with self._lock:
+            self._bytes = total
+            self._stats["evictions"] += len(evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hit_ratio": round(self._stats["hits"] / lookups, 3) if lookups else None
+            }
+
+
+_cache: Optional[PdfCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_pdf_cache() -> PdfCache:
+    """Caché compartido por todo el proceso."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PdfCache()
+        return _cache
@@ -0,0 +1,389 @@
+"""Cola de trabajos de generación de PDFs en segundo plano.
+
+``/generate-pdf`` devuelve el PDF en la misma respuesta, y un lote grande
+puede superar los tiempos de espera HTTP. Aquí un trabajo agrupa uno o varios
+``(template_id, placa)``:
+
+- Se guarda en ``pdf_jobs``/``pdf_job_items`` y se responde de inmediato con
+  su id.
+- ``PDF_JOB_WORKERS`` hilos toman los ítems pendientes de la base.
+  ``FOR UPDATE SKIP LOCKED`` evita que dos réplicas tomen el mismo ítem.
+- Cada ítem se genera con ``PdfService.generate_report``, que usa el caché de
+  plantillas, el de PDFs y el pool de procesos.
+- Los PDFs quedan en ``PDF_JOB_DIR/<job_id>/``.
+
+El estado vive en la base, así que los trabajos sobreviven a un reinicio. Los
+ítems que quedaron en curso más de ``PDF_JOB_STALE`` segundos vuelven a la
+cola; al arrancar, además, se reencolan de inmediato los que tomó un proceso
+de este mismo host que ya no existe. Cada toma guarda un ``claim`` y solo
+quien lo tiene puede cerrar el ítem: si un ítem se reencoló mientras se
+generaba, el primer intento no vuelve a sumar en los contadores del trabajo.
+Los trabajos terminados hace más de ``PDF_JOB_TTL`` segundos se borran junto
+con sus archivos.
+"""
+import logging
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+import zipfile
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import case
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import PdfJob, PdfJobItem
+from services.pdf_render_pool import PDF_RENDER_WORKERS
+from services.pdf_service import PdfService
+
+PDF_JOB_WORKERS = int(os.getenv("PDF_JOB_WORKERS", str(max(1, PDF_RENDER_WORKERS))))
+PDF_JOB_DIR = os.getenv("PDF_JOB_DIR", "output/pdfs/jobs")
+PDF_JOB_POLL = float(os.getenv("PDF_JOB_POLL", "2"))
+PDF_JOB_STALE = int(os.getenv("PDF_JOB_STALE", "600"))
+PDF_JOB_TTL = int(os.getenv("PDF_JOB_TTL", str(7 * 86400)))
+# Cada cuánto se reencolan ítems colgados y se borran trabajos vencidos
+PDF_JOB_HOUSEKEEPING = 60
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+FINISHED = (DONE, FAILED)
+
+logger = logging.getLogger(__name__)
+
+
+def job_summary(job: PdfJob) -> dict:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "total": job.total,
+        "completed": job.completed,
+        "failed": job.failed,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "items": [
+            {
+                "id": item.id,
+                "template_id": item.template_id,
+                "plate": item.plate,
+                "status": item.status,
+                "error": item.error,
+                "download_url": f"/pdf-jobs/{job.id}/items/{item.id}/pdf" if item.status == DONE else None
+            }
+            for item in job.items
+        ]
+    }
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class PdfJobQueue:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        workers: int = PDF_JOB_WORKERS,
+        directory: str = PDF_JOB_DIR
+    ):
+        self.session_factory = session_factory
+        self.workers = max(1, workers)
+        self.directory = directory
+        self.pdf_service = PdfService()
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        # SQLite ignora FOR UPDATE: dentro del proceso se reclama de a uno
+        self._claim_lock = threading.Lock()
+        self._housekeeping_at = 0.0
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "submitted": 0, "completed": 0, "failed": 0, "from_cache": 0, "requeued": 0, "lost_claims": 0
+        }
+
+    def start(self):
+        if self._threads:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._stop.clear()
+        try:
+            self._requeue_orphans()
+            self._housekeeping()
+        except Exception as e:
+            logger.error(f"Error revisando la cola de PDFs al arrancar: {str(e)}")
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"pdf-job-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, items: List[Tuple[int, str]]) -> dict:
+        """Encola un trabajo con ``(template_id, placa)`` por ítem."""
+        db = self.session_factory()
+        try:
+            job = PdfJob(id=uuid.uuid4().hex, status=QUEUED, total=len(items), completed=0, failed=0)
+            job.items = [
+                PdfJobItem(position=position, template_id=template_id, plate=plate, status=QUEUED)
+                for position, (template_id, plate) in enumerate(items)
+            ]
+            db.add(job)
+            db.commit()
+            summary = job_summary(job)
+        finally:
+            db.close()
+        with self._stats_lock:
+            self._stats["submitted"] += len(items)
+        self._wakeup.set()
+        return summary
+
+    def get(self, job_id: str) -> Optional[dict]:
+        db = self.session_factory()
+        try:
+            job = db.get(PdfJob, job_id)
+            return job_summary(job) if job else None
+        finally:
+            db.close()
+
+    def item_path(self, job_id: str, item_id: int) -> Optional[str]:
+        """Ruta del PDF de un ítem terminado."""
+        db = self.session_factory()
+        try:
+            item = db.get(PdfJobItem, item_id)
+            if item is None or item.job_id != job_id or item.status != DONE:
+                return None
+            return item.pdf_path if item.pdf_path and os.path.exists(item.pdf_path) else None
+        finally:
+            db.close()
+
+    def archive(self, job_id: str) -> Optional[str]:
+        """ZIP con los PDFs de un trabajo terminado; se arma una sola vez."""
+        db = self.session_factory()
+        try:
+            job = db.get(PdfJob, job_id)
+            if job is None or job.status not in FINISHED:
+                return None
+            paths = [
+                item.pdf_path for item in job.items
+                if item.status == DONE and item.pdf_path and os.path.exists(item.pdf_path)
+            ]
+        finally:
+            db.close()
+        path = os.path.join(self.directory, job_id, f"{job_id}.zip")
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            # Los PDFs ya vienen comprimidos
+            with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_STORED) as archive:
+                for item_path in paths:
+                    archive.write(item_path, os.path.basename(item_path))
+            os.replace(tmp_path, path)
+        return path
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._housekeeping()
+                item_id = self._claim()
+            except Exception as e:
+                logger.error(f"Error leyendo la cola de PDFs: {str(e)}")
+                item_id = None
+            if item_id is None:
+                self._wakeup.wait(PDF_JOB_POLL)
+                self._wakeup.clear()
+                continue
+            self._process(*item_id)
+
+    def _claim(self) -> Optional[Tuple[int, str]]:
+        """Marca en curso el siguiente ítem pendiente; devuelve ``(id, claim)``."""
+        with self._claim_lock:
+            db = self.session_factory()
+            try:
+                item = db.query(PdfJobItem).filter(
+                    PdfJobItem.status == QUEUED
+                ).order_by(PdfJobItem.id).with_for_update(skip_locked=True).first()
+                if item is None:
+                    db.rollback()
+                    return None
+                claim = f"{self.owner}:{uuid.uuid4().hex[:8]}"
+                item.status = RUNNING
+                item.claim = claim
+                item.started_at = datetime.utcnow()
+                db.query(PdfJob).filter(PdfJob.id == item.job_id, PdfJob.status == QUEUED).update(
+                    {PdfJob.status: RUNNING}, synchronize_session=False
+                )
+                db.commit()
+                return item.id, claim
+            finally:
+                db.close()
+
+    def _process(self, item_id: int, claim: str):
+        db = self.session_factory()
+        try:
+            item = db.get(PdfJobItem, item_id)
+            job_id = item.job_id
+            job_dir = os.path.join(self.directory, job_id)
+            os.makedirs(job_dir, exist_ok=True)
+            output_path = os.path.join(job_dir, f"{item.position + 1:04d}_{os.path.basename(item.plate)}.pdf")
+            try:
+                from_cache = self.pdf_service.generate_report(db, item.template_id, item.plate, output_path)
+                values = {PdfJobItem.status: DONE, PdfJobItem.pdf_path: output_path, PdfJobItem.error: None}
+                counter = PdfJob.completed
+            except Exception as e:
+                logger.error(f"Error generando el PDF de {item.plate} (trabajo {job_id}): {str(e)}")
+                db.rollback()
+                values = {PdfJobItem.status: FAILED, PdfJobItem.error: str(e)}
+                from_cache, counter = False, PdfJob.failed
+            values[PdfJobItem.finished_at] = datetime.utcnow()
+            if not self._finish_item(db, item_id, claim, job_id, values, counter):
+                logger.warning(f"El ítem {item_id} del trabajo {job_id} se reencoló durante la generación; "
+                               f"se descarta este intento")
+                with self._stats_lock:
+                    self._stats["lost_claims"] += 1
+                return
+            with self._stats_lock:
+                self._stats["completed" if values[PdfJobItem.status] == DONE else "failed"] += 1
+                self._stats["from_cache"] += int(from_cache)
+        except Exception as e:
+            logger.error(f"Error procesando el ítem {item_id} de la cola de PDFs: {str(e)}")
+            db.rollback()
+        finally:
+            db.close()
+
+    @staticmethod
+    def _finish_item(db: Session, item_id: int, claim: str, job_id: str, values: dict, counter) -> bool:
+        """Cierra el ítem si sigue siendo de ``claim``; suma al trabajo y lo cierra si era el último.
+
+        Devuelve False, sin tocar el trabajo, si el ítem ya no pertenece a
+        este intento (se reencoló y lo tomó otro worker).
+        """
+        owned = db.query(PdfJobItem).filter(
+            PdfJobItem.id == item_id,
+            PdfJobItem.status == RUNNING,
+            PdfJobItem.claim == claim
+        ).update(values, synchronize_session=False)
+        if owned != 1:
+            db.rollback()
+            return False
+        db.query(PdfJob).filter(PdfJob.id == job_id).update(
+            {counter: counter + 1}, synchronize_session=False
+        )
+        db.query(PdfJob).filter(
+            PdfJob.id == job_id,
+            PdfJob.status.notin_(FINISHED),
+            PdfJob.completed + PdfJob.failed >= PdfJob.total
+        ).update(
+            {
+                PdfJob.status: case((PdfJob.completed == 0, FAILED), else_=DONE),
+                PdfJob.finished_at: datetime.utcnow()
+            },
+            synchronize_session=False
+        )
+        db.commit()
+        return True
+
+    def _requeue_orphans(self):
+        """Reencola los ítems en curso de procesos de este host que ya no existen.
+
+        Tras reiniciar el servicio no hay que esperar ``PDF_JOB_STALE``. Los
+        ítems de otros hosts (réplicas) se dejan al reencolado por antigüedad.
+        """
+        host = socket.gethostname()
+        db = self.session_factory()
+        try:
+            orphans = []
+            for item_id, claim in db.query(PdfJobItem.id, PdfJobItem.claim).filter(
+                PdfJobItem.status == RUNNING,
+                PdfJobItem.claim.like(f"{host}:%")
+            ):
+                pid = claim.split(":")[1] if claim.count(":") >= 2 else ""
+                if not pid.isdigit() or not _process_alive(int(pid)) or int(pid) == os.getpid():
+                    orphans.append(item_id)
+            if orphans:
+                db.query(PdfJobItem).filter(
+                    PdfJobItem.id.in_(orphans),
+                    PdfJobItem.status == RUNNING
+                ).update(
+                    {PdfJobItem.status: QUEUED, PdfJobItem.claim: None, PdfJobItem.started_at: None},
+                    synchronize_session=False
+                )
+                db.commit()
+                logger.info(f"Cola de PDFs: {len(orphans)} ítems de procesos terminados reencolados")
+                with self._stats_lock:
+                    self._stats["requeued"] += len(orphans)
+        finally:
+            db.close()
+
+    def _housekeeping(self):
+        with self._claim_lock:
+            if time.monotonic() - self._housekeeping_at < PDF_JOB_HOUSEKEEPING:
+                return
+            self._housekeeping_at = time.monotonic()
+        db = self.session_factory()
+        try:
+            now = datetime.utcnow()
+            requeued = db.query(PdfJobItem).filter(
+                PdfJobItem.status == RUNNING,
+                PdfJobItem.started_at < now - timedelta(seconds=PDF_JOB_STALE)
+            ).update(
+                {PdfJobItem.status: QUEUED, PdfJobItem.claim: None, PdfJobItem.started_at: None},
+                synchronize_session=False
+            )
+            expired = [
+                job_id for (job_id,) in db.query(PdfJob.id).filter(
+                    PdfJob.status.in_(FINISHED),
+                    PdfJob.finished_at < now - timedelta(seconds=PDF_JOB_TTL)
+                )
+            ]
+            if expired:
+                db.query(PdfJobItem).filter(PdfJobItem.job_id.in_(expired)).delete(synchronize_session=False)
+                db.query(PdfJob).filter(PdfJob.id.in_(expired)).delete(synchronize_session=False)
+            db.commit()
+            for job_id in expired:
+                shutil.rmtree(os.path.join(self.directory, job_id), ignore_errors=True)
+            if requeued or expired:
+                logger.info(f"Cola de PDFs: {requeued} ítems reencolados, {len(expired)} trabajos vencidos borrados")
+            with self._stats_lock:
+                self._stats["requeued"] += requeued
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        db = self.session_factory()
+        try:
+            queued = db.query(PdfJobItem).filter(PdfJobItem.status == QUEUED).count()
+            running = db.query(PdfJobItem).filter(PdfJobItem.status == RUNNING).count()
+        finally:
+            db.close()
+        with self._stats_lock:
+            return {**self._stats, "queued": queued, "running": running, "workers": self.workers}
+
+
+_queue: Optional[PdfJobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_pdf_job_queue() -> PdfJobQueue:
+    """Cola compartida por todo el proceso."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = PdfJobQueue()
+        return _queue
@@ -0,0 +1,202 @@
+"""Motor de renderizado de PDFs con un pool de procesos calientes.
+
+WeasyPrint usa la CPU intensamente y, dentro del proceso de FastAPI, además
+compite por el GIL con los endpoints. El HTML se arma en el proceso principal
+(Jinja es barato con el caché de plantillas) y la conversión a PDF se hace en
+``PDF_RENDER_WORKERS`` procesos (por defecto uno por núcleo):
+
+- Los procesos se crean con ``spawn``: no heredan los hilos ni las conexiones
+  del servidor.
+- Al arrancar, cada proceso importa WeasyPrint, parsea una sola vez las hojas
+  de ``services.pdf_styles`` y renderiza un documento de calentamiento. Así
+  Pango, fontconfig y las fuentes ya están cargados cuando llega el primer
+  trabajo, y ningún documento vuelve a parsear los estilos base.
+- Con ``PDF_SHARE_FONT_CONFIG`` (por defecto activo) todos los documentos de
+  un proceso comparten la ``FontConfiguration`` de las hojas base, en lugar de
+  crear una por documento.
+- ``render_many``/``render_many_async`` reciben lotes y entregan cada PDF
+  apenas termina, sin esperar al resto del lote.
+- Si un proceso muere (p. ej. por falta de memoria), el pool se recrea en el
+  siguiente envío.
+
+Con ``PDF_RENDER_WORKERS=0`` se renderiza en el mismo proceso, útil para
+depurar.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncIterator, Hashable, Iterable, Iterator, Optional, Tuple
+
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", str(os.cpu_count() or 1)))
+PDF_SHARE_FONT_CONFIG = os.getenv("PDF_SHARE_FONT_CONFIG", "true").lower() == "true"
+
+WARMUP_HTML = "<html><body><p>warm-up áéíóú ñ 0123456789</p><table><tr><td>x</td></tr></table></body></html>"
+
+logger = logging.getLogger(__name__)
+
+# Estado de cada proceso de renderizado (o del principal con 0 workers)
+_worker_state = {}
+
+
+def _init_worker():
+    """Carga WeasyPrint, las fuentes y las hojas base una sola vez por proceso."""
+    from weasyprint import CSS, HTML
+    from weasyprint.text.fonts import FontConfiguration
+
+    from services.pdf_styles import REPORT, STYLESHEETS
+
+    started = time.perf_counter()
+    font_config = FontConfiguration()
+    _worker_state["html"] = HTML
+    _worker_state["font_config"] = font_config if PDF_SHARE_FONT_CONFIG else None
+    _worker_state["stylesheets"] = {
+        name: CSS(string=css, font_config=font_config)
+        for name, css in STYLESHEETS.items()
+    }
+    _render(WARMUP_HTML, REPORT)
+    logger.info(f"Proceso de PDFs {os.getpid()} listo en {time.perf_counter() - started:.2f}s")
+
+
+def _render(html: str, stylesheet: Optional[str] = None) -> bytes:
+    if not _worker_state:
+        _init_worker()
+    stylesheets = [_worker_state["stylesheets"][stylesheet]] if stylesheet else None
+    return _worker_state["html"](string=html).write_pdf(
+        stylesheets=stylesheets, font_config=_worker_state["font_config"]
+    )
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+class PdfRenderPool:
+    def __init__(self, workers: int = PDF_RENDER_WORKERS):
+        self.workers = max(0, workers)
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._stats = {"submitted": 0, "rendered": 0, "failed": 0, "restarts": 0, "seconds": 0.0}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker
+                )
+            return self._executor
+
+    def _reset(self, broken: ProcessPoolExecutor):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+                self._stats["restarts"] += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def warm_up(self):
+        """Arranca todos los procesos sin esperar a que lleguen trabajos."""
+        if self.workers:
+            executor = self._get_executor()
+            for _ in range(self.workers):
+                executor.submit(_ping)
+
+    def submit(self, html: str, stylesheet: Optional[str] = None) -> Future:
+        """Encola un documento; el ``Future`` devuelve los bytes del PDF.
+
+        ``stylesheet`` es el nombre de una hoja de ``services.pdf_styles``.
+        """
+        with self._lock:
+            self._stats["submitted"] += 1
+        started = time.perf_counter()
+        executor = None
+        if not self.workers:
+            future = Future()
+            try:
+                future.set_result(_render(html, stylesheet))
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            executor = self._get_executor()
+            try:
+                future = executor.submit(_render, html, stylesheet)
+            except BrokenProcessPool:
+                logger.error("El pool de PDFs se cayó, recreándolo")
+                self._reset(executor)
+                executor = self._get_executor()
+                future = executor.submit(_render, html, stylesheet)
+        future.add_done_callback(lambda f: self._done(f, executor, started))
+        return future
+
+    def _done(self, future: Future, executor: Optional[ProcessPoolExecutor], started: float):
+        error = None if future.cancelled() else future.exception()
+        with self._lock:
+            if future.cancelled() or error is not None:
+                self._stats["failed"] += 1
+            else:
+                self._stats["rendered"] += 1
+                self._stats["seconds"] += time.perf_counter() - started
+        if isinstance(error, BrokenProcessPool) and executor is not None:
+            self._reset(executor)
+
+    def render(self, html: str, stylesheet: Optional[str] = None) -> bytes:
+        return self.submit(html, stylesheet).result()
+
+    def render_many(
+        self, jobs: Iterable[Tuple[Hashable, str]], stylesheet: Optional[str] = None
+    ) -> Iterator[Tuple[Hashable, Optional[bytes], Optional[str]]]:
+        """Renderiza ``(clave, html)`` y entrega ``(clave, pdf, error)`` en orden de llegada."""
+        futures = {self.submit(html, stylesheet): key for key, html in jobs}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, str(e)
+
+    async def render_many_async(
+        self, jobs: Iterable[Tuple[Hashable, str]], stylesheet: Optional[str] = None
+    ) -> AsyncIterator[Tuple[Hashable, Optional[bytes], Optional[str]]]:
+        """Versión para corrutinas de ``render_many``; no bloquea el event loop."""
+        async def wait(key, future):
+            try:
+                return key, await asyncio.wrap_future(future), None
+            except Exception as e:
+                return key, None, str(e)
+
+        pending = [wait(key, self.submit(html, stylesheet)) for key, html in jobs]
+        for next_done in asyncio.as_completed(pending):
+            yield await next_done
+
+    def stats(self) -> dict:
+        with self._lock:
+            rendered = self._stats["rendered"]
+            return {
+                **self._stats,
+                "workers": self.workers,
+                # Desde el envío hasta tener el PDF, incluida la espera en cola
+                "avg_seconds": round(self._stats["seconds"] / rendered, 3) if rendered else None
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+_pool: Optional[PdfRenderPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_render_pool() -> PdfRenderPool:
+    """Pool compartido por todo el proceso."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PdfRenderPool()
+        return _pool
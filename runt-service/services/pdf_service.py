@@ -1,10 +1,10 @@
 from jinja2 import Template
-from weasyprint import HTML
 import os
+import shutil
 from datetime import datetime
 from sqlalchemy.orm import Session
 import crud
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Union
 import json
 from models import PdfTemplate, VehicleInfo
 from fastapi import HTTPException
@@ -13,7 +13,11 @@ import base64
 from sqlalchemy.orm import Session
 from models import GlobalVariable
 from sqlalchemy.orm import Session
-from database import get_db
+from database import SessionLocal
+from services.pdf_cache import content_key, get_pdf_cache
+from services.pdf_render_pool import get_render_pool
+from services.pdf_styles import BASIC, REPORT, wrap_document
+from services.template_cache import get_template_cache
 import traceback
 
 logger = logging.getLogger(__name__)
@@ -110,6 +114,7 @@ class PdfService:
             template.updated_at = datetime.now()
             db.commit()
             db.refresh(template)
+            get_template_cache().invalidate(template_id)
         
         return template
 
@@ -140,15 +145,7 @@ class PdfService:
 
             logger.info(f"Datos encontrados para la placa {plate}, formateando información...")
             try:
-                # Formatear los datos para la plantilla
-                formatted_data = {
-                    "vehicle": self._format_vehicle_info(vehicle_data["vehicle_info"]) if vehicle_data.get("vehicle_info") else {},
-                    "owners": [self._format_owner(owner) for owner in vehicle_data.get("owners", [])],
-                    "current_owner": self._get_current_owner(vehicle_data.get("owners", [])),
-                    "soat": self._get_latest_soat(vehicle_data.get("soats", [])),
-                    "rtm": self._get_latest_rtm(vehicle_data.get("rtms", [])),
-                    "policies": self._format_policies(vehicle_data.get("civil_policies", []))
-                }
+                formatted_data = self._format_vehicle_data(vehicle_data)
                 logger.info("Datos formateados correctamente")
                 return formatted_data
             except Exception as format_error:
@@ -160,13 +157,45 @@ class PdfService:
             logger.error(traceback.format_exc())
             return None
 
+    def get_vehicles_data(self, db: Session, plates: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Versión por lotes de ``get_vehicle_data`` para generar muchos PDFs.
+
+        Carga todas las placas con un número fijo de consultas; las placas sin
+        datos o que no se pudieron formatear no aparecen en el resultado.
+        """
+        formatted = {}
+        for plate, vehicle_data in crud.get_vehicle_aggregates(db, plates).items():
+            try:
+                formatted[plate] = self._format_vehicle_data(vehicle_data)
+            except Exception as format_error:
+                logger.error(f"Error formateando datos de la placa {plate}: {str(format_error)}")
+        missing = set(plates) - set(formatted)
+        if missing:
+            logger.warning(f"No se encontraron datos para las placas {sorted(missing)}")
+        return formatted
+
+    def _format_vehicle_data(self, vehicle_data: dict) -> Dict[str, Any]:
+        """Formatea un agregado de ``crud.get_vehicle_aggregates`` para la plantilla"""
+        return {
+            "vehicle": self._format_vehicle_info(vehicle_data["vehicle_info"]) if vehicle_data.get("vehicle_info") else {},
+            "owners": [self._format_owner(owner) for owner in vehicle_data.get("owners", [])],
+            "current_owner": self._get_current_owner(vehicle_data.get("owners", [])),
+            "soat": self._get_latest_soat(vehicle_data.get("soats", [])),
+            "rtm": self._get_latest_rtm(vehicle_data.get("rtms", [])),
+            "policies": self._format_policies(vehicle_data.get("civil_policies", []))
+        }
+
+    @staticmethod
+    def _format_date(value) -> Optional[str]:
+        return value.strftime("%d/%m/%Y") if value else None
+
     def _format_vehicle_info(self, vehicle) -> Dict[str, Any]:
         """Formatea la información básica del vehículo"""
         return {
             "plate": vehicle.plate,
             "registro": vehicle.no_registro,
             "licencia": vehicle.no_licencia_transito,
-            "fecha_expedicion": vehicle.fecha_expedicion_lic_transito.strftime("%d/%m/%Y"),
+            "fecha_expedicion": self._format_date(vehicle.fecha_expedicion_lic_transito),
             "estado": vehicle.estado_vehiculo,
             "tipo_servicio": vehicle.tipo_servicio,
             "clase": vehicle.clase_vehiculo,
@@ -208,11 +237,11 @@ class PdfService:
         """Obtiene el SOAT más reciente"""
         if not soats:
             return None
-        latest = max(soats, key=lambda s: s.fecha_expedicion)
+        latest = max(soats, key=lambda s: s.fecha_expedicion or datetime.min)
         return {
             "poliza": latest.no_poliza,
-            "fecha_expedicion": latest.fecha_expedicion.strftime("%d/%m/%Y"),
-            "fecha_vencimiento": latest.fecha_vencimiento.strftime("%d/%m/%Y"),
+            "fecha_expedicion": self._format_date(latest.fecha_expedicion),
+            "fecha_vencimiento": self._format_date(latest.fecha_vencimiento),
             "estado": latest.estado,
             "entidad": latest.entidad_expide
         }
@@ -221,11 +250,11 @@ class PdfService:
         """Obtiene la revisión técnico-mecánica más reciente"""
         if not rtms:
             return None
-        latest = max(rtms, key=lambda r: r.fecha_expedicion)
+        latest = max(rtms, key=lambda r: r.fecha_expedicion or datetime.min)
         return {
             "numero": latest.nro_rtm,
-            "fecha_expedicion": latest.fecha_expedicion.strftime("%d/%m/%Y"),
-            "fecha_vigencia": latest.fecha_vigente.strftime("%d/%m/%Y"),
+            "fecha_expedicion": self._format_date(latest.fecha_expedicion),
+            "fecha_vigencia": self._format_date(latest.fecha_vigente),
             "cda": latest.cda_expide,
             "vigente": latest.vigente
         }
@@ -258,6 +287,13 @@ class PdfService:
             logger.error(f"Error extrayendo imágenes: {str(e)}")
             return None, None
 
+    @staticmethod
+    def _compiled(template_content) -> Template:
+        """Acepta una plantilla ya compilada o su contenido en texto."""
+        if isinstance(template_content, Template):
+            return template_content
+        return get_template_cache().from_string(template_content)
+
     def generate_pdf(self, template_content, data):
         try:
             # Obtener las variables del template y los datos del vehículo
@@ -285,32 +321,15 @@ class PdfService:
                 "image2_base64": data.get("image2_base64", "")
             }
             
-            # Crear el template con Jinja2
-            template = Template(template_content)
+            # Plantilla compilada (o compilarla una sola vez con el caché)
+            template = self._compiled(template_content)
             html_content = template.render(**context)
             
-            # Agregar estilos CSS
-            html_content = f"""
-            <html>
-                <head>
-                    <style>
-                        body {{ font-family: Arial, sans-serif; }}
-                        table {{ width: 100%; border-collapse: collapse; margin: 10px 0; }}
-                        th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-                        th {{ background-color: #f5f5f5; }}
-                        img {{ max-width: 100%; height: auto; }}
-                        .header {{ text-align: center; margin-bottom: 20px; }}
-                        .footer {{ text-align: center; margin-top: 20px; font-size: 12px; }}
-                    </style>
-                </head>
-                <body>
-                    {html_content}
-                </body>
-            </html>
-            """
+            # Los estilos base van aparte, ya parseados en el pool de procesos
+            html_content = wrap_document(html_content)
             
-            # Generar el PDF
-            pdf = HTML(string=html_content).write_pdf()
+            # Generar el PDF en el pool de procesos
+            pdf = get_render_pool().render(html_content, BASIC)
             return pdf
             
         except Exception as e:
@@ -385,174 +404,116 @@ class PdfService:
             }
 
             # Obtener variables parametrizadas de la base de datos
-            db = next(get_db())
-            variables = db.query(GlobalVariable).all()
-            for var in variables:
-                template_data[var.name] = var.value
+            db = SessionLocal()
+            try:
+                variables = db.query(GlobalVariable).all()
+                for var in variables:
+                    template_data[var.name] = var.value
+            finally:
+                db.close()
 
             # Renderizar plantilla
-            template = Template(template_content)
+            template = self._compiled(template_content)
             html_content = template.render(**template_data)
             
-            # Agregar estilos CSS
-            html_content = f"""
-            <html>
-            <head>
-                <meta charset="UTF-8">
-                <style>
-                    body {{ 
-                        font-family: Arial, sans-serif; 
-                        margin: 20px; 
-                        line-height: 1.6;
-                    }}
-                    table {{ 
-                        width: 100%; 
-                        border-collapse: collapse; 
-                        margin: 10px 0; 
-                    }}
-                    th, td {{ 
-                        border: 1px solid #ddd; 
-                        padding: 8px; 
-                        text-align: left; 
-                    }}
-                    th {{ 
-                        background-color: #f5f5f5; 
-                        width: 30%;
-                    }}
-                    h1, h2 {{ 
-                        color: #333; 
-                        margin-top: 20px;
-                    }}
-                    .header {{ 
-                        text-align: center; 
-                        margin-bottom: 30px; 
-                        padding: 20px;
-                        background-color: #f8f9fa;
-                        border-radius: 5px;
-                    }}
-                    .section {{ 
-                        margin: 20px 0; 
-                        padding: 15px;
-                        border: 1px solid #dee2e6;
-                        border-radius: 5px;
-                        background-color: white;
-                    }}
-                    img {{
-                        max-width: 100%;
-                        height: auto;
-                        margin: 10px 0;
-                        border-radius: 5px;
-                        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                    }}
-                    .image-container {{
-                        text-align: center;
-                        margin: 20px 0;
-                    }}
-                </style>
-            </head>
-            <body>
-                {html_content}
-            </body>
-            </html>
-            """
+            # Los estilos base van aparte, ya parseados en el pool de procesos
+            html_content = wrap_document(html_content)
             
-            # Generar PDF
-            pdf = HTML(string=html_content).write_pdf()
+            # Generar PDF en el pool de procesos
+            pdf = get_render_pool().render(html_content, REPORT)
             return pdf
 
         except Exception as e:
             logger.error(f"Error generating preview PDF: {str(e)}")
             raise 
 
-    def generate_pdf_from_template(self, template_content: str, data: dict) -> bytes:
-        """Genera un PDF a partir de una plantilla y datos"""
+    def build_template_data(self, vehicle_data: dict, data: dict) -> dict:
+        """Contexto de la plantilla para los datos de ``crud.get_vehicle_data``"""
+        return {
+            "Vehículo": vehicle_data.get("vehicle", {}),
+            "Propietario": vehicle_data.get("current_owner", {}),
+            "SOAT": vehicle_data.get("soat", {}),
+            "RTM": vehicle_data.get("rtm", {}),
+            "Evento": vehicle_data.get("latest_event", {}),
+            "Sistema": {
+                "fecha_generacion": datetime.now().strftime("%Y-%m-%d"),
+                "hora_generacion": datetime.now().strftime("%H:%M:%S"),
+                "usuario_generador": "Sistema"
+            },
+            "image1_base64": data.get("image1_base64", ""),
+            "image2_base64": data.get("image2_base64", "")
+        }
+
+    def generate_report(self, db: Session, template_id: int, plate: str, output_path: str, data: dict = None) -> bool:
+        """Genera el reporte de una placa en ``output_path``.
+
+        Usa el caché de PDFs: devuelve True si el PDF ya existía y solo se
+        copió. Lanza ``LookupError`` si no existe la plantilla o la placa.
+        """
+        versioned = get_template_cache().get_versioned(db, template_id)
+        if versioned is None:
+            raise LookupError(f"Plantilla {template_id} no encontrada")
+        vehicle_data = crud.get_vehicle_data(db, plate)
+        if not vehicle_data:
+            raise LookupError(f"No se encontraron datos para la placa {plate}")
+
+        template, version = versioned
+        template_data = self.build_template_data(vehicle_data, data or {})
+        pdf_cache = get_pdf_cache()
+        key = content_key(template_id, version, REPORT, template_data, template)
+        cached_content = pdf_cache.fetch(db, key)
+        if cached_content is not None:
+            with open(output_path, "wb") as f:
+                f.write(cached_content)
+            return True
+
+        pdf_content = get_render_pool().render(self.render_report_html(template, template_data), REPORT)
+        try:
+            cached_path = pdf_cache.store(db, key, pdf_content, template_id, vehicle_data["vehicle"]["id"])
+            shutil.copyfile(cached_path, output_path)
+        except Exception as e:
+            logger.error(f"Error guardando el PDF en caché: {str(e)}")
+            db.rollback()
+            with open(output_path, "wb") as f:
+                f.write(pdf_content)
+        return False
+
+    def render_report_html(self, template_content: Union[str, Template], data: dict) -> str:
+        """Renderiza la plantilla con los datos; los estilos se aplican con ``REPORT``"""
+        if not template_content:
+            logger.error("El contenido de la plantilla está vacío")
+            raise ValueError("El contenido de la plantilla no puede estar vacío")
+
+        logger.info("Obteniendo template de Jinja2...")
+        # Plantilla ya compilada o compilada una sola vez con el caché
+        template = self._compiled(template_content)
+        
+        logger.info("Renderizando HTML...")
+        # Renderizar el HTML
+        try:
+            html_content = template.render(**data)
+        except Exception as template_error:
+            logger.error(f"Error renderizando template: {str(template_error)}")
+            logger.error(f"Datos proporcionados: {json.dumps(data, default=str)}")
+            logger.error(traceback.format_exc())
+            raise ValueError(f"Error renderizando template: {str(template_error)}")
+        
+        logger.info("Armando documento HTML...")
+        # Los estilos base van aparte, ya parseados en el pool de procesos
+        html_content = wrap_document(html_content)
+        
+        return html_content
+
+    def generate_pdf_from_template(self, template_content: Union[str, Template], data: dict) -> bytes:
+        """Genera un PDF a partir de una plantilla (texto o ya compilada) y datos"""
         try:
             logger.info("Iniciando generación de PDF...")
-            if not template_content:
-                logger.error("El contenido de la plantilla está vacío")
-                raise ValueError("El contenido de la plantilla no puede estar vacío")
+            html_content = self.render_report_html(template_content, data)
 
-            logger.info("Creando template de Jinja2...")
-            # Crear el template de Jinja2
-            template = Template(template_content)
-            
-            logger.info("Renderizando HTML...")
-            # Renderizar el HTML
-            try:
-                html_content = template.render(**data)
-            except Exception as template_error:
-                logger.error(f"Error renderizando template: {str(template_error)}")
-                logger.error(f"Datos proporcionados: {json.dumps(data, default=str)}")
-                logger.error(traceback.format_exc())
-                raise ValueError(f"Error renderizando template: {str(template_error)}")
-            
-            logger.info("Agregando estilos CSS...")
-            # Agregar estilos CSS
-            html_content = f"""
-            <html>
-                <head>
-                    <meta charset="UTF-8">
-                    <style>
-                        body {{ 
-                            font-family: Arial, sans-serif; 
-                            margin: 20px; 
-                            line-height: 1.6;
-                        }}
-                        table {{ 
-                            width: 100%; 
-                            border-collapse: collapse; 
-                            margin: 10px 0; 
-                        }}
-                        th, td {{ 
-                            border: 1px solid #ddd; 
-                            padding: 8px; 
-                            text-align: left; 
-                        }}
-                        th {{ 
-                            background-color: #f5f5f5; 
-                            width: 30%;
-                        }}
-                        h1, h2 {{ 
-                            color: #333; 
-                            margin-top: 20px;
-                        }}
-                        .header {{ 
-                            text-align: center; 
-                            margin-bottom: 30px; 
-                            padding: 20px;
-                            background-color: #f8f9fa;
-                            border-radius: 5px;
-                        }}
-                        .section {{ 
-                            margin: 20px 0; 
-                            padding: 15px;
-                            border: 1px solid #dee2e6;
-                            border-radius: 5px;
-                            background-color: white;
-                        }}
-                        img {{
-                            max-width: 100%;
-                            height: auto;
-                            margin: 10px 0;
-                            border-radius: 5px;
-                            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                        }}
-                        .image-container {{
-                            text-align: center;
-                            margin: 20px 0;
-                        }}
-                    </style>
-                </head>
-                <body>
-                    {html_content}
-                </body>
-            </html>
-            """
-            
             logger.info("Convirtiendo HTML a PDF...")
-            # Convertir HTML a PDF
+            # Convertir HTML a PDF en el pool de procesos
             try:
-                pdf = HTML(string=html_content).write_pdf()
+                pdf = get_render_pool().render(html_content, REPORT)
                 logger.info("PDF generado exitosamente")
                 return pdf
             except Exception as pdf_error:
@@ -573,9 +534,9 @@ class PdfService:
         if not policies:
             return []
         return [{
-            "numero": policy.no_poliza,
-            "fecha_expedicion": policy.fecha_expedicion.strftime("%d/%m/%Y"),
-            "fecha_vigencia": policy.fecha_vigencia.strftime("%d/%m/%Y"),
-            "aseguradora": policy.aseguradora,
-            "estado": policy.estado
+            "numero": policy.numero_poliza,
+            "fecha_expedicion": self._format_date(policy.fecha_expedicion),
+            "fecha_vigencia": self._format_date(policy.fecha_vigencia),
+            "aseguradora": policy.nombre_aseguradora,
+            "estado": policy.estado_poliza
         } for policy in policies] 
\ No newline at end of file
@@ -0,0 +1,104 @@
+"""Hojas de estilo base de los PDFs.
+
+Antes cada documento llevaba estos estilos en un ``<style>`` dentro del HTML
+y WeasyPrint los volvía a parsear en cada render. Ahora cada proceso del pool
+los parsea una sola vez como ``weasyprint.CSS`` y los pasa con
+``stylesheets=``.
+
+Eso cambia la cascada. WeasyPrint trata las hojas de ``stylesheets=`` como
+hojas de usuario, y el ``<style>`` en línea era del autor, igual que los
+estilos de las plantillas:
+
+- Cualquier regla de la plantilla gana sobre cualquier regla base, sin
+  importar la especificidad. Antes un selector base más específico (p. ej.
+  ``.header`` o ``th``) ganaba sobre uno menos específico de la plantilla
+  (p. ej. ``div`` o ``*``); ahora gana el de la plantilla.
+- Con ``!important`` es al revés: una regla base ``!important`` gana sobre
+  una ``!important`` de la plantilla. Las hojas base no usan ``!important``.
+
+``benchmark_pdf_styles.py`` compara el texto, la posición y los estilos
+calculados de cada caja de ``templates/report.html`` entre ambos caminos, para
+que una diferencia de cascada no pase inadvertida.
+"""
+
+# generate_pdf
+BASIC = "basic"
+# generate_preview_pdf y generate_pdf_from_template
+REPORT = "report"
+
+STYLESHEETS = {
+    BASIC: """
+        body { font-family: Arial, sans-serif; }
+        table { width: 100%; border-collapse: collapse; margin: 10px 0; }
+        th, td { border: 1px solid #ddd; padding: 8px; text-align: left; }
+        th { background-color: #f5f5f5; }
+        img { max-width: 100%; height: auto; }
+        .header { text-align: center; margin-bottom: 20px; }
+        .footer { text-align: center; margin-top: 20px; font-size: 12px; }
+    """,
+    REPORT: """
+        body {
+            font-family: Arial, sans-serif;
+            margin: 20px;
+            line-height: 1.6;
+        }
+        table {
+            width: 100%;
+            border-collapse: collapse;
+            margin: 10px 0;
+        }
+        th, td {
+            border: 1px solid #ddd;
+            padding: 8px;
+            text-align: left;
+        }
+        th {
+            background-color: #f5f5f5;
+            width: 30%;
+        }
+        h1, h2 {
+            color: #333;
+            margin-top: 20px;
+        }
+        .header {
+            text-align: center;
+            margin-bottom: 30px;
+            padding: 20px;
+            background-color: #f8f9fa;
+            border-radius: 5px;
+        }
+        .section {
+            margin: 20px 0;
+            padding: 15px;
+            border: 1px solid #dee2e6;
+            border-radius: 5px;
+            background-color: white;
+        }
+        img {
+            max-width: 100%;
+            height: auto;
+            margin: 10px 0;
+            border-radius: 5px;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+        }
+        .image-container {
+            text-align: center;
+            margin: 20px 0;
+        }
+    """
+}
+
+
+def wrap_document(body: str) -> str:
+    """Documento HTML mínimo alrededor del contenido renderizado."""
+    return f"""
+    <html>
+        <head>
+            <meta charset="UTF-8">
+        </head>
+        <body>
+            {body}
+        </body>
+    </html>
+    """
+
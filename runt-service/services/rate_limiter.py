@@ -0,0 +1,114 @@
+"""Limitador token-bucket adaptativo para las consultas al RUNT.
+
+La tasa arranca en ``RUNT_QPS`` con ráfagas de hasta ``RUNT_BURST`` consultas.
+Sube de forma aditiva con cada respuesta correcta (hasta ``RUNT_MAX_QPS``) y
+baja de forma multiplicativa ante 429, 5xx o errores de red (hasta
+``RUNT_MIN_QPS``), respetando ``Retry-After`` cuando el gateway lo envía.
+Así el caudal sigue lo que el gateway realmente admite (AIMD).
+
+El límite es por proceso: con varios workers, la tasa total es la suma.
+"""
+import asyncio
+import os
+import threading
+import time
+from typing import Optional
+
+RUNT_QPS = float(os.getenv("RUNT_QPS", "5"))
+RUNT_BURST = int(os.getenv("RUNT_BURST", "10"))
+RUNT_MIN_QPS = float(os.getenv("RUNT_MIN_QPS", "0.5"))
+RUNT_MAX_QPS = float(os.getenv("RUNT_MAX_QPS", "20"))
+# Incremento de la tasa por respuesta correcta y factor de reducción ante errores
+RUNT_QPS_INCREASE = float(os.getenv("RUNT_QPS_INCREASE", "0.1"))
+RUNT_QPS_BACKOFF = float(os.getenv("RUNT_QPS_BACKOFF", "0.5"))
+
+
+class AdaptiveRateLimiter:
+    def __init__(
+        self,
+        qps: float = RUNT_QPS,
+        burst: int = RUNT_BURST,
+        min_qps: float = RUNT_MIN_QPS,
+        max_qps: float = RUNT_MAX_QPS,
+        increase: float = RUNT_QPS_INCREASE,
+        backoff: float = RUNT_QPS_BACKOFF
+    ):
+        self.rate = qps
+        self.burst = max(1, burst)
+        self.min_qps = min_qps
+        self.max_qps = max(max_qps, qps)
+        self.increase = increase
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._stats = {"acquired": 0, "throttled": 0, "waited": 0.0}
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _reserve(self) -> float:
+        """Toma un token si hay; si no, devuelve cuántos segundos esperar."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now >= self._paused_until and self._tokens >= 1:
+                self._tokens -= 1
+                self._stats["acquired"] += 1
+                return 0.0
+            wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            self._stats["waited"] += wait
+            return wait
+
+    def acquire(self):
+        """Bloquea hasta obtener un token."""
+        while True:
+            wait = self._reserve()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """Igual que ``acquire`` pero sin bloquear el event loop."""
+        while True:
+            wait = self._reserve()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_qps, self.rate + self.increase)
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        """Reduce la tasa ante 429/5xx; una sola reducción por intervalo de reposición."""
+        with self._lock:
+            now = time.monotonic()
+            self._stats["throttled"] += 1
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            # Las respuestas de una misma ráfaga no reducen la tasa varias veces
+            if now - self._last_decrease >= 1 / self.rate:
+                self.rate = max(self.min_qps, self.rate * self.backoff)
+                self._tokens = min(self._tokens, 1.0)
+                self._last_decrease = now
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "qps": round(self.rate, 2), "waited": round(self._stats["waited"], 2)}
+
+
+_limiter: Optional[AdaptiveRateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> AdaptiveRateLimiter:
+    """Limitador compartido por todas las consultas del proceso."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = AdaptiveRateLimiter()
+        return _limiter
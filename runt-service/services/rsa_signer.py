@@ -0,0 +1,67 @@
+"""Firma SHA1withRSA en el mismo proceso, equivalente a ``sign.js``.
+
+``sign.js`` firma con jsrsasign (``KJUR.crypto.Signature`` SHA1withRSA sobre
+el texto en UTF-8) y devuelve la firma en base64. PKCS#1 v1.5 es
+determinista, así que la misma llave y los mismos datos producen exactamente
+los mismos bytes; aquí se hace con pycryptodome sin lanzar Node.js, cargando
+la llave una sola vez (se recarga si el archivo cambia).
+"""
+import base64
+import os
+import threading
+from typing import Dict, Optional
+
+from Crypto.Hash import SHA1
+from Crypto.PublicKey import RSA
+from Crypto.Signature import pkcs1_15
+
+PRIVATE_KEY_PATH = os.getenv("PRIVATE_KEY_PATH", "claveprivada.pkcs8.pem")
+
+
+class RsaSigner:
+    def __init__(self, key_path: str = PRIVATE_KEY_PATH):
+        self.key_path = key_path
+        self._lock = threading.Lock()
+        self._signer = None
+        self._key = None
+        self._mtime: Optional[int] = None
+
+    def _load(self):
+        mtime = os.stat(self.key_path).st_mtime_ns
+        if self._signer is not None and mtime == self._mtime:
+            return self._signer
+        with self._lock:
+            if self._signer is None or mtime != self._mtime:
+                with open(self.key_path, "r") as f:
+                    self._key = RSA.import_key(f.read())
+                self._signer = pkcs1_15.new(self._key)
+                self._mtime = mtime
+        return self._signer
+
+    def sign(self, data: str) -> str:
+        """Firma ``data`` y devuelve la firma en base64 (igual que ``sign.js``)."""
+        digest = SHA1.new(data.encode("utf-8"))
+        return base64.b64encode(self._load().sign(digest)).decode("ascii")
+
+    def verify(self, data: str, signature_base64: str) -> bool:
+        self._load()
+        try:
+            pkcs1_15.new(self._key.publickey()).verify(
+                SHA1.new(data.encode("utf-8")), base64.b64decode(signature_base64)
+            )
+            return True
+        except (ValueError, TypeError):
+            return False
+
+
+_signers: Dict[str, RsaSigner] = {}
+_signers_lock = threading.Lock()
+
+
+def get_signer(key_path: str = PRIVATE_KEY_PATH) -> RsaSigner:
+    """Devuelve el firmador compartido para una llave."""
+    with _signers_lock:
+        signer = _signers.get(key_path)
+        if signer is None:
+            signer = _signers[key_path] = RsaSigner(key_path)
+        return signer
@@ -0,0 +1,225 @@
+"""Caché de lectura de las consultas de vehículos al RUNT.
+
+Las mismas placas se consultan una y otra vez (reincidentes, cada evento y
+cada PDF). Antes de ir al gateway se busca la placa en:
+
+1. Un LRU en memoria (``RUNT_CACHE_SIZE`` placas).
+2. ``vehicle_info.vehicle_data``, compartido entre workers y réplicas.
+
+Una respuesta es fresca durante ``RUNT_CACHE_TTL`` segundos. Si
+``RUNT_CACHE_STALE_TTL`` es mayor que cero, durante ese tiempo adicional se
+sirve la respuesta vencida (stale-while-revalidate) y se refresca en segundo
+plano; con 0 una respuesta vencida cuenta como fallo. Solo se guardan
+consultas correctas, en lote con ``crud.save_runt_vehicles`` (vehículo,
+propietarios, SOAT y RTM), para que los PDFs encuentren los datos.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+import crud
+
+RUNT_CACHE_TTL = int(os.getenv("RUNT_CACHE_TTL", "86400"))
+RUNT_CACHE_STALE_TTL = int(os.getenv("RUNT_CACHE_STALE_TTL", "604800"))
+RUNT_CACHE_SIZE = int(os.getenv("RUNT_CACHE_SIZE", "5000"))
+RUNT_CACHE_REVALIDATE_WORKERS = int(os.getenv("RUNT_CACHE_REVALIDATE_WORKERS", "2"))
+
+FRESH = "fresh"
+STALE = "stale"
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(plate: str) -> str:
+    return plate.strip().upper()
+
+
+@dataclass
+class CachedVehicle:
+    data: dict
+    stored_at: float
+
+    def age(self) -> float:
+        return time.time() - self.stored_at
+
+
+class RuntCache:
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        ttl: int = RUNT_CACHE_TTL,
+        stale_ttl: int = RUNT_CACHE_STALE_TTL,
+        max_entries: int = RUNT_CACHE_SIZE
+    ):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, CachedVehicle]" = OrderedDict()
+        self._revalidating = set()
+        self._pool = None
+        self._stats = {
+            "hits": 0, "stale_hits": 0, "db_hits": 0, "misses": 0,
+            "stores": 0, "revalidations": 0
+        }
+
+    def _state(self, cached: CachedVehicle) -> Optional[str]:
+        age = cached.age()
+        if age < self.ttl:
+            return FRESH
+        if age < self.ttl + self.stale_ttl:
+            return STALE
+        return None
+
+    def _remember(self, key: str, cached: CachedVehicle):
+        """Guarda en el LRU; se llama con el lock tomado."""
+        self._entries[key] = cached
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def lookup(self, plates: Iterable[str]) -> Dict[str, Tuple[dict, str]]:
+        """Devuelve ``placa -> (entrada, estado)`` de las placas en caché.
+
+        La entrada tiene el mismo formato que ``vehicle_entry`` más el campo
+        ``cache`` (``fresh`` o ``stale``). Las placas que falten se consultan
+        juntas en la base.
+        """
+        found: Dict[str, Tuple[CachedVehicle, str]] = {}
+        missing: Dict[str, str] = {}
+        with self._lock:
+            for plate in plates:
+                key = cache_key(plate)
+                cached = self._entries.get(key)
+                state = self._state(cached) if cached else None
+                if state:
+                    self._entries.move_to_end(key)
+                    found[plate] = (cached, state)
+                else:
+                    missing.setdefault(key, plate)
+
+        if missing and self.session_factory is not None:
+            db = self.session_factory()
+            try:
+                rows = crud.get_runt_vehicles(db, list(missing))
+            except Exception as e:
+                logger.error(f"Error leyendo el caché RUNT de la base: {str(e)}")
+                rows = {}
+            finally:
+                db.close()
+            with self._lock:
+                for key, (data, updated_at) in rows.items():
+                    cached = CachedVehicle(data, updated_at.timestamp() if updated_at else 0.0)
+                    state = self._state(cached)
+                    if state:
+                        self._remember(key, cached)
+                        self._stats["db_hits"] += 1
+                        found[missing[key]] = (cached, state)
+
+        result = {}
+        with self._lock:
+            for plate in plates:
+                if plate in found:
+                    cached, state = found[plate]
+                    self._stats["hits" if state == FRESH else "stale_hits"] += 1
+                    result[plate] = (
+                        {"plate": plate, "success": True, "data": cached.data, "cache": state},
+                        state
+                    )
+                else:
+                    self._stats["misses"] += 1
+        return result
+
+    def store(self, entries: List[dict]):
+        """Guarda las consultas correctas en memoria y en ``vehicle_info``."""
+        vehicles = {
+            cache_key(entry["plate"]): entry["data"]
+            for entry in entries
+            if entry.get("success") and isinstance(entry.get("data"), dict) and entry["data"]
+        }
+        if not vehicles:
+            return
+        now = time.time()
+        with self._lock:
+            for key, data in vehicles.items():
+                self._remember(key, CachedVehicle(data, now))
+            self._stats["stores"] += len(vehicles)
+        if self.session_factory is None:
+            return
+        db = self.session_factory()
+        try:
+            crud.save_runt_vehicles(db, vehicles)
+        except Exception as e:
+            logger.error(f"Error guardando el caché RUNT en la base: {str(e)}")
+        finally:
+            db.close()
+
+    def claim_revalidation(self, plates: Iterable[str]) -> List[str]:
+        """Reserva las placas vencidas que nadie está refrescando todavía."""
+        claimed = []
+        with self._lock:
+            for plate in plates:
+                key = cache_key(plate)
+                if key not in self._revalidating:
+                    self._revalidating.add(key)
+                    claimed.append(plate)
+            self._stats["revalidations"] += len(claimed)
+        return claimed
+
+    def release_revalidation(self, plates: Iterable[str]):
+        with self._lock:
+            for plate in plates:
+                self._revalidating.discard(cache_key(plate))
+
+    def revalidate(self, plates: List[str], fetch: Callable[[str], dict]):
+        """Refresca en segundo plano las placas vencidas con ``fetch(placa)``."""
+        claimed = self.claim_revalidation(plates)
+        if not claimed:
+            return
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=max(1, RUNT_CACHE_REVALIDATE_WORKERS),
+                    thread_name_prefix="runt-revalidate"
+                )
+        self._pool.submit(self._revalidate, claimed, fetch)
+
+    def _revalidate(self, plates: List[str], fetch: Callable[[str], dict]):
+        try:
+            self.store([fetch(plate) for plate in plates])
+        except Exception as e:
+            logger.error(f"Error refrescando el caché RUNT: {str(e)}")
+        finally:
+            self.release_revalidation(plates)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = sum(self._stats[k] for k in ("hits", "stale_hits", "misses"))
+            served = self._stats["hits"] + self._stats["stale_hits"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "hit_ratio": round(served / lookups, 3) if lookups else None
+            }
+
+
+_cache: Optional[RuntCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_runt_cache() -> RuntCache:
+    """Caché compartido por todo el proceso."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            from database import SessionLocal
+            _cache = RuntCache(session_factory=SessionLocal)
+        return _cache
@@ -0,0 +1,179 @@
+"""Transporte HTTP hacia el gateway RUNT.
+
+Todas las llamadas al RUNT (generarLlave, validarLlave, consulta/vehiculos)
+pasan por una ``requests.Session`` compartida con pool de conexiones
+keep-alive y timeouts, en lugar de lanzar ``curl`` por cada petición. Las
+respuestas se devuelven como ``RuntResponse`` (código, headers, cuerpo y
+error de red) sin tener que separar headers y cuerpo a mano.
+
+``AsyncRuntTransport`` ofrece lo mismo sobre ``httpx.AsyncClient`` para los
+endpoints asíncronos.
+"""
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+RUNT_GATEWAY_URL = os.getenv(
+    "RUNT_GATEWAY_URL", "http://10.1.0.4:8080/servicios/runt/api/consultaAseguradora"
+)
+RUNT_FORWARDED_FOR = os.getenv("RUNT_FORWARDED_FOR", "201.184.19.178")
+RUNT_CONNECT_TIMEOUT = float(os.getenv("RUNT_CONNECT_TIMEOUT", "5"))
+RUNT_READ_TIMEOUT = float(os.getenv("RUNT_READ_TIMEOUT", "30"))
+RUNT_POOL_SIZE = int(os.getenv("RUNT_POOL_SIZE", "20"))
+
+GENERATE_KEY_PATH = "admin/generarLlave"
+VALIDATE_KEY_PATH = "admin/validarLlave"
+QUERY_VEHICLES_PATH = "consulta/vehiculos"
+
+
+@dataclass
+class RuntResponse:
+    url: str
+    status_code: int = 0
+    headers: Dict[str, str] = field(default_factory=dict)
+    text: str = ""
+    elapsed: float = 0.0
+    # Error de red (conexión, timeout); None si hubo respuesta HTTP
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and 200 <= self.status_code < 300
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "status_code": self.status_code,
+            "headers": self.headers,
+            "response": self.text,
+            "elapsed": round(self.elapsed, 3),
+            "error": self.error
+        }
+
+
+class RuntTransport:
+    def __init__(
+        self,
+        base_url: str = RUNT_GATEWAY_URL,
+        forwarded_for: str = RUNT_FORWARDED_FOR,
+        connect_timeout: float = RUNT_CONNECT_TIMEOUT,
+        read_timeout: float = RUNT_READ_TIMEOUT,
+        pool_size: int = RUNT_POOL_SIZE
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.forwarded_for = forwarded_for
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        # Sin reintentos automáticos: las consultas firmadas no son idempotentes
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def post(self, path: str, usuario: str, firma: str, body: str,
+             extra_headers: Optional[Dict[str, str]] = None) -> RuntResponse:
+        """Envía ``body`` (JSON ya serializado y firmado) al endpoint ``path``."""
+        url = self.url(path)
+        headers = {
+            "Content-Type": "application/json",
+            "X-Runt-Id-Usuario": usuario,
+            "X-Runt-Firma": firma,
+            "X-Forwarded-For": self.forwarded_for
+        }
+        if extra_headers:
+            headers.update(extra_headers)
+        start = time.perf_counter()
+        try:
+            # Se envían los bytes exactos que se firmaron
+            response = self.session.post(
+                url, data=body.encode("utf-8"), headers=headers, timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            return RuntResponse(url=url, elapsed=time.perf_counter() - start,
+                                error=f"{type(e).__name__}: {e}")
+        return RuntResponse(
+            url=url,
+            status_code=response.status_code,
+            headers=dict(response.headers),
+            text=response.text.strip(),
+            elapsed=time.perf_counter() - start
+        )
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncRuntTransport:
+    """Versión asíncrona de ``RuntTransport`` sobre ``httpx.AsyncClient``."""
+
+    def __init__(
+        self,
+        base_url: str = RUNT_GATEWAY_URL,
+        forwarded_for: str = RUNT_FORWARDED_FOR,
+        connect_timeout: float = RUNT_CONNECT_TIMEOUT,
+        read_timeout: float = RUNT_READ_TIMEOUT,
+        pool_size: int = RUNT_POOL_SIZE
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.forwarded_for = forwarded_for
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            follow_redirects=True
+        )
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    async def post(self, path: str, usuario: str, firma: str, body: str,
+                   extra_headers: Optional[Dict[str, str]] = None) -> RuntResponse:
+        url = self.url(path)
+        headers = {
+            "Content-Type": "application/json",
+            "X-Runt-Id-Usuario": usuario,
+            "X-Runt-Firma": firma,
+            "X-Forwarded-For": self.forwarded_for
+        }
+        if extra_headers:
+            headers.update(extra_headers)
+        start = time.perf_counter()
+        try:
+            response = await self.client.post(url, content=body.encode("utf-8"), headers=headers)
+        except httpx.HTTPError as e:
+            return RuntResponse(url=url, elapsed=time.perf_counter() - start,
+                                error=f"{type(e).__name__}: {e}")
+        return RuntResponse(
+            url=url,
+            status_code=response.status_code,
+            headers=dict(response.headers),
+            text=response.text.strip(),
+            elapsed=time.perf_counter() - start
+        )
+
+    async def close(self):
+        await self.client.aclose()
+
+
+_transport: Optional[RuntTransport] = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> RuntTransport:
+    """Transporte compartido por todo el proceso (el pool de conexiones se reutiliza)."""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = RuntTransport()
+        return _transport
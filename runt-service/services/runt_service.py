@@ -1,4 +1,4 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import requests
 from sqlalchemy.orm import Session
 import crud
@@ -16,6 +16,124 @@ import time
 import hmac
 import hashlib
 import logging
+from services.rsa_signer import PRIVATE_KEY_PATH, get_signer
+from services.hmac_key_manager import HmacKeyError, get_key_manager, key_rejected
+from services.rate_limiter import get_rate_limiter
+from services.runt_cache import STALE, cache_key, get_runt_cache
+from services.single_flight import get_single_flight
+from concurrent.futures import ThreadPoolExecutor
+from services.runt_http import (
+    QUERY_VEHICLES_PATH,
+    VALIDATE_KEY_PATH,
+    RuntResponse,
+    get_transport
+)
+
+# "native" firma en el proceso; "node" usa sign.js como antes
+RSA_SIGNER = os.getenv("RSA_SIGNER", "native")
+# Consultas de placas simultáneas y reintentos ante 429/5xx/errores de red
+RUNT_QUERY_WORKERS = int(os.getenv("RUNT_QUERY_WORKERS", "8"))
+RUNT_QUERY_RETRIES = int(os.getenv("RUNT_QUERY_RETRIES", "3"))
+
+def _sign_with_node(data: str) -> str:
+    """Firma con el script ``sign.js`` (implementación anterior, RSA_SIGNER=node)."""
+    # Ejecutar el script de Node.js solo con los datos a firmar
+    process = subprocess.Popen(
+        ['node', 'sign.js', data],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+    
+    # Obtener la salida
+    stdout, stderr = process.communicate()
+    
+    if process.returncode != 0:
+        print(f"Error en el script de firma: {stderr.decode()}")
+        raise ValueError("Error al generar la firma")
+    
+    # La firma está en la salida estándar
+    return stdout.decode().strip()
+
+def sign_payload(data: str, key_path: str = PRIVATE_KEY_PATH) -> str:
+    """Firma SHA1withRSA en base64 con el firmador configurado."""
+    if RSA_SIGNER == "node":
+        return _sign_with_node(data)
+    # Firma en el mismo proceso con la llave ya cargada
+    return get_signer(key_path).sign(data)
+
+def retry_after(response: RuntResponse) -> Optional[float]:
+    """Segundos indicados en el header Retry-After, si viene."""
+    value = response.headers.get("Retry-After")
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+def build_vehicle_query(usuario: str, plate: str, llave_hmac: str):
+    """Cuerpo de consulta/vehiculos y su firma HMAC-SHA256 (base64) con la llave."""
+    # Corregir el formato del body según la documentación del servicio
+    query_body = json.dumps({
+        "tipoConsulta": "PLACA",
+        "noPlaca": plate.upper(),
+        "idUsuario": usuario,
+        "tipoVehiculo": "VEHICULO",  # Cambiado de "AUTOMOVIL" a "VEHICULO"
+        "fecha": datetime.now().strftime("%Y-%m-%d")
+    }, separators=(',', ':'))
+    
+    hmac_firma = hmac.new(
+        base64.b64decode(llave_hmac),
+        query_body.encode('utf-8'),
+        hashlib.sha256
+    ).digest()
+    return query_body, base64.b64encode(hmac_firma).decode('utf-8')
+
+def vehicle_entry(plate: str, response: RuntResponse) -> dict:
+    """Convierte la respuesta del RUNT en la entrada de la placa."""
+    query_response = response.error or response.text
+
+    print(f"Respuesta del servicio RUNT para placa {plate}: {query_response}")
+
+    try:
+        if response.error is None and not "Error" in query_response:
+            response_data = json.loads(query_response)
+
+            # Verificar si la respuesta tiene la estructura esperada
+            if isinstance(response_data, dict):
+                if "vehiculo" in response_data:
+                    return {
+                        "plate": plate,
+                        "success": True,
+                        "data": response_data["vehiculo"]
+                    }
+                elif "vehiculos" in response_data and response_data["vehiculos"]:
+                    return {
+                        "plate": plate,
+                        "success": True,
+                        "data": response_data["vehiculos"][0]
+                    }
+            return {
+                "plate": plate,
+                "success": True,
+                "data": response_data
+            }
+        return {
+            "plate": plate,
+            "success": False,
+            "error": "Error en consulta",
+            "details": query_response,
+            # Permite a api-consumer distinguir un rechazo definitivo (4xx) de uno transitorio
+            "status_code": response.status_code
+        }
+    except Exception as e:
+        print(f"Error procesando respuesta para placa {plate}: {str(e)}")
+        return {
+            "plate": plate,
+            "success": False,
+            "error": str(e),
+            "details": query_response,
+            "status_code": response.status_code
+        }
+
 
 class RuntService:
     def __init__(self, db: Session):
@@ -29,6 +147,11 @@ class RuntService:
         self.client_secret = os.getenv("CLIENT_SECRET", "900133384")
         self.token = None
         self.token_expires_at = None
+        self.transport = get_transport()
+        self.key_manager = get_key_manager(sign_payload)
+        self.rate_limiter = get_rate_limiter()
+        self.cache = get_runt_cache()
+        self.single_flight = get_single_flight()
 
     def get_global_var(self, db: Session, name: str) -> str:
         var = crud.get_global_variable(db, name)
@@ -36,22 +159,7 @@ class RuntService:
 
     def sign_with_rsa(self, db: Session, data: str) -> str:
         try:
-            # Ejecutar el script de Node.js solo con los datos a firmar
-            process = subprocess.Popen(
-                ['node', 'sign.js', data],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-            
-            # Obtener la salida
-            stdout, stderr = process.communicate()
-            
-            if process.returncode != 0:
-                print(f"Error en el script de firma: {stderr.decode()}")
-                raise ValueError("Error al generar la firma")
-            
-            # La firma está en la salida estándar
-            firma_base64 = stdout.decode().strip()
+            firma_base64 = sign_payload(data, self.private_key_path)
             
             print("\nDebug información:")
             print(f"Data a firmar: {data}")
@@ -65,27 +173,7 @@ class RuntService:
 
     def verify_signature(self, data: str, signature_base64: str) -> bool:
         try:
-            # Convertir la firma de base64 a bytes
-            signature = base64.b64decode(signature_base64)
-            
-            # Leer la llave pública (si la tienes)
-            cert_path = "claveprivada.pkcs8.pem"  # o la ruta a tu llave pública
-            with open(cert_path, 'r') as f:
-                key_pem = f.read().strip()
-            
-            # Crear objeto de llave
-            key = RSA.import_key(key_pem)
-            
-            # Crear el hash SHA1 de los datos
-            h = SHA1.new(data.encode('utf-8'))
-            
-            # Verificar la firma
-            try:
-                pkcs1_15.new(key).verify(h, signature)
-                return True
-            except (ValueError, TypeError):
-                return False
-            
+            return get_signer(self.private_key_path).verify(data, signature_base64)
         except Exception as e:
             print(f"Error en verify_signature: {str(e)}")
             return False
@@ -119,51 +207,23 @@ class RuntService:
                     "error": "No se encontró el usuario configurado"
                 }
 
-            # Preparar datos
-            body = json.dumps({"idUsuario": usuario}, separators=(',', ':'))
-            firma = self.sign_with_rsa(db, body)
-
-            # URL del servicio
-            url = "http://10.1.0.4:8080/servicios/runt/api/consultaAseguradora/admin/generarLlave"
-
-            # Headers
-            headers = {
-                'Content-Type': 'application/json',
-                'X-Runt-Id-Usuario': usuario,
-                'X-Runt-Firma': firma,
-                'X-Forwarded-For': '201.184.19.178'
-            }
-
-            # Realizar la petición
-            response = requests.post(url, headers=headers, data=body)
-
-            if response.status_code == 200:
-                llave = response.text.strip()
-                
-                # Actualizar la llave en la base de datos
-                crud.update_global_variable(
-                    db,
-                    "llavehmaccliente",
-                    llave,
-                    "Llave HMAC generada por el servicio"
-                )
-
-                return {
-                    "success": True,
-                    "data": {
-                        "llave": llave,
-                        "mensaje": "Llave HMAC generada y almacenada exitosamente"
-                    }
-                }
-            else:
+            # Generar, validar y compartir la llave con los demás workers
+            try:
+                llave = self.key_manager.renew(db)
+            except HmacKeyError as e:
                 return {
                     "success": False,
                     "error": "Error generando llave HMAC",
-                    "details": {
-                        "status_code": response.status_code,
-                        "response": response.text
-                    }
+                    "details": e.details
+                }
+
+            return {
+                "success": True,
+                "data": {
+                    "llave": llave,
+                    "mensaje": "Llave HMAC generada y almacenada exitosamente"
                 }
+            }
 
         except Exception as e:
             return {
@@ -279,9 +339,6 @@ class RuntService:
             body = json.dumps({"idUsuario": usuario}, separators=(',', ':'))
             firma = self.sign_with_rsa(db, body)
 
-            # URL del servicio de validación
-            url = "http://10.1.0.4:8080/servicios/runt/api/consultaAseguradora/admin/validarLlave"
-
             # Generar HMAC
             timestamp = str(int(time.time()))
             message = f"{usuario}{timestamp}"
@@ -291,18 +348,14 @@ class RuntService:
                 hashlib.sha256
             ).hexdigest()
 
-            # Headers
-            headers = {
-                'Content-Type': 'application/json',
-                'X-Runt-Id-Usuario': usuario,
-                'X-Runt-Firma': firma,
-                'X-Runt-Timestamp': timestamp,
-                'X-Runt-Signature': hmac_signature,
-                'X-Forwarded-For': '201.184.19.178'
-            }
-
             # Realizar la petición
-            response = requests.post(url, headers=headers, data=body)
+            response = self.transport.post(
+                VALIDATE_KEY_PATH, usuario, firma, body,
+                extra_headers={
+                    'X-Runt-Timestamp': timestamp,
+                    'X-Runt-Signature': hmac_signature
+                }
+            )
 
             if response.status_code == 200:
                 return {
@@ -313,10 +366,7 @@ class RuntService:
                 return {
                     "success": False,
                     "error": "Llave HMAC inválida",
-                    "details": {
-                        "status_code": response.status_code,
-                        "response": response.text
-                    }
+                    "details": response.to_dict()
                 }
 
         except Exception as e:
@@ -328,86 +378,52 @@ class RuntService:
     def query_vehicle(self, db: Session, plate: str) -> dict:
         try:
             usuario = self.get_global_var(db, "usuarioAseguradoraCliente")
-            llave_hmac = self.get_global_var(db, "llavehmaccliente")
-            
-            # Primero validar la llave antes de consultar
-            print("\nValidando llave antes de consultar...")
-            validate_result = self.validate_key(db)
-            if not validate_result.get("success"):
-                print("Error al validar llave, intentando regenerar...")
-                # Intentar regenerar y validar la llave
-                key_result = self.generate_key(db)
-                if not key_result.get("success"):
-                    return {
-                        "success": False,
-                        "error": "Error al regenerar llave HMAC",
-                        "details": key_result
-                    }
-                
-                # Obtener la nueva llave
-                llave_hmac = self.get_global_var(db, "llavehmaccliente")
-                
-                # Validar la nueva llave
-                validate_result = self.validate_key(db)
-                if not validate_result.get("success"):
-                    return {
-                        "success": False,
-                        "error": "Error al validar la nueva llave HMAC",
-                        "details": validate_result
-                    }
-            
-            print("Llave validada exitosamente, procediendo con la consulta...")
-            
-            # URL sin /admin/
-            url = "http://10.1.0.4:8080/servicios/runt/api/consultaAseguradora/consulta/vehiculos"
-            
-            # Preparar el body con el formato exacto
-            body_dict = {
-                "tipoConsulta": "PLACA",
-                "noPlaca": plate.upper(),  # Asegurar que la placa esté en mayúsculas
-                "llave": llave_hmac.strip()  # Eliminar espacios en blanco
-            }
             
-            # Convertir a JSON manteniendo el orden de las claves
-            body = json.dumps(body_dict, separators=(',', ':'))
-            
-            # Generar firma
-            firma = self.sign_with_rsa(db, body)
-            
-            # Construir comando curl
-            curl_command = [
-                'curl',
-                '--location',
-                url,
-                '--header', 'Content-Type: application/json',
-                '--header', f'X-Runt-Id-Usuario: {usuario}',
-                '--header', f'X-Runt-Firma: {firma}',
-                '--header', 'X-Forwarded-For: 201.184.19.178',
-                '--data-raw', body,
-                '-i'
-            ]
-            
-            print(f"\nConsultando vehículo con placa {plate}...")
-            print(f"URL: {url}")
-            print(f"Body: {body}")
-            print(f"Headers:")
-            print(f"  X-Runt-Id-Usuario: {usuario}")
-            print(f"  X-Runt-Firma: {firma}")
-            
-            process = subprocess.Popen(
-                curl_command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
+            # Llave HMAC validada y compartida (se negocia solo al expirar)
+            try:
+                llave_hmac = self.key_manager.get_key(db)
+            except HmacKeyError as e:
+                return {
+                    "success": False,
+                    "error": str(e),
+                    "details": e.details
+                }
             
-            stdout, stderr = process.communicate()
-            stdout_output = stdout.decode().strip()
-            stderr_output = stderr.decode().strip()
+            url = self.transport.url(QUERY_VEHICLES_PATH)
             
-            # Separar headers y body
-            response_parts = stdout_output.split('\r\n\r\n')
-            headers = response_parts[0] if response_parts else ''
-            response_body = response_parts[1] if len(response_parts) > 1 else ''
+            for attempt in range(2):
+                # Preparar el body con el formato exacto
+                body_dict = {
+                    "tipoConsulta": "PLACA",
+                    "noPlaca": plate.upper(),  # Asegurar que la placa esté en mayúsculas
+                    "llave": llave_hmac.strip()  # Eliminar espacios en blanco
+                }
+                
+                # Convertir a JSON manteniendo el orden de las claves
+                body = json.dumps(body_dict, separators=(',', ':'))
+                
+                # Generar firma
+                firma = self.sign_with_rsa(db, body)
+                
+                print(f"\nConsultando vehículo con placa {plate}...")
+                print(f"URL: {url}")
+                print(f"Body: {body}")
+                print(f"Headers:")
+                print(f"  X-Runt-Id-Usuario: {usuario}")
+                print(f"  X-Runt-Firma: {firma}")
+                
+                response = self.transport.post(QUERY_VEHICLES_PATH, usuario, firma, body)
+                if attempt == 0 and key_rejected(response):
+                    # El RUNT descartó la llave: renovarla una vez y reintentar
+                    print("Llave HMAC rechazada, renovando...")
+                    try:
+                        llave_hmac = self.key_manager.invalidate(llave_hmac, db)
+                        continue
+                    except HmacKeyError as e:
+                        print(f"Error renovando llave HMAC: {str(e)}")
+                break
+            headers = response.headers
+            response_body = response.text
             
             print("\nRespuesta completa:")
             print(f"Headers: {headers}")
@@ -421,12 +437,12 @@ class RuntService:
                         "error": "La llave no está validada",
                         "details": {
                             "message": response_body,
-                            "validation_status": validate_result
+                            "key_status": self.key_manager.stats()
                         }
                     }
                 
                 # Intentar parsear la respuesta como JSON
-                if response_body and not "Error" in response_body:
+                if response.error is None and response_body and not "Error" in response_body:
                     try:
                         response_data = json.loads(response_body)
                         return {
@@ -446,9 +462,7 @@ class RuntService:
                         "success": False,
                         "error": "Error en la respuesta del servidor",
                         "details": {
-                            "response": response_body,
-                            "full_response": stdout_output,
-                            "stderr": stderr_output,
+                            **response.to_dict(),
                             "request": {
                                 "url": url,
                                 "method": "POST",
@@ -466,11 +480,7 @@ class RuntService:
                 return {
                     "success": False,
                     "error": f"Error al procesar la respuesta: {str(e)}",
-                    "details": {
-                        "response": response_body,
-                        "full_response": stdout_output,
-                        "stderr": stderr_output
-                    }
+                    "details": response.to_dict()
                 }
             
         except Exception as e:
@@ -480,183 +490,86 @@ class RuntService:
                 "error": str(e)
             }
 
+    def _query_plate(self, usuario: str, plate: str, llave_hmac: str) -> RuntResponse:
+        """Consulta una placa firmando el cuerpo con HMAC-SHA256 de la llave."""
+        query_body, hmac_firma_base64 = build_vehicle_query(usuario, plate, llave_hmac)
+        return self.transport.post(QUERY_VEHICLES_PATH, usuario, hmac_firma_base64, query_body)
+
+    def _query_plate_limited(self, usuario: str, plate: str, llave_hmac: str) -> RuntResponse:
+        """Consulta una placa respetando el limitador y reintentando 429/5xx.
+
+        Corre en los hilos del executor: no usa la sesión de la petición.
+        """
+        print(f"\nConsultando vehículo con placa {plate}...")
+        key_renewed = False
+        for attempt in range(RUNT_QUERY_RETRIES + 1):
+            self.rate_limiter.acquire()
+            # Otra consulta pudo haber renovado la llave mientras tanto
+            llave_hmac = self.key_manager.current() or llave_hmac
+            response = self._query_plate(usuario, plate, llave_hmac)
+            if key_rejected(response) and not key_renewed:
+                # El RUNT descartó la llave: renovarla una vez y reintentar
+                print("Llave HMAC rechazada, renovando...")
+                key_renewed = True
+                try:
+                    llave_hmac = self.key_manager.invalidate(llave_hmac)
+                    continue
+                except HmacKeyError as e:
+                    print(f"Error renovando llave HMAC: {str(e)}")
+                    return response
+            if response.error is not None or response.status_code == 429 or response.status_code >= 500:
+                self.rate_limiter.on_throttle(retry_after(response))
+                continue
+            self.rate_limiter.on_success()
+            return response
+        return response
+
+    def _fetch_entry(self, usuario: str, plate: str, llave_hmac: str) -> dict:
+        """Consulta una placa; las consultas simultáneas de la misma placa comparten resultado."""
+        entry, _ = self.single_flight.do(
+            cache_key(plate),
+            lambda: vehicle_entry(plate, self._query_plate_limited(usuario, plate, llave_hmac))
+        )
+        return {**entry, "plate": plate}
+
     def process_runt_sequence(self, db: Session, plates: list) -> dict:
         try:
             print(f"\nIniciando consulta para {len(plates)} placas")
-            usuario = self.get_global_var(db, "usuarioAseguradoraCliente")
-            
-            # Paso 1: Generar llave HMAC (solo una vez para todas las consultas)
-            print("\nPaso 1: Generando llave HMAC...")
-            gen_body = json.dumps({"idUsuario": usuario}, separators=(',', ':'))
-            gen_firma = self.sign_with_rsa(db, gen_body)
-            
-            gen_command = [
-                'curl',
-                '--location',
-                'http://10.1.0.4:8080/servicios/runt/api/consultaAseguradora/admin/generarLlave',
-                '--header', 'Content-Type: application/json',
-                '--header', f'X-Runt-Id-Usuario: {usuario}',
-                '--header', f'X-Runt-Firma: {gen_firma}',
-                '--header', 'X-Forwarded-For: 201.184.19.178',
-                '--data', gen_body
-            ]
-            
-            gen_process = subprocess.Popen(
-                gen_command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-            
-            gen_stdout, _ = gen_process.communicate()
-            llave_hmac = gen_stdout.decode().strip()
-            
-            if not llave_hmac or "Error" in llave_hmac:
-                return {
-                    "success": False,
-                    "error": "Error al generar llave HMAC",
-                    "details": {"response": llave_hmac}
-                }
-            
-            print(f"Llave HMAC generada: {llave_hmac}")
-            
-            # Paso 2: Validar llave
-            print("\nPaso 2: Validando llave HMAC...")
-            val_body = json.dumps({
-                "idUsuario": usuario,
-                "llave": llave_hmac
-            }, separators=(',', ':'))
-            
-            val_firma = self.sign_with_rsa(db, val_body)
-            
-            val_command = [
-                'curl',
-                '--location',
-                'http://10.1.0.4:8080/servicios/runt/api/consultaAseguradora/admin/validarLlave',
-                '--header', 'Content-Type: application/json',
-                '--header', f'X-Runt-Id-Usuario: {usuario}',
-                '--header', f'X-Runt-Firma: {val_firma}',
-                '--header', 'X-Forwarded-For: 201.184.19.178',
-                '--data', val_body
-            ]
-            
-            val_process = subprocess.Popen(
-                val_command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-            
-            val_stdout, _ = val_process.communicate()
-            val_response = val_stdout.decode().strip()
-            
-            if "Error" in val_response:
-                return {
-                    "success": False,
-                    "error": "Error al validar llave HMAC",
-                    "details": {"response": val_response}
-                }
-            
-            print("Llave validada exitosamente")
-            
-            # Paso 3: Consultar vehículos
-            vehicles_info = []
-            
-            for plate in plates:
-                print(f"\nConsultando vehículo con placa {plate}...")
-                
-                # Corregir el formato del body según la documentación del servicio
-                query_body = json.dumps({
-                    "tipoConsulta": "PLACA",
-                    "noPlaca": plate.upper(),
-                    "idUsuario": usuario,
-                    "tipoVehiculo": "VEHICULO",  # Cambiado de "AUTOMOVIL" a "VEHICULO"
-                    "fecha": datetime.now().strftime("%Y-%m-%d")
-                }, separators=(',', ':'))
-                
-                # Generar firma HMAC para la consulta
-                import base64
-                import hmac
-                import hashlib
-                
-                llave_hmac_bytes = base64.b64decode(llave_hmac)
-                hmac_firma = hmac.new(
-                    llave_hmac_bytes,
-                    query_body.encode('utf-8'),
-                    hashlib.sha256
-                ).digest()
-                
-                hmac_firma_base64 = base64.b64encode(hmac_firma).decode('utf-8')
-                
-                query_command = [
-                    'curl',
-                    '--location',
-                    'http://10.1.0.4:8080/servicios/runt/api/consultaAseguradora/consulta/vehiculos',
-                    '--header', 'Content-Type: application/json',
-                    '--header', f'X-Runt-Id-Usuario: {usuario}',
-                    '--header', f'X-Runt-Firma: {hmac_firma_base64}',
-                    '--header', 'X-Forwarded-For: 201.184.19.178',
-                    '--data', query_body
-                ]
-                
-                query_process = subprocess.Popen(
-                    query_command,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE
-                )
-                
-                query_stdout, query_stderr = query_process.communicate()
-                query_response = query_stdout.decode().strip()
-                
-                print(f"Respuesta del servicio RUNT para placa {plate}: {query_response}")
+            # Las placas consultadas hace poco no van al gateway
+            cached = self.cache.lookup(plates)
+            pending = [plate for plate in plates if plate not in cached]
+            stale = [plate for plate, (_, state) in cached.items() if state == STALE]
+            results = {plate: entry for plate, (entry, _) in cached.items()}
+
+            if pending or stale:
+                usuario = self.get_global_var(db, "usuarioAseguradoraCliente")
                 
+                # Llave HMAC validada y compartida (se negocia solo al expirar)
                 try:
-                    if not "Error" in query_response:
-                        response_data = json.loads(query_response)
-                        print(f"Datos parseados para placa {plate}: {json.dumps(response_data, indent=2)}")
-                        
-                        # Verificar si la respuesta tiene la estructura esperada
-                        if isinstance(response_data, dict):
-                            if "vehiculo" in response_data:
-                                vehicles_info.append({
-                                    "plate": plate,
-                                    "success": True,
-                                    "data": response_data["vehiculo"]
-                                })
-                            elif "vehiculos" in response_data and response_data["vehiculos"]:
-                                vehicles_info.append({
-                                    "plate": plate,
-                                    "success": True,
-                                    "data": response_data["vehiculos"][0]
-                                })
-                            else:
-                                vehicles_info.append({
-                                    "plate": plate,
-                                    "success": True,
-                                    "data": response_data
-                                })
-                        else:
-                            vehicles_info.append({
-                                "plate": plate,
-                                "success": True,
-                                "data": response_data
-                            })
-                    else:
-                        vehicles_info.append({
-                            "plate": plate,
-                            "success": False,
-                            "error": "Error en consulta",
-                            "details": query_response
-                        })
-                except Exception as e:
-                    print(f"Error procesando respuesta para placa {plate}: {str(e)}")
-                    vehicles_info.append({
-                        "plate": plate,
+                    llave_hmac = self.key_manager.get_key(db)
+                except HmacKeyError as e:
+                    return {
                         "success": False,
                         "error": str(e),
-                        "details": query_response
-                    })
-                
-                # Esperar un momento entre consultas para no sobrecargar el servicio
-                time.sleep(1)
+                        "details": e.details
+                    }
+
+                def fetch(plate: str) -> dict:
+                    return self._fetch_entry(usuario, plate, llave_hmac)
+
+                if stale:
+                    # Se responde con el dato vencido y se refresca en segundo plano
+                    self.cache.revalidate(stale, fetch)
+
+                if pending:
+                    # Consultar vehículos en paralelo; el limitador marca el ritmo
+                    with ThreadPoolExecutor(max_workers=max(1, min(RUNT_QUERY_WORKERS, len(pending)))) as executor:
+                        fetched = list(executor.map(fetch, pending))
+                    self.cache.store(fetched)
+                    results.update(zip(pending, fetched))
+                    print(f"Consultas RUNT: {self.rate_limiter.stats()}")
+            print(f"Caché RUNT: {self.cache.stats()}")
+            vehicles_info = [results[plate] for plate in plates]
             
             return {
                 "success": True,
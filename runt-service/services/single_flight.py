@@ -0,0 +1,88 @@
+"""Coalescencia de consultas simultáneas (single-flight).
+
+Si llegan varias consultas de la misma placa mientras una ya está en curso
+(ráfagas de eventos de la misma cámara, el frontend pidiendo una placa en
+proceso), solo la primera va al RUNT y las demás esperan su resultado.
+
+Los hilos del servicio síncrono y las corrutinas del asíncrono comparten el
+mismo registro: cada vuelo es un ``concurrent.futures.Future``, que los hilos
+esperan con ``result()`` y las corrutinas con ``asyncio.wrap_future``.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, Future] = {}
+        # calls: consultas reales; saved: consultas evitadas por esperar otra
+        self._stats = {"calls": 0, "saved": 0}
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        """Devuelve el vuelo de ``key`` e indica si quien llama debe ejecutarlo."""
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                self._stats["saved"] += 1
+                return future, False
+            future = Future()
+            self._flights[key] = future
+            self._stats["calls"] += 1
+            return future, True
+
+    def _land(self, key: str, future: Future, result=None, error: Optional[BaseException] = None):
+        with self._lock:
+            self._flights.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: str, fn: Callable[[], object]) -> Tuple[object, bool]:
+        """Ejecuta ``fn`` una sola vez por ``key`` entre hilos concurrentes.
+
+        Devuelve ``(resultado, compartido)``.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return future.result(), True
+        try:
+            result = fn()
+        except BaseException as e:
+            self._land(key, future, error=e)
+            raise
+        self._land(key, future, result)
+        return result, False
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[object]]) -> Tuple[object, bool]:
+        """Versión para corrutinas de ``do``."""
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future), True
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._land(key, future, error=e)
+            raise
+        self._land(key, future, result)
+        return result, False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "in_flight": len(self._flights)}
+
+
+_single_flight: Optional[SingleFlight] = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    """Registro compartido por todas las consultas de placas del proceso."""
+    global _single_flight
+    with _single_flight_lock:
+        if _single_flight is None:
+            _single_flight = SingleFlight()
+        return _single_flight
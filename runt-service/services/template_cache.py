@@ -0,0 +1,189 @@
+"""Caché de plantillas Jinja2 compiladas para la generación de PDFs.
+
+Compilar el HTML de una plantilla cuesta más que renderizarla, y antes se
+hacía con ``Template(contenido)`` en cada PDF. Aquí:
+
+- Las plantillas de ``pdf_templates`` se compilan una vez por
+  ``(id, updated_at)`` y se guardan en un LRU (``PDF_TEMPLATE_CACHE_SIZE``).
+- El contenido suelto (vista previa, ``generate_pdf``) se cachea por hash.
+- Un único ``jinja2.Environment`` con ``FileSystemBytecodeCache`` en
+  ``PDF_TEMPLATE_BYTECODE_DIR``: otros workers y reinicios cargan el bytecode
+  sin volver a compilar.
+- ``crud.update_template``/``crud.delete_template`` invalidan la entrada; los
+  demás workers detectan el cambio por ``updated_at``, que se revisa como
+  mucho cada ``PDF_TEMPLATE_RECHECK`` segundos con una consulta que no trae
+  el contenido.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Tuple
+
+from jinja2 import BaseLoader, Environment, FileSystemBytecodeCache, Template, TemplateNotFound
+from sqlalchemy.orm import Session
+
+from models import PdfTemplate
+
+PDF_TEMPLATE_CACHE_SIZE = int(os.getenv("PDF_TEMPLATE_CACHE_SIZE", "100"))
+PDF_TEMPLATE_BYTECODE_DIR = os.getenv("PDF_TEMPLATE_BYTECODE_DIR", "/tmp/pdf-template-bytecode")
+PDF_TEMPLATE_RECHECK = float(os.getenv("PDF_TEMPLATE_RECHECK", "5"))
+
+logger = logging.getLogger(__name__)
+
+
+class _SourceLoader(BaseLoader):
+    """Entrega al Environment el código que se está compilando en ese momento."""
+
+    def __init__(self):
+        self.sources = {}
+
+    def get_source(self, environment, name):
+        if name not in self.sources:
+            raise TemplateNotFound(name)
+        return self.sources[name], None, lambda: True
+
+
+class _CountingEnvironment(Environment):
+    """Environment que cuenta las compilaciones reales (sin bytecode)."""
+    compiles = 0
+
+    def compile(self, *args, **kwargs):
+        self.compiles += 1
+        return super().compile(*args, **kwargs)
+
+
+@dataclass
+class _CachedTemplate:
+    version: Optional[datetime]
+    template: Template
+    checked_at: float
+
+
+class TemplateCache:
+    def __init__(
+        self,
+        bytecode_dir: Optional[str] = PDF_TEMPLATE_BYTECODE_DIR,
+        max_entries: int = PDF_TEMPLATE_CACHE_SIZE,
+        recheck: float = PDF_TEMPLATE_RECHECK
+    ):
+        bytecode_cache = None
+        if bytecode_dir:
+            try:
+                os.makedirs(bytecode_dir, exist_ok=True)
+                bytecode_cache = FileSystemBytecodeCache(bytecode_dir)
+            except OSError as e:
+                logger.warning(f"Sin caché de bytecode de plantillas: {str(e)}")
+        self._loader = _SourceLoader()
+        # cache_size=0: el LRU de este módulo decide qué plantillas se conservan
+        self.environment = _CountingEnvironment(
+            loader=self._loader, bytecode_cache=bytecode_cache, cache_size=0
+        )
+        self.max_entries = max(1, max_entries)
+        self.recheck = recheck
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[object, _CachedTemplate]" = OrderedDict()
+        self._stats = {"hits": 0, "loads": 0, "version_checks": 0, "invalidations": 0}
+
+    def _compile(self, name: str, content: str) -> Template:
+        with self._lock:
+            self._loader.sources[name] = content
+            try:
+                template = self.environment.get_template(name)
+            finally:
+                del self._loader.sources[name]
+        # El caché de PDFs revisa el código para saber qué campos imprime
+        template.source = content
+        return template
+
+    def _remember(self, key, cached: _CachedTemplate):
+        with self._lock:
+            self._entries[key] = cached
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _lookup(self, key) -> Optional[_CachedTemplate]:
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+            return cached
+
+    def get(self, db: Session, template_id: int) -> Optional[Template]:
+        """Plantilla compilada de ``pdf_templates``; None si no existe."""
+        versioned = self.get_versioned(db, template_id)
+        return versioned[0] if versioned else None
+
+    def get_versioned(self, db: Session, template_id: int) -> Optional[Tuple[Template, Optional[datetime]]]:
+        """Como ``get``, pero devuelve ``(plantilla, updated_at)``."""
+        cached = self._lookup(template_id)
+        now = time.monotonic()
+        if cached is not None and now - cached.checked_at < self.recheck:
+            self._stats["hits"] += 1
+            return cached.template, cached.version
+
+        if cached is not None:
+            # Solo la versión: el contenido se trae únicamente si cambió
+            self._stats["version_checks"] += 1
+            version = db.query(PdfTemplate.updated_at).filter(PdfTemplate.id == template_id).scalar()
+            if version == cached.version:
+                cached.checked_at = now
+                self._stats["hits"] += 1
+                return cached.template, cached.version
+
+        row = db.query(PdfTemplate.content, PdfTemplate.updated_at).filter(
+            PdfTemplate.id == template_id
+        ).first()
+        if row is None:
+            self.invalidate(template_id)
+            return None
+        content, version = row
+        stamp = version.timestamp() if version else 0
+        template = self._compile(f"template-{template_id}-{stamp}", content or "")
+        self._remember(template_id, _CachedTemplate(version, template, now))
+        self._stats["loads"] += 1
+        return template, version
+
+    def from_string(self, content: str) -> Template:
+        """Plantilla compilada a partir de contenido suelto, cacheada por hash."""
+        key = "inline-" + hashlib.sha1(content.encode("utf-8")).hexdigest()
+        cached = self._lookup(key)
+        if cached is not None:
+            self._stats["hits"] += 1
+            return cached.template
+        template = self._compile(key, content)
+        self._remember(key, _CachedTemplate(None, template, time.monotonic()))
+        self._stats["loads"] += 1
+        return template
+
+    def invalidate(self, template_id: int):
+        with self._lock:
+            if self._entries.pop(template_id, None) is not None:
+                self._stats["invalidations"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                # Compilaciones reales; el resto de las cargas vino del bytecode
+                "compiles": self.environment.compiles,
+                "entries": len(self._entries)
+            }
+
+
+_cache: Optional[TemplateCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_template_cache() -> TemplateCache:
+    """Caché compartido por todo el proceso."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TemplateCache()
+        return _cache
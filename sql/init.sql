@@ -22,6 +22,8 @@ DROP TABLE IF EXISTS vehicle_civil_policies CASCADE;
 DROP TABLE IF EXISTS policy_details CASCADE;
 DROP TABLE IF EXISTS pdf_templates CASCADE;
 DROP TABLE IF EXISTS generated_pdfs CASCADE;
+DROP TABLE IF EXISTS pdf_job_items CASCADE;
+DROP TABLE IF EXISTS pdf_jobs CASCADE;
 
 -- Crear las tablas necesarias
 CREATE TABLE IF NOT EXISTS attributes (
@@ -127,6 +129,11 @@ CREATE TABLE IF NOT EXISTS vehicle_info (
     capacidad_carga VARCHAR,
     peso_bruto_vehicular VARCHAR,
     no_ejes INTEGER,
+    -- Última respuesta RUNT (caché de consultas por placa)
+    vehicle_data JSONB,
+    owner_data JSONB,
+    soat_data JSONB,
+    rtm_data JSONB,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -135,6 +142,9 @@ CREATE TABLE IF NOT EXISTS vehicle_info (
 CREATE TABLE IF NOT EXISTS events (
     id SERIAL PRIMARY KEY,
     vehicle_id INTEGER REFERENCES vehicle_info(id) ON DELETE CASCADE,
+    plate VARCHAR,
+    event_type VARCHAR,
+    event_data JSONB,
     event_id VARCHAR,
     device_id VARCHAR,
     date TIMESTAMP,
@@ -226,14 +236,48 @@ CREATE TABLE IF NOT EXISTS generated_pdfs (
     vehicle_id INTEGER REFERENCES vehicle_info(id),
     template_id INTEGER REFERENCES pdf_templates(id),
     pdf_path VARCHAR,
+    content_hash VARCHAR(64) UNIQUE,
+    size_bytes INTEGER,
+    hits INTEGER DEFAULT 0,
+    last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Trabajos de generación de PDFs en segundo plano
+CREATE TABLE IF NOT EXISTS pdf_jobs (
+    id VARCHAR(32) PRIMARY KEY,
+    status VARCHAR NOT NULL DEFAULT 'queued',
+    total INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS pdf_job_items (
+    id SERIAL PRIMARY KEY,
+    job_id VARCHAR(32) REFERENCES pdf_jobs(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    template_id INTEGER REFERENCES pdf_templates(id),
+    plate VARCHAR NOT NULL,
+    status VARCHAR NOT NULL DEFAULT 'queued',
+    claim VARCHAR,
+    pdf_path VARCHAR,
+    error TEXT,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_pdf_job_items_job ON pdf_job_items(job_id);
+CREATE INDEX IF NOT EXISTS idx_pdf_job_items_status ON pdf_job_items(status, id);
+
 -- Insertar datos iniciales necesarios
 INSERT INTO global_variables (name, value, description) 
 VALUES 
     ('usuarioAseguradoraCliente', '900133384', 'Usuario aseguradora'),
-    ('llavehmaccliente', '', 'Llave HMAC generada por el servicio')
+    ('llavehmaccliente', '', 'Llave HMAC generada por el servicio'),
+    ('llavehmaccliente_expira', '0', 'Expiración (epoch) de la llave HMAC')
 ON CONFLICT (name) DO NOTHING;
 
 -- Insertar endpoint